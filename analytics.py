@@ -0,0 +1,204 @@
+import io
+import os
+import re
+import json
+import logging
+import argparse
+import datetime
+import store
+from paste import iter_markdown_sections
+from routing import DEFAULT_MODEL
+from usage import count_tokens, empty_totals
+from deadline import INCOMPLETE_MARKER
+
+log = logging.getLogger(__name__)
+
+# Machine-readable copy of every run, kept between runs like cache/:
+# analytics/<table>/date=YYYY-MM-DD/<run id>.jsonl (and .parquet)
+ANALYTICS_DIR = 'analytics'
+
+# One row per run, per research agent, per research task and per ## section
+# of a report (the sections paste renders as cards)
+TABLES = ('runs', 'agents', 'tasks', 'sections')
+
+# Token and cost columns, as counted by usage.UsageMeter
+USAGE_COLUMNS = tuple(empty_totals())
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def usage_columns(totals):
+    """Usage columns of a row; None (not zero) where nothing was counted"""
+    return {column: (totals or {}).get(column) for column in USAGE_COLUMNS}
+
+def section_heading(section):
+    first_line = section.split('\n', 1)[0]
+    return re.sub(r'^\s*##\s*', '', first_line).strip('# \t\r')
+
+def build_rows(run_id):
+    """
+    Rows of every table for a stored run, built from the run store only.
+
+    Returns:
+        Tuple of (date, {table: rows}), or (None, None) if the run is unknown
+    """
+    db = store.get_store()
+    run = db.get_run(run_id)
+    if run is None:
+        return None, None
+    started = datetime.datetime.fromtimestamp(run['started_at'])
+    date = started.strftime('%Y-%m-%d')
+    summary = json.loads(run['summary']) if run['summary'] else {}
+    usage = summary.get('usage') or {}
+    agents = db.get_plan(run_id, 'research_agents') or {}
+    tasks = db.get_plan(run_id, 'research_tasks') or {}
+    outputs = db.get_outputs(run_id)
+    timings = db.get_timings(run_id)
+    base = {'run_id': run_id, 'date': date}
+
+    stage_seconds = {}
+    research_started = None
+    for timing in timings:
+        stage_seconds[timing['stage']] = stage_seconds.get(timing['stage'], 0) + timing['seconds']
+        if timing['stage'] == 'research' and research_started is None:
+            research_started = timing['started_at']
+
+    run_row = dict(base,
+                   query=run['query'],
+                   title=run['title'],
+                   status=run['status'],
+                   started_at=run['started_at'],
+                   finished_at=run['finished_at'],
+                   seconds=round(run['finished_at'] - run['started_at'], 3) if run['finished_at'] else None,
+                   agents=len(agents),
+                   reports=len(outputs),
+                   incomplete_reports=sum(bool(output['incomplete']) for output in outputs.values()),
+                   **{f"{stage}_seconds": round(seconds, 3) for stage, seconds in stage_seconds.items()},
+                   hedged_requests=(summary.get('hedging') or {}).get('hedged'),
+                   hedge_wins=(summary.get('hedging') or {}).get('hedge_wins'),
+                   timeouts=(summary.get('hedging') or {}).get('timeouts'),
+                   **usage_columns(usage.get('run')))
+
+    agent_rows = []
+    section_rows = []
+    for agent_key, agent in agents.items():
+        role = agent.get('role')
+        # The models the agent's calls went to (the latency router may have
+        # sent some to a fallback); model is the one most of them went to
+        called = (usage.get('agent_models') or {}).get(role) or {}
+        model = max(called, key=called.get) if called else None
+        output = outputs.get(role)
+        markdown = output['markdown'] if output else ''
+        sections = list(iter_markdown_sections(io.StringIO(markdown)))
+        # Reports reused by a refresh keep the time they were written in
+        # their own run; they took no time in this one
+        reused = bool(output and research_started and output['created_at'] < research_started)
+        agent_rows.append(dict(base,
+                               agent_key=agent_key,
+                               role=role,
+                               model=model,
+                               models=sorted(called),
+                               tasks=sum(task.get('agent') == agent_key for task in tasks.values()),
+                               has_report=output is not None,
+                               incomplete=bool(output and output['incomplete']),
+                               reused=reused,
+                               report_chars=len(markdown),
+                               sections=len(sections),
+                               report_created_at=output['created_at'] if output else None,
+                               seconds_to_report=(round(output['created_at'] - research_started, 3)
+                                                  if output and research_started and not reused else None),
+                               **usage_columns((usage.get('agent') or {}).get(role))))
+        for index, section in enumerate(sections):
+            text = section.replace(INCOMPLETE_MARKER, '')
+            section_rows.append(dict(base,
+                                     agent_key=agent_key,
+                                     role=role,
+                                     section=index,
+                                     heading=section_heading(section),
+                                     chars=len(text),
+                                     words=len(text.split()),
+                                     tokens=count_tokens(model or DEFAULT_MODEL, text),
+                                     incomplete=bool(output['incomplete'])))
+
+    task_rows = []
+    for task_key, task in tasks.items():
+        agent_key = task.get('agent')
+        # MeteredLLM labels an agent's calls with all of its tasks joined by
+        # '+'; tasks sharing an agent share that label and its totals
+        label = '+'.join(key for key, other in tasks.items() if other.get('agent') == agent_key)
+        task_rows.append(dict(base,
+                              task_key=task_key,
+                              agent_key=agent_key,
+                              role=(agents.get(agent_key) or {}).get('role'),
+                              usage_label=label,
+                              description_chars=len(task.get('description') or ''),
+                              **usage_columns((usage.get('task') or {}).get(label))))
+
+    return date, {'runs': [run_row], 'agents': agent_rows, 'tasks': task_rows, 'sections': section_rows}
+
+def partition_path(table, date, run_id, extension, output_dir=ANALYTICS_DIR):
+    return os.path.join(output_dir, table, f"date={date}", f"{run_id}.{extension}")
+
+def write_jsonl(path, rows):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+
+def write_parquet(path, rows):
+    import pyarrow
+    import pyarrow.parquet
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pyarrow.parquet.write_table(pyarrow.Table.from_pylist(rows), path)
+
+def export_run(run_id, parquet=False, output_dir=ANALYTICS_DIR):
+    """
+    Append a stored run to the analytics dataset. Files are only ever added:
+    each run gets its own file in each table's date partition, and a run
+    that was already exported is left alone.
+
+    Args:
+        run_id: Id of a run in the store
+        parquet: Also write Parquet files next to the JSONL (needs pyarrow)
+
+    Returns:
+        Path of the run's row in the runs table, or None if nothing was written
+    """
+    date, tables = build_rows(run_id)
+    if tables is None:
+        log.error(f"❌ Run {run_id} not found, not exported")
+        return None
+    runs_path = partition_path('runs', date, run_id, 'jsonl', output_dir)
+    if os.path.exists(runs_path):
+        log.info(f"Run {run_id} already exported to {output_dir}/")
+        return None
+    if parquet and not parquet_available():
+        log.warning("⚠️ pyarrow is not installed, exporting JSONL only")
+        parquet = False
+    # The runs row goes last, so a run that has it was exported completely
+    for table in sorted(TABLES, key=lambda name: name == 'runs'):
+        rows = tables[table]
+        if not rows:
+            continue
+        write_jsonl(partition_path(table, date, run_id, 'jsonl', output_dir), rows)
+        if parquet:
+            write_parquet(partition_path(table, date, run_id, 'parquet', output_dir), rows)
+    log.info(f"📊 Exported run {run_id}: {len(tables['agents'])} agents, {len(tables['sections'])} sections")
+    return runs_path
+
+if __name__ == "__main__":
+    # python analytics.py [--parquet] [run id ...]: export runs (by default
+    # every stored run not exported yet)
+    parser = argparse.ArgumentParser(description="Export stored runs to the analytics dataset")
+    parser.add_argument('run_ids', nargs='*', metavar='RUN_ID')
+    parser.add_argument('--parquet', action='store_true', help="also write Parquet files (needs pyarrow)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    run_ids = args.run_ids or [run['id'] for run in reversed(store.get_store().list_runs(limit=-1))
+                               if run['status'] != 'running']
+    for run_id in run_ids:
+        export_run(run_id, parquet=args.parquet)
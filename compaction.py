@@ -0,0 +1,102 @@
+import logging
+import re
+import json
+import threading
+from prefetch import parse_analysis, _as_text
+from routing import DEFAULT_MODEL
+from usage import count_tokens
+
+log = logging.getLogger(__name__)
+
+# Most tokens one task may hand to the next as context
+HOP_TOKEN_CAP = 600
+
+# Characters of an agent's goal passed on to the task designer
+GOAL_CHARS = 160
+
+_stats = []
+_stats_lock = threading.Lock()
+
+def dedupe(items):
+    """Items in order, without repeats (compared as lower-cased text)"""
+    seen = set()
+    unique = []
+    for item in items:
+        key = (_as_text(item) or json.dumps(item, sort_keys=True)).lower()
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(item)
+    return unique
+
+def cap_tokens(text, cap=HOP_TOKEN_CAP):
+    """Cut text at a word boundary until it fits in cap tokens"""
+    tokens = count_tokens(DEFAULT_MODEL, text)
+    while tokens > cap and text:
+        text = text[:int(len(text) * cap / tokens * 0.95)].rsplit(' ', 1)[0] + ' …'
+        tokens = count_tokens(DEFAULT_MODEL, text)
+    return text
+
+def compact_enhancement(raw):
+    """The enhanced query with its whitespace collapsed"""
+    return re.sub(r'[ \t]+', ' ', re.sub(r'\n\s*\n+', '\n', raw)).strip()
+
+def compact_analysis(raw):
+    """
+    Only the structured fields of the analysis (entities, perspectives,
+    research areas, temporal aspects), deduplicated, as compact JSON. Falls
+    back to the collapsed text when no JSON is found.
+    """
+    analysis = parse_analysis(raw)
+    if not analysis:
+        return compact_enhancement(raw)
+    compact = {}
+    for key in ('entities', 'perspectives', 'research_areas'):
+        if isinstance(analysis.get(key), list):
+            compact[key] = [_as_text(item) or item for item in dedupe(analysis[key])]
+    if analysis.get('temporal_aspects'):
+        compact['temporal_aspects'] = analysis['temporal_aspects']
+    return json.dumps(compact, ensure_ascii=False, separators=(',', ':'))
+
+def compact_agents(agents_data):
+    """Agent ids with their role and a shortened goal, for the task designer"""
+    compact = {}
+    for agent_key, agent in agents_data.items():
+        if not isinstance(agent, dict):
+            continue
+        goal = agent.get('goal', '')
+        if len(goal) > GOAL_CHARS:
+            goal = goal[:GOAL_CHARS].rsplit(' ', 1)[0] + ' …'
+        compact[agent_key] = {'role': agent.get('role', ''), 'goal': goal}
+    return json.dumps(compact, ensure_ascii=False, separators=(',', ':'))
+
+def compact_output(output, hop, compacted, consumers=1):
+    """
+    Replace what a finished task hands to the tasks after it with a compacted
+    version, capped at HOP_TOKEN_CAP tokens, and record the tokens saved
+    across the consumers tasks that read it.
+
+    crewai passes the callback the same TaskOutput that later tasks read as
+    context, so this has to run after the full output has been saved.
+    """
+    raw = output.raw if hasattr(output, 'raw') else str(output)
+    compacted = cap_tokens(compacted)
+    before = count_tokens(DEFAULT_MODEL, raw)
+    after = count_tokens(DEFAULT_MODEL, compacted)
+    if after >= before:
+        after = before
+    elif hasattr(output, 'raw'):
+        output.raw = compacted
+    with _stats_lock:
+        _stats.append({'hop': hop, 'tokens_before': before, 'tokens_after': after,
+                       'tokens_saved': (before - after) * consumers})
+    log.info(f"🗜️ {hop}: context {before} -> {after} tokens")
+
+def compaction_summary():
+    """Tokens handed on per hop, before and after compaction, and the total saved"""
+    with _stats_lock:
+        hops = list(_stats)
+    return {'hops': hops, 'tokens_saved': sum(hop['tokens_saved'] for hop in hops)}
+
+def reset():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,44 @@
+import time
+
+# Marker written into reports that were cut off before the agent finished
+INCOMPLETE_MARKER = '<!-- satyarthi:incomplete -->'
+
+# Share of the run's time budget given to each stage, in pipeline order
+STAGE_SHARES = {
+    'planning': 0.35,
+    'research': 0.55,
+    'rendering': 0.10,
+}
+
+class Deadline:
+    """
+    Wall-clock budget for one run, spread across the pipeline stages.
+
+    Each stage must end by the sum of its own share and the shares of the
+    stages before it, so time a stage leaves unused rolls over to the next.
+    """
+
+    def __init__(self, seconds, shares=None):
+        self.seconds = seconds
+        self.shares = shares or STAGE_SHARES
+        self.start = time.monotonic()
+
+    def remaining(self):
+        """Seconds left in the whole run"""
+        return max(0.0, self.start + self.seconds - time.monotonic())
+
+    def stage_end(self, stage):
+        """Monotonic time by which stage has to be done"""
+        share = 0.0
+        for name, stage_share in self.shares.items():
+            share += stage_share
+            if name == stage:
+                return self.start + self.seconds * share
+        raise ValueError(f"Unknown stage '{stage}'")
+
+    def stage_remaining(self, stage):
+        """Seconds left for stage"""
+        return max(0.0, self.stage_end(stage) - time.monotonic())
+
+    def expired(self):
+        return self.remaining() == 0.0
@@ -0,0 +1,175 @@
+import logging
+import re
+import json
+import random
+import hashlib
+import threading
+from urllib.parse import urlsplit
+import filesink
+
+log = logging.getLogger(__name__)
+
+# Items whose shingles overlap at least this much (estimated Jaccard) are the same story
+MIN_SIMILARITY = 0.6
+
+# MinHash signature length, split into bands for lookup: two items become
+# candidates when a whole band matches, which happens for Jaccard well below
+# MIN_SIMILARITY ((1/BANDS) ** (1/ROWS) is about 0.5)
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+
+# Fixed random permutations (a * x + b) mod p, the same in every run
+_PRIME = (1 << 61) - 1
+_random = random.Random(20240501)
+PERMUTATIONS = [(_random.randrange(1, _PRIME), _random.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+# Shingle size, in words, for each kind of text; snippets and full articles
+# are fingerprinted and compared separately
+SHINGLES = {'snippet': 2, 'article': 3}
+
+# Too little text to tell stories apart
+MIN_WORDS = 8
+
+# Duplicate report for the run
+DUPLICATES_LOG_PATH = 'output/duplicates.json'
+
+def minhash(text, shingle=2):
+    """MinHash signature of text over word shingles; None if text is too short"""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    hashes = {int.from_bytes(hashlib.blake2b(' '.join(words[i:i + shingle]).encode('utf-8'),
+                                             digest_size=8).digest(), 'big')
+              for i in range(max(1, len(words) - shingle + 1))}
+    return tuple(min((a * value + b) % _PRIME for value in hashes) for a, b in PERMUTATIONS)
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+
+def domain(url):
+    host = urlsplit(url or '').netloc.lower()
+    return host[4:] if host.startswith('www.') else host
+
+class DuplicateFilter:
+    """
+    Run-wide near-duplicate filter for search hits and fetched articles.
+
+    Every story seen is fingerprinted (MinHash) and kept in an in-memory LSH
+    index, one for search snippets and one for article texts. A later item
+    with a different URL that is at least MIN_SIMILARITY similar to a known
+    story is suppressed, and its URL is recorded as an alternate source of
+    the story seen first.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget every story; called at the start of a run"""
+        with self.lock:
+            self.stories = []
+            self.bands = {kind: {} for kind in SHINGLES}
+            self.by_url = {kind: {} for kind in SHINGLES}
+            self.suppressed = 0
+
+    def _band_keys(self, fingerprint):
+        return [(band, fingerprint[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def _find(self, kind, fingerprint):
+        best, best_similarity = None, MIN_SIMILARITY
+        candidates = {index for key in self._band_keys(fingerprint) for index in self.bands[kind].get(key, [])}
+        for index in candidates:
+            score = similarity(self.stories[index]['fingerprint'], fingerprint)
+            if score >= best_similarity:
+                best, best_similarity = self.stories[index], score
+        return best
+
+    def check(self, url, title, text, kind='snippet'):
+        """
+        Register an item and say whether it repeats a story already seen.
+
+        Args:
+            kind: 'snippet' for search hits, 'article' for fetched pages
+
+        Returns:
+            None if the item is new (or is the story's own URL), otherwise
+            the story it duplicates
+        """
+        fingerprint = minhash(f"{title} {text}", SHINGLES[kind])
+        with self.lock:
+            if url and url in self.by_url[kind]:
+                return None
+            if fingerprint is None:
+                return None
+            story = self._find(kind, fingerprint)
+            if story is not None:
+                if url and url not in story['alternates']:
+                    story['alternates'].append(url)
+                self.suppressed += 1
+                return story
+            story = {'url': url, 'title': title, 'fingerprint': fingerprint, 'alternates': []}
+            self.stories.append(story)
+            for key in self._band_keys(fingerprint):
+                self.bands[kind].setdefault(key, []).append(len(self.stories) - 1)
+            if url:
+                self.by_url[kind][url] = story
+            return None
+
+    def story(self, url, kind='snippet'):
+        """The story first seen at url, if any"""
+        with self.lock:
+            return self.by_url[kind].get(url)
+
+    def filter_search_results(self, results):
+        """
+        Copy of a Serper result without hits that repeat stories already seen.
+        Kept hits list the domains of their duplicates under 'also_reported_by'.
+        """
+        if not isinstance(results, dict):
+            return results
+        filtered = dict(results)
+        suppressed = 0
+        for key in ('organic', 'news', 'topStories'):
+            if not isinstance(results.get(key), list):
+                continue
+            kept = []
+            for item in results[key]:
+                if not isinstance(item, dict):
+                    kept.append(item)
+                    continue
+                story = self.check(item.get('link'), item.get('title', ''), item.get('snippet', ''))
+                if story is None:
+                    kept.append(item)
+                else:
+                    suppressed += 1
+            for i, item in enumerate(kept):
+                story = self.story(item.get('link')) if isinstance(item, dict) else None
+                if story and story['alternates']:
+                    kept[i] = dict(item, also_reported_by=sorted({domain(url) for url in story['alternates']}))
+            filtered[key] = kept
+        if suppressed:
+            filtered['duplicates_suppressed'] = suppressed
+        return filtered
+
+    def report(self):
+        """Stories that were reported more than once, and how many copies were suppressed"""
+        with self.lock:
+            return {
+                'suppressed': self.suppressed,
+                'stories': [{'url': story['url'], 'title': story['title'], 'alternates': story['alternates']}
+                            for story in self.stories if story['alternates']],
+            }
+
+    def write_report(self, path=DUPLICATES_LOG_PATH):
+        report = self.report()
+        filesink.write_text(path, json.dumps(report, indent=2))
+        if report['suppressed']:
+            log.info(f"🧹 Suppressed {report['suppressed']} duplicate articles "
+                  f"across {len(report['stories'])} stories")
+        return report
+
+# Shared by every search and fetch in the run
+duplicate_filter = DuplicateFilter()
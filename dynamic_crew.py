@@ -1,9 +1,49 @@
-import os
-import json
+import logging
+import time
+import threading
+from functools import partial
 from crewai import Agent, Task, Crew
-from crewai_tools import SerperDevTool
 from crewai import TaskOutput
-news_search_tool = SerperDevTool()
+from search import BatchSearchTool, CachedSerperDevTool
+from knowledge import LocalKnowledgeTool, get_index
+from fetch import FetchArticlesTool
+from dedup import DUPLICATES_LOG_PATH, duplicate_filter
+from deadline import INCOMPLETE_MARKER
+from plan_optimizer import optimize_plan
+from usage import MeteredLLM, meter
+from hedging import hedger
+from preview import preview
+from jobs import JobQueue
+from pydantic import ValidationError
+from plan import Plan
+import filesink
+from logsink import transcripts
+import logsink
+import store
+
+log = logging.getLogger(__name__)
+
+news_search_tool = CachedSerperDevTool()
+batch_search_tool = BatchSearchTool()
+knowledge_tool = LocalKnowledgeTool()
+fetch_tool = FetchArticlesTool()
+
+# Set once a deadline has cut the research stage off; late results are dropped
+research_closed = threading.Event()
+
+# Taken to save a full report and to close the research stage, so a report
+# is either saved before the stage closes or dropped after it
+report_lock = threading.Lock()
+
+# Roles that saved a full report in the current research stage
+finished_roles = set()
+
+# Reports of the current research stage by role, handed on to rendering
+reports = {}
+
+# Tool output kept per agent for partial reports
+PARTIAL_RESULTS_KEPT = 3
+PARTIAL_RESULT_CHARS = 1500
 
 # Helper callback function
 def save_md(output: TaskOutput):
@@ -13,42 +53,307 @@ def save_md(output: TaskOutput):
     Parameters:
     output (TaskOutput): An object containing the content and metadata for the Markdown file.
     """
-    os.makedirs('data', exist_ok=True)
+    with report_lock:
+        if research_closed.is_set():
+            log.warning(f"Deadline passed, dropping late output from '{output.agent}'.")
+            return
+        save_report(output.agent, output.raw)
+        finished_roles.add(output.agent)
+
+def save_report(role, markdown):
+    """Keep an agent's report for rendering, write it to data/ and record it with the run"""
+    reports[role] = markdown
 
     # Construct the filename using the agent attribute
-    filename = f"data/{output.agent}.md"
+    filename = f"data/{role}.md"
+    if filesink.write_text(filename, markdown):
+        log.info(f"File saved as '{filename}'.")
+    store.record('record_output', role, markdown)
+    preview.add_report(role, markdown)
+
+def record_step(role, progress, step):
+    """
+    Step callback that adds the step to the agent's recent transcript and,
+    with a deadline, keeps its latest thought and tool results, so a partial
+    report can be written if the agent is cut off.
+    """
+    transcripts.add_step(role, step)
+    if progress is None:
+        return
+    thought = getattr(step, 'thought', '') or ''
+    if thought.strip():
+        progress['thought'] = thought.strip()
+    result = getattr(step, 'result', None)
+    if result:
+        results = progress.setdefault('results', [])
+        results.append(str(result)[:PARTIAL_RESULT_CHARS])
+        del results[:-PARTIAL_RESULTS_KEPT]
+
+def save_partial_md(role, progress):
+    """Keep and write the best partial report for an agent that did not finish in time"""
+    filename = f"data/{role}.md"
+
+    lines = [f"# {role}", "", INCOMPLETE_MARKER, "", "## Findings so far", ""]
+    lines.append(progress.get('thought') or "The agent had no findings before the deadline.")
+    if progress.get('results'):
+        lines += ["", "## Material gathered", ""]
+        for result in progress['results']:
+            lines += ["```", result, "```", ""]
+
+    markdown = '\n'.join(lines) + '\n'
+    reports[role] = markdown
+    if filesink.write_text(filename, markdown):
+        log.info(f"Partial report saved as '{filename}'.")
+    store.record('record_output', role, markdown, incomplete=True)
+    preview.add_report(role, markdown)
+
+def run_until_deadline(tasks, progress, deadline):
+    """
+    Run each agent's tasks in a crew of its own, all agents at once, and stop
+    waiting when the research stage's share of the deadline is used up.
+    Agents still working at that point get a partial report built from their
+    progress so far.
+    """
+    tasks_by_agent = {}
+    for task in tasks:
+        tasks_by_agent.setdefault(id(task.agent), []).append(task)
+
+    def kickoff(agent, agent_tasks):
+        try:
+            Crew(agents=[agent], tasks=agent_tasks, verbose=logsink.VERBOSE).kickoff()
+        except Exception as e:
+            log.error(f"❌ Agent '{agent.role}' failed: {e}",
+                      extra={'fields': {'transcript': transcripts.snapshot().get(agent.role)}})
+
+    # Daemon threads: agents past the deadline must not keep the process alive
+    threads = []
+    for agent_tasks in tasks_by_agent.values():
+        agent = agent_tasks[0].agent
+        thread = threading.Thread(target=kickoff, args=(agent, agent_tasks), daemon=True)
+        thread.start()
+        threads.append((agent, thread))
+
+    for agent, thread in threads:
+        thread.join(deadline.stage_remaining('research'))
+    with report_lock:
+        research_closed.set()
+
+    for agent, thread in threads:
+        if thread.is_alive() and agent.role in finished_roles:
+            log.warning(f"⏱️ '{agent.role}' ran past the deadline after saving its report, keeping that report")
+        elif thread.is_alive():
+            log.warning(f"⏱️ '{agent.role}' ran past the deadline, keeping its partial results")
+            save_partial_md(agent.role, progress[id(agent)])
+
+# How often the coordinator checks the queue for finished jobs
+QUEUE_POLL_SECONDS = 2
+
+def run_on_queue(agents_data, tasks_data, deadline=None, queue=None):
+    """
+    Publish each agent and its tasks as a job and collect the reports the
+    workers (worker.py) upload, instead of running the agents here.
+
+    Each job gets an even share of what is left of the run and research
+    stage budgets. Reports are saved as their jobs finish. A job whose
+    worker went quiet goes back to the queue, and fails once no worker is
+    left to take it over. With a deadline, the jobs still open when the
+    research stage's share runs out are cancelled, and their agents get a
+    partial report from the progress their workers uploaded.
+    """
+    queue = queue or JobQueue()
+    run_id = store.current_run_id or f"local-{int(time.time() * 1000)}"
+    jobs = {}
+    for agent_key, agent_info in agents_data.items():
+        agent_tasks = {key: info for key, info in tasks_data.items() if info.get('agent') == agent_key}
+        if agent_tasks:
+            jobs[agent_key] = agent_tasks
+    # What is left of the run's cap on hedged requests and of its budgets
+    # is shared out between the jobs, so together they stay within them;
+    # hedges that do not divide evenly go to the first jobs
+    hedges, extra_hedges = divmod(max(0, hedger.max_hedges - hedger.hedges), len(jobs) or 1)
+    budgets = meter.share(len(jobs), 'research') if jobs else meter.budgets
+    for index, (agent_key, agent_tasks) in enumerate(jobs.items()):
+        queue.publish(run_id, agents_data[agent_key]['role'],
+                      {'agent_key': agent_key, 'agent': agents_data[agent_key], 'tasks': agent_tasks,
+                       'budgets': budgets, 'max_hedges': hedges + (index < extra_hedges)})
+    log.info(f"📬 Published {len(jobs)} research jobs for run {run_id}")
+
+    def charge(role, usage):
+        # A worker's usage per model it called
+        for model, totals in (usage or {}).items():
+            meter.charge({'agent': role, 'stage': 'research', 'run': 'run', 'model': model},
+                         totals['prompt_tokens'], totals['completion_tokens'], totals['cost'],
+                         calls=totals['calls'], cached_tokens=totals.get('cached_tokens', 0))
+
+    saved = set()
+    while True:
+        for job in queue.jobs(run_id):
+            if job['id'] in saved or job['status'] not in ('done', 'failed'):
+                continue
+            saved.add(job['id'])
+            if job['status'] == 'failed':
+                log.error(f"❌ Job for '{job['name']}' failed after {job['attempts']} attempts: {job['error']}")
+                continue
+            log.info(f"📥 '{job['name']}' finished on {job['worker']}")
+            save_report(job['name'], job['result']['markdown'])
+            charge(job['name'], job['result'].get('usage'))
+            hedger.merge(job['result'].get('hedging'))
+        if not queue.pending(run_id):
+            break
+        queue.reclaim_expired()
+        if not queue.workers() and queue.abandon(run_id, 'no worker left'):
+            log.error("❌ No worker is left to take over the research jobs of workers that went quiet")
+            continue
+        if deadline is not None and deadline.stage_remaining('research') <= 0:
+            research_closed.set()
+            log.warning(f"⏱️ {queue.cancel_run(run_id)} research jobs ran past the deadline and were cancelled")
+            # Jobs that finished since the last look keep their reports
+            for job in queue.jobs(run_id):
+                if job['id'] in saved or job['status'] not in ('done', 'cancelled'):
+                    continue
+                if job['status'] == 'done':
+                    save_report(job['name'], job['result']['markdown'])
+                    charge(job['name'], job['result'].get('usage'))
+                    hedger.merge(job['result'].get('hedging'))
+                    continue
+                log.warning(f"⏱️ '{job['name']}' ran past the deadline, keeping its partial results")
+                progress = job['progress'] or {}
+                save_partial_md(job['name'], progress)
+                charge(job['name'], progress.get('usage'))
+            break
+        time.sleep(QUEUE_POLL_SECONDS)
+
+def build_agent(agent_key, agent_info, tasks_data, progress=None):
+    """
+    Research agent for one entry of the plan, with the research tools. With
+    a progress dict, its latest findings are kept there for a partial report.
+    """
+    task_keys = [task_key for task_key, task_info in tasks_data.items() if task_info.get('agent') == agent_key]
+    search_tools = [batch_search_tool, news_search_tool]
+    if agent_info.get('search_max_age'):
+        # A refreshed agent only gets searches as fresh as its report must be
+        max_age = agent_info['search_max_age']
+        search_tools = [BatchSearchTool(max_age=max_age), CachedSerperDevTool(max_age=max_age)]
+    return Agent(
+        role=agent_info['role'],
+        goal=agent_info['goal'],
+        tools=[knowledge_tool, *search_tools, fetch_tool],
+        llm=MeteredLLM(agent_info['role'], 'research', '+'.join(task_keys) or None,
+                       model=agent_info.get('llm')),
+        backstory=agent_info['backstory'],
+        verbose=logsink.VERBOSE and agent_info.get('verbose', False),
+        step_callback=partial(record_step, agent_info['role'], progress)
+    )
+
+def build_task(task_info, agent, callback=save_md):
+    # The markdown instructions every research task shares are sent in the
+    # stable part of the prompt (prompts.STAGE_INSTRUCTIONS)
+    return Task(
+        description=task_info['description'],
+        expected_output=task_info['expected_output'],
+        agent=agent,
+        callback=callback,
+        verbose=task_info.get('verbose', False)
+    )
+
+def load_plan():
+    """
+    Agents and tasks of the current run, from the run store; with no run
+    started (dynamic_crew.py run on its own), those of the latest stored run
+    with a plan. output/*.json is only a copy, which may be left over from
+    another run (or not written at all), so it is never read back.
+
+    Raises:
+        ValueError: if the current run has no plan, or no stored run has one
+    """
+    run_store = store.get_store()
+    if store.current_run_id is not None:
+        run_ids = [store.current_run_id]
+    else:
+        run_ids = [run['id'] for run in run_store.list_runs()]
+    for run_id in run_ids:
+        agents_data = run_store.get_plan(run_id, 'agents')
+        tasks_data = run_store.get_plan(run_id, 'tasks')
+        if agents_data is not None and tasks_data is not None:
+            if run_id != store.current_run_id:
+                log.info(f"Researching the plan of run {run_id}")
+            return agents_data, tasks_data
+    if store.current_run_id is not None:
+        raise ValueError(f"Run {store.current_run_id} has no plan; run the planning stage first")
+    raise ValueError("No stored run has a plan; run the planning stage first")
+
+def main(deadline=None, max_agents=None, budget=None, plan=None, agent_keys=None, queue=None, designed=None):
+    """
+    Build the research crew from the designed agents and tasks and run it.
+
+    Args:
+        deadline: Optional deadline.Deadline; agents still running when the
+            research stage's share runs out are cut off with partial results
+        max_agents: Cap on the number of research agents after merging
+            near-duplicates
+        budget: Research budget in USD, also turned into an agent cap
+        plan: Optional Plan (or (agents_data, tasks_data)) of an already
+            optimised plan, used as is instead of the designed one
+        agent_keys: Optional agent keys to run; the others are skipped
+        queue: Optional jobs.JobQueue; the agents are then run by workers
+            that take them off the queue instead of in this process
+        designed: Optional Plan from initial.main() to optimise, instead of
+            loading the designed plan from the run store (see load_plan)
+
+    Returns:
+        Tuple of (the research Plan, reports by role); (None, {}) when there
+        is no valid plan to research
+    """
+    research_closed.clear()
+    duplicate_filter.reset()
+    reports.clear()
+    finished_roles.clear()
 
     try:
-        # Write the raw content to the file with UTF-8 encoding
-        with open(filename, 'w', encoding='utf-8') as file:
-            file.write(output.raw)
-        print(f"File saved as '{filename}'.")
-    except Exception as e:
-        print(f"An error occurred while saving the file: {e}")
-
-# File paths
-agents_file_path = 'output/agents.json'
-tasks_file_path = 'output/tasks.json'
-
-def main():
-    # Load agents from JSON file
-    with open(agents_file_path, 'r') as f:
-        agents_data = json.load(f)
-
-    # Load tasks from JSON file
-    with open(tasks_file_path, 'r') as f:
-        tasks_data = json.load(f)
+        if plan is None:
+            # A stored plan is validated before the optimiser works on it
+            if designed is None:
+                designed = Plan.from_dicts(*load_plan())
+            agents_data, tasks_data = designed.to_dicts()
+            # Merge overlapping agents before paying for them
+            agents_data, tasks_data = optimize_plan(agents_data, tasks_data, max_agents, budget)
+        elif isinstance(plan, Plan):
+            agents_data, tasks_data = plan.to_dicts()
+        else:
+            agents_data, tasks_data = plan
+        research_plan = Plan.from_dicts(agents_data, tasks_data)
+    except ValidationError as e:
+        log.error(f"❌ The research plan is invalid, nothing to research: {e}")
+        return None, {}
+    except ValueError as e:
+        log.error(f"❌ {e}")
+        return None, {}
+    store.record('record_plan', 'research_agents', agents_data)
+    store.record('record_plan', 'research_tasks', tasks_data)
+    preview.update(agents=[agent_info['role'] for agent_info in agents_data.values()])
+
+    if agent_keys is not None:
+        agents_data = {key: info for key, info in agents_data.items() if key in agent_keys}
+        tasks_data = {key: info for key, info in tasks_data.items() if info.get('agent') in agents_data}
+        if not agents_data:
+            log.info("Every report is still fresh, nothing to research.")
+            return research_plan, dict(reports)
+
+    if queue is not None:
+        run_on_queue(agents_data, tasks_data, deadline, queue)
+        return research_plan, dict(reports)
+
+    # Bring earlier reports and this run's prefetched searches into the local index
+    get_index().refresh(force=True)
 
     # Create Agent instances
     agents = {}
+    progress = {}
     for agent_key, agent_info in agents_data.items():
-        agents[agent_key] = Agent(
-            role=agent_info['role'],
-            goal=agent_info['goal'],
-            tools=[news_search_tool],
-            backstory=agent_info['backstory'],
-            verbose=agent_info.get('verbose', False)
-        )
+        agent_progress = {}
+        agents[agent_key] = build_agent(agent_key, agent_info, tasks_data,
+                                        agent_progress if deadline else None)
+        progress[id(agents[agent_key])] = agent_progress
 
     # Create Task instances
     tasks = []
@@ -58,24 +363,25 @@ def main():
         if agent_key not in agents:
             raise ValueError(f"Agent '{agent_key}' not found for task '{task_key}'")
 
-        tasks.append(Task(
-            description=task_info['description']+ ". Present your findings in a clear, well-structured markdown format",
-            expected_output=task_info['expected_output'] + ". Output should be a Markdown",
-            agent=agents[agent_key],
-            callback=save_md,
-            verbose=task_info.get('verbose', False)
-        ))
-
-    # Initialize Crew with agents and tasks
-    crew = Crew(
-        agents=list(agents.values()),
-        tasks=tasks,
-        verbose=True  
-    )
-    
-    crew.kickoff()
+        tasks.append(build_task(task_info, agents[agent_key]))
+
+    if deadline is not None:
+        run_until_deadline(tasks, progress, deadline)
+    else:
+        # Initialize Crew with agents and tasks
+        crew = Crew(
+            agents=list(agents.values()),
+            tasks=tasks,
+            verbose=logsink.VERBOSE
+        )
+
+        crew.kickoff()
+
+    duplicate_filter.write_report()
+    store.record('record_artifact', 'duplicates.json', 'log', DUPLICATES_LOG_PATH)
+    return research_plan, dict(reports)
 
 
 if __name__ == "__main__":
+    logsink.setup()
     main()
-
@@ -0,0 +1,278 @@
+import logging
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from typing import List, Type, Union
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from bs4 import BeautifulSoup
+from pydantic import BaseModel, Field
+from crewai.tools import BaseTool
+from dedup import duplicate_filter
+from hedging import hedger
+
+log = logging.getLogger(__name__)
+
+# Article text is cached here, with the validators needed to revalidate it
+FETCH_CACHE_DIR = 'cache/pages'
+
+# Cached pages younger than this are used without asking the server again
+FETCH_CACHE_FRESH = 60 * 60
+
+# Seconds allowed per request
+FETCH_TIMEOUT = 10
+
+# Requests in flight overall, and per domain so no site is hammered
+MAX_CONCURRENT_FETCHES = 8
+MAX_FETCHES_PER_DOMAIN = 2
+
+# URLs fetched per tool call, and article characters returned per URL
+MAX_URLS_PER_CALL = 6
+ARTICLE_CHARS = 3000
+
+# Pages bigger than this are cut before parsing
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+
+USER_AGENT = "Mozilla/5.0 (compatible; Satyarthi/0.1; +https://github.com/DebBidhi/satyarthi)"
+
+# Elements that never hold the article itself
+BOILERPLATE_TAGS = ['script', 'style', 'noscript', 'template', 'iframe', 'svg', 'form',
+                    'nav', 'header', 'footer', 'aside', 'button', 'figure']
+# Class and id words of boilerplate containers, matched as whole words of
+# the name ("comment-list" but not "commentary")
+BOILERPLATE_HINTS = re.compile(r'(?<![^\s_-])(comments?|share|sharing|social|related|promo|subscribe|newsletter|'
+                               r'cookies?|advert\w*|ads?|sidebar|footer|breadcrumbs?|menu)(?![^\s_-])', re.I)
+
+# Paragraphs shorter than this are mostly captions, bylines and buttons
+MIN_PARAGRAPH_CHARS = 40
+
+def extract_article(html):
+    """
+    Extract the title and main text of an article page.
+
+    Strips scripts, navigation and other boilerplate, then takes the text of
+    <article> or <main> when the page has one, or else of the element with
+    the most paragraph text.
+
+    Returns:
+        Tuple of (title, text)
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    title = ''
+    if soup.title and soup.title.string:
+        title = soup.title.string.strip()
+    heading = soup.find('h1')
+    if heading and heading.get_text(strip=True):
+        title = heading.get_text(' ', strip=True)
+
+    for element in soup.find_all(BOILERPLATE_TAGS):
+        element.decompose()
+    for element in soup.find_all(True):
+        if element.decomposed or element.attrs is None:
+            continue
+        hints = ' '.join(element.get('class', [])) + ' ' + (element.get('id') or '')
+        if element.name not in ('body', 'html', 'article', 'main') and BOILERPLATE_HINTS.search(hints):
+            element.decompose()
+
+    root = soup.find('article') or soup.find('main') or soup.find(attrs={'role': 'main'})
+    if root is None:
+        # The element holding the most paragraph text
+        scores = {}
+        for paragraph in soup.find_all('p'):
+            parent = paragraph.parent
+            if parent is not None:
+                scores[id(parent)] = (scores.get(id(parent), (0, parent))[0]
+                                      + len(paragraph.get_text(strip=True)), parent)
+        root = max(scores.values(), key=lambda score: score[0])[1] if scores else (soup.body or soup)
+
+    blocks = []
+    for element in root.find_all(['h2', 'h3', 'p', 'li', 'blockquote']):
+        text = re.sub(r'\s+', ' ', element.get_text(' ', strip=True))
+        if element.name in ('h2', 'h3') or len(text) >= MIN_PARAGRAPH_CHARS:
+            blocks.append(text)
+    if not blocks:
+        blocks = [re.sub(r'\s+', ' ', root.get_text(' ', strip=True))]
+    return title, '\n\n'.join(block for block in blocks if block)
+
+def clip(text, limit=ARTICLE_CHARS):
+    """Cut text to limit characters at a word boundary"""
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + ' …'
+
+class PageCache:
+    """Article text on disk, keyed by URL, with the ETag/Last-Modified it was served with"""
+
+    def __init__(self, cache_dir=FETCH_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, f"{hashlib.sha1(url.encode('utf-8')).hexdigest()}.json")
+
+    def get(self, url):
+        try:
+            with open(self._path(url), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def put(self, entry):
+        try:
+            with self.lock:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._path(entry['url']), 'w', encoding='utf-8') as file:
+                json.dump(entry, file)
+        except OSError as e:
+            log.error(f"❌ Could not write page cache entry: {e}")
+
+page_cache = PageCache()
+
+class Fetcher:
+    """
+    Fetches a batch of article URLs concurrently over one async client.
+
+    At most MAX_CONCURRENT_FETCHES requests run at once, and at most
+    MAX_FETCHES_PER_DOMAIN per domain. Cached pages are revalidated with
+    If-None-Match/If-Modified-Since, so an unchanged page costs a 304.
+
+    Args:
+        cache: PageCache to use
+        transport: Optional httpx transport, e.g. httpx.MockTransport for a
+            local stand-in of the web
+    """
+
+    def __init__(self, cache=None, transport=None, timeout=FETCH_TIMEOUT):
+        self.cache = cache or page_cache
+        self.transport = transport
+        self.timeout = timeout
+
+    async def fetch_all(self, urls):
+        """Fetch every URL; returns one result dict per URL, in order"""
+        limit = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        domains = {}
+        async with httpx.AsyncClient(transport=self.transport, timeout=self.timeout, follow_redirects=True,
+                                     headers={'User-Agent': USER_AGENT}) as client:
+            async def fetch_one(url):
+                domain = urlsplit(url).netloc.lower()
+                domain_limit = domains.setdefault(domain, asyncio.Semaphore(MAX_FETCHES_PER_DOMAIN))
+                async with limit, domain_limit:
+                    return await self.fetch(client, url)
+            return await asyncio.gather(*(fetch_one(url) for url in urls))
+
+    async def fetch(self, client, url):
+        cached = self.cache.get(url)
+        if cached and time.time() - cached['fetched_at'] < FETCH_CACHE_FRESH:
+            return dict(cached, status='cached')
+
+        headers = {}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            if cached:
+                return dict(cached, status='stale')
+            return {'url': url, 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+        if response.status_code == 304 and cached:
+            cached['fetched_at'] = time.time()
+            self.cache.put(cached)
+            return dict(cached, status='revalidated')
+        if response.status_code >= 400:
+            return {'url': url, 'status': 'error', 'error': f"HTTP {response.status_code}"}
+        content_type = response.headers.get('content-type', '')
+        if 'html' not in content_type and 'text' not in content_type:
+            return {'url': url, 'status': 'error', 'error': f"Not an article ({content_type or 'unknown type'})"}
+
+        # Parsing is CPU work; keep it off the event loop
+        html = response.content[:MAX_PAGE_BYTES].decode(response.encoding or 'utf-8', errors='replace')
+        title, text = await asyncio.to_thread(extract_article, html)
+        entry = {
+            'url': url,
+            'final_url': str(response.url),
+            'etag': response.headers.get('etag'),
+            'last_modified': response.headers.get('last-modified'),
+            'fetched_at': time.time(),
+            'title': title,
+            'text': text,
+        }
+        self.cache.put(entry)
+        return dict(entry, status='fetched')
+
+    def fetch_batch(self, urls):
+        """Synchronous fetch_all, safe to call from a thread with a running event loop"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.fetch_all(urls))
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, self.fetch_all(urls)).result()
+
+def parse_urls(urls):
+    """URLs from a list, or from a string the LLM wrote them into; duplicates dropped"""
+    if isinstance(urls, str):
+        urls = re.findall(r'https?://[^\s,"\'\]\)>]+', urls)
+    return list(dict.fromkeys(url.strip() for url in urls if url and url.strip().startswith('http')))
+
+def format_articles(results, limit=ARTICLE_CHARS):
+    """Readable text for the agent: title, URL and clipped text of each article"""
+    sections = []
+    for result in results:
+        if result['status'] == 'error':
+            sections.append(f"## {result['url']}\nCould not fetch: {result['error']}")
+            continue
+        if result['status'] == 'duplicate':
+            sections.append(f"## {result.get('title') or result['url']}\n{result['url']}\n\n"
+                            f"Same story as {result['duplicate_of']}, already returned earlier.")
+            continue
+        text = clip(result.get('text') or '', limit) or "No article text found on this page."
+        sections.append(f"## {result.get('title') or result['url']}\n{result['url']}\n\n{text}")
+    return '\n\n'.join(sections)
+
+class FetchArticlesInput(BaseModel):
+    """Input for FetchArticlesTool"""
+    urls: Union[List[str], str] = Field(..., description="URLs of the articles to read, from search results")
+
+class FetchArticlesTool(BaseTool):
+    name: str = "Read articles"
+    description: str = (
+        f"Fetches up to {MAX_URLS_PER_CALL} article URLs at once and returns the main text of each "
+        "(clipped). Pass several promising links from the search results in one call instead of "
+        "searching again for more detail."
+    )
+    args_schema: Type[BaseModel] = FetchArticlesInput
+
+    def _run(self, urls: Union[List[str], str]) -> str:
+        # Articles are not fetched through the hedger, so check for a stopped job here
+        hedger.check_stop()
+        urls = parse_urls(urls)[:MAX_URLS_PER_CALL]
+        if not urls:
+            return "No URLs given. Pass article links from the search results."
+        start = time.perf_counter()
+        results = Fetcher().fetch_batch(urls)
+        for i, result in enumerate(results):
+            if result['status'] != 'error':
+                story = duplicate_filter.check(result['url'], result.get('title', ''), result.get('text', ''), 'article')
+                if story is not None:
+                    results[i] = {'url': result['url'], 'title': result.get('title'),
+                                  'status': 'duplicate', 'duplicate_of': story['url']}
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        log.info(f"📰 Fetched {len(urls)} articles in {time.perf_counter() - start:.1f}s "
+              f"({', '.join(f'{count} {status}' for status, count in counts.items())})")
+        return format_articles(results)
+
+if __name__ == "__main__":
+    # python fetch.py URL [URL ...]: fetch and print articles
+    import sys
+    print(format_articles(Fetcher().fetch_batch(parse_urls(sys.argv[1:]))))
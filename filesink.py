@@ -0,0 +1,49 @@
+import os
+import sys
+import logging
+
+log = logging.getLogger(__name__)
+
+# Stages hand their results (plan, reports, pages) to each other in memory;
+# output/*.json, data/*.md, htmls/*.html, main.html and logs/ are written as
+# well unless this is turned off, e.g. when the pipeline is embedded
+enabled = True
+
+def _write(path, text, mode):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode, encoding='utf-8') as file:
+        file.write(text)
+
+def write_text(path, text):
+    """
+    Write text to path if file output is on.
+
+    Returns:
+        path, or None when nothing was written
+    """
+    if not enabled:
+        return None
+    try:
+        _write(path, text, 'w')
+    except OSError as e:
+        log.error(f"❌ Could not write {path}: {e}")
+        return None
+    return path
+
+def append_text(path, text):
+    """
+    Append text to path if file output is on. Failures go to stderr rather
+    than the log, since the JSONL log is written with this.
+
+    Returns:
+        path, or None when nothing was written
+    """
+    if not enabled:
+        return None
+    try:
+        _write(path, text, 'a')
+    except OSError as e:
+        sys.stderr.write(f"❌ Could not write {path}: {e}\n")
+        return None
+    return path
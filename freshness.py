@@ -0,0 +1,173 @@
+import logging
+import re
+import json
+import time
+import store
+import filesink
+from preview import preview
+from prefetch import parse_analysis
+
+log = logging.getLogger(__name__)
+
+# How long a report stays fresh, by the kind of time it covers
+FRESHNESS_TTL = {
+    'breaking': 60 * 60,
+    'current': 3 * 60 * 60,
+    'outlook': 12 * 60 * 60,
+    'historical': 7 * 24 * 60 * 60,
+}
+
+# Words in an agent's role, goal or task that place it in a category; the
+# first category that matches wins, and 'current' is the default. Only
+# unambiguous words mark breaking news: "latest" or "today" are in most
+# task descriptions and stay 'current'
+CATEGORY_HINTS = [
+    ('breaking', r'\b(breaking|live|unfolding)\b'),
+    ('historical', r'\b(histor\w*|background|origins?|timelines?|precedents?|legacy|evolution|roots)\b'),
+    ('outlook', r'\b(futures?|implications?|outlook|forecasts?|scenarios?|long[- ]term|projections?|predict\w*)\b'),
+]
+
+# Refresh decisions for the run
+REFRESH_LOG_PATH = 'output/refresh.json'
+
+def analysis_hints(analysis):
+    """Extra hint words for 'historical' and 'outlook' from the analysis' temporal aspects"""
+    temporal = analysis.get('temporal_aspects')
+    if not isinstance(temporal, dict):
+        return {}
+    hints = {}
+    for key, category in (('historical_context', 'historical'), ('future_implications', 'outlook')):
+        words = set(re.findall(r'[a-z]{6,}', json.dumps(temporal.get(key, '')).lower()))
+        if words:
+            hints[category] = words
+    return hints
+
+def temporal_category(agent_info, task_infos, hints=None):
+    """
+    Temporal category of an agent's work: 'breaking', 'current', 'outlook'
+    or 'historical'. A 'temporal' field in the task (if the designer gave
+    one) wins; otherwise the role, goal and task text are matched against
+    CATEGORY_HINTS and then against the analysis' temporal aspects.
+    """
+    for task_info in task_infos:
+        if task_info.get('temporal') in FRESHNESS_TTL:
+            return task_info['temporal']
+
+    text = ' '.join([agent_info.get('role', ''), agent_info.get('goal', '')]
+                    + [task_info.get('description', '') for task_info in task_infos]).lower()
+    for category, pattern in CATEGORY_HINTS:
+        if re.search(pattern, text):
+            return category
+
+    # Agents mostly about what the analysis called history or implications
+    words = set(re.findall(r'[a-z]{6,}', text))
+    best, best_overlap = 'current', 2
+    for category, category_words in (hints or {}).items():
+        overlap = len(words & category_words)
+        if overlap > best_overlap:
+            best, best_overlap = category, overlap
+    return best
+
+def plan_refresh(run_id, rerun=(), now=None):
+    """
+    Decide which agents of an earlier run have to research again.
+
+    An agent reruns when it is named in rerun (by key or role), or when its
+    report is missing, incomplete or older than the TTL of its temporal
+    category. Each agent's search_max_age is set to that TTL, so an agent
+    that reruns does not get cached searches older than its reports may be.
+
+    Args:
+        run_id: Run to refresh
+        rerun: Agent keys or roles to rerun regardless of freshness
+        now: Time to judge freshness at (defaults to now)
+
+    Returns:
+        Tuple of (agents_data, tasks_data, stale agent keys, reused reports
+        by role, decisions per agent key)
+    """
+    run_store = store.get_store()
+    agents_data = run_store.get_plan(run_id, 'research_agents')
+    tasks_data = run_store.get_plan(run_id, 'research_tasks')
+    if agents_data is None or tasks_data is None:
+        raise ValueError(f"Run {run_id} has no research plan to refresh")
+
+    outputs = run_store.get_outputs(run_id)
+    hints = analysis_hints(parse_analysis(run_store.get_query(run_id, 'analysis') or ''))
+    requested = {name.lower() for name in rerun}
+    now = now or time.time()
+
+    stale, reused, decisions = [], {}, {}
+    for agent_key, agent_info in agents_data.items():
+        task_infos = [task for task in tasks_data.values() if task.get('agent') == agent_key]
+        category = temporal_category(agent_info, task_infos, hints)
+        agent_info['search_max_age'] = FRESHNESS_TTL[category]
+        output = outputs.get(agent_info['role'])
+        age = now - output['created_at'] if output else None
+
+        if agent_key.lower() in requested or agent_info['role'].lower() in requested:
+            reason = 'requested'
+        elif output is None:
+            reason = 'missing'
+        elif output['incomplete']:
+            reason = 'incomplete'
+        elif age > FRESHNESS_TTL[category]:
+            reason = 'expired'
+        else:
+            reason = None
+
+        if reason:
+            stale.append(agent_key)
+        else:
+            reused[agent_info['role']] = output
+        decisions[agent_key] = {
+            'role': agent_info['role'],
+            'category': category,
+            'ttl_hours': FRESHNESS_TTL[category] / 3600,
+            'age_hours': round(age / 3600, 2) if age is not None else None,
+            'action': f"rerun ({reason})" if reason else 'reuse',
+        }
+    return agents_data, tasks_data, stale, reused, decisions
+
+def prepare_refresh(run_id=None, rerun=()):
+    """
+    Start the current run as a refresh of an earlier one: carry over its
+    query and plan, and put the reports that are still fresh back in data/
+    so they are rendered with the refreshed ones.
+
+    Args:
+        run_id: Run to refresh; defaults to the latest completed run
+        rerun: Agent keys or roles to rerun regardless of freshness
+
+    Returns:
+        Tuple of (agents_data, tasks_data, agent keys to rerun, reused
+        reports as a dict of role to markdown)
+    """
+    run_store = store.get_store()
+    run_id = run_id or run_store.latest_run()
+    if run_id is None or run_store.get_run(run_id) is None:
+        raise ValueError("No earlier run to refresh")
+
+    agents_data, tasks_data, stale, reused, decisions = plan_refresh(run_id, rerun)
+
+    for kind in ('user', 'enhanced', 'analysis'):
+        text = run_store.get_query(run_id, kind)
+        if text is not None:
+            store.record('record_query', kind, text)
+    store.record('record_plan', 'refreshed_from', {'run_id': run_id, 'decisions': decisions})
+
+    title = run_store.get_query(run_id, 'enhanced')
+    if title is not None:
+        filesink.write_text('output/title.txt', title)
+    preview.update(enhanced=title, analysis=run_store.get_query(run_id, 'analysis'))
+    for role, output in reused.items():
+        filesink.write_text(f"data/{role}.md", output['markdown'])
+        store.record('record_output', role, output['markdown'], created_at=output['created_at'])
+        preview.add_report(role, output['markdown'])
+    filesink.write_text(REFRESH_LOG_PATH, json.dumps({'refreshed_from': run_id, 'agents': decisions}, indent=2))
+
+    log.info(f"♻️ Refreshing run {run_id}: {len(stale)} of {len(agents_data)} agents rerun, "
+          f"{len(reused)} reports reused")
+    for agent_key, decision in decisions.items():
+        log.info(f"   {decision['role']} [{decision['category']}]: {decision['action']}")
+    return agents_data, tasks_data, stale, {role: output['markdown'] for role, output in reused.items()}
@@ -0,0 +1,210 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from routing import LATENCY_WINDOW, MIN_LATENCY_SAMPLES, percentile
+from jobs import JobCancelled
+
+log = logging.getLogger(__name__)
+
+# Longest an LLM completion or a search may take before it is given up on
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 180))
+SEARCH_TIMEOUT = float(os.getenv('SEARCH_TIMEOUT', 30))
+
+# A call still unanswered at this quantile of its recent latencies gets a
+# duplicate, but never sooner than MIN_HEDGE_DELAY seconds in
+HEDGE_QUANTILE = 0.95
+MIN_HEDGE_DELAY = 1.0
+
+STAT_NAMES = ('calls', 'hedged', 'hedge_wins', 'primary_wins', 'capped', 'timeouts')
+
+class Attempt:
+    """One request of a hedged call; callbacks given to on_cancel abort it when it loses"""
+
+    def __init__(self, number):
+        self.number = number
+        self.finished = False
+        self.cancelled = threading.Event()
+        self.cleanups = []
+        self.lock = threading.Lock()
+
+    def on_cancel(self, callback):
+        with self.lock:
+            if not self.cancelled.is_set():
+                self.cleanups.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        with self.lock:
+            if self.cancelled.is_set():
+                return
+            self.cancelled.set()
+            cleanups = list(self.cleanups)
+        for cleanup in cleanups:
+            try:
+                cleanup()
+            except Exception:
+                pass
+
+class Hedger:
+    """
+    Runs slow-prone requests (LLM completions, searches) with a timeout and,
+    optionally, a hedge: a call that has not answered by the HEDGE_QUANTILE
+    latency of its kind gets a duplicate request, the first answer wins and
+    the other request is cancelled.
+
+    Duplicates are limited to max_hedges per run across all kinds; with the
+    default of 0 calls are only timed out, never hedged. A losing request
+    that cannot be aborted (an LLM call inside litellm) is left to finish in
+    its thread and its answer is dropped. A timed-out request that cannot be
+    aborted keeps running the same way, so it uses up a duplicate too.
+
+    A worker's job also stops here: once its stop event is set, every call
+    raises JobCancelled before sending anything.
+    """
+
+    def __init__(self, max_hedges=0):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.configure(max_hedges)
+
+    def configure(self, max_hedges=0, stop=None):
+        """Set the cap on duplicate requests and the stop event, and start counting from zero"""
+        with self.lock:
+            self.max_hedges = max_hedges
+            self.stop = stop
+            self.hedges = 0
+            self.stats = {}
+
+    def check_stop(self):
+        """Raise JobCancelled once the stop event is set"""
+        if self.stop is not None and self.stop.is_set():
+            raise JobCancelled("the job was cancelled or taken over")
+
+    def _count(self, kind, name, amount=1):
+        with self.lock:
+            stats = self.stats.setdefault(kind, dict.fromkeys(STAT_NAMES, 0))
+            stats[name] += amount
+
+    def _record(self, kind, seconds):
+        with self.lock:
+            self.samples.setdefault(kind, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def hedge_delay(self, kind):
+        """Seconds to wait before hedging a call of this kind, or None if it cannot be hedged yet"""
+        with self.lock:
+            samples = self.samples.get(kind)
+            if not self.max_hedges or not samples or len(samples) < MIN_LATENCY_SAMPLES:
+                return None
+            return max(MIN_HEDGE_DELAY, percentile(samples, HEDGE_QUANTILE))
+
+    def _take_hedge(self, kind):
+        with self.lock:
+            allowed = self.hedges < self.max_hedges
+            if allowed:
+                self.hedges += 1
+        self._count(kind, 'hedged' if allowed else 'capped')
+        return allowed
+
+    def call(self, kind, request, timeout=None, hedge=True):
+        """
+        Run request(attempt) and return its result.
+
+        Args:
+            kind: What is being called ('llm:<model>', 'serper', ...); latency
+                and statistics are kept per kind
+            request: Function of an Attempt doing the request; it may pass
+                attempt.on_cancel a way to abort it
+            timeout: Seconds to wait for an answer from any request
+            hedge: False for requests that must not run twice
+
+        Raises:
+            TimeoutError: if no request answered within timeout
+            JobCancelled: if the stop event is set
+        """
+        self.check_stop()
+        results = queue.Queue()
+        attempts = []
+        caller = threading.current_thread().name
+
+        def launch():
+            attempt = Attempt(len(attempts))
+            attempts.append(attempt)
+
+            def target():
+                start = time.perf_counter()
+                try:
+                    value = request(attempt)
+                except Exception as e:
+                    attempt.finished = True
+                    results.put((attempt, False, e))
+                    return
+                attempt.finished = True
+                self._record(kind, time.perf_counter() - start)
+                results.put((attempt, True, value))
+
+            threading.Thread(target=target, name=f"{caller}-{kind}-{attempt.number}", daemon=True).start()
+
+        self._count(kind, 'calls')
+        start = time.monotonic()
+        delay = self.hedge_delay(kind) if hedge else None
+        launch()
+        finished = 0
+        error = None
+        while True:
+            elapsed = time.monotonic() - start
+            waits = [limit - elapsed for limit in (timeout, delay) if limit is not None]
+            try:
+                attempt, ok, value = results.get(timeout=max(0, min(waits)) if waits else None)
+            except queue.Empty:
+                if timeout is not None and time.monotonic() - start >= timeout:
+                    running = [pending for pending in attempts if not pending.finished and not pending.cleanups]
+                    for pending in attempts:
+                        pending.cancel()
+                    with self.lock:
+                        self.hedges += len(running)
+                    self._count(kind, 'timeouts')
+                    raise TimeoutError(f"{kind} did not answer within {timeout:g}s")
+                if self._take_hedge(kind):
+                    log.debug(f"Hedging a {kind} call after {elapsed:.1f}s")
+                    launch()
+                delay = None
+                continue
+
+            finished += 1
+            if ok:
+                for other in attempts:
+                    if other is not attempt:
+                        other.cancel()
+                if len(attempts) > 1:
+                    self._count(kind, 'hedge_wins' if attempt.number else 'primary_wins')
+                return value
+            # A failed request is not hedged; the caller sees the error once
+            # every request sent has failed
+            error = error or value
+            if finished == len(attempts):
+                raise error
+
+    def merge(self, summary):
+        """Add the statistics of a worker's summary() to this run's"""
+        for kind, stats in (summary or {}).get('by_kind', {}).items():
+            for name in STAT_NAMES:
+                self._count(kind, name, stats.get(name, 0))
+
+    def summary(self):
+        """Calls, duplicates sent and which request won, per kind"""
+        with self.lock:
+            by_kind = {kind: dict(stats) for kind, stats in self.stats.items()}
+            return {
+                'max_hedges': self.max_hedges,
+                'hedged': sum(stats['hedged'] for stats in by_kind.values()),
+                'hedge_wins': sum(stats['hedge_wins'] for stats in by_kind.values()),
+                'timeouts': sum(stats['timeouts'] for stats in by_kind.values()),
+                'by_kind': by_kind,
+            }
+
+# Shared by every agent in the process
+hedger = Hedger()
@@ -1,9 +1,18 @@
+import logging
 import os
-from pydantic import BaseModel, Field
 import json
 from crewai import Agent, Task, Crew, Process
-from crewai_tools import SerperDevTool
 from functools import partial
+from search import CachedSerperDevTool
+import prefetch
+import store
+from usage import MeteredLLM
+import compaction
+from preview import preview
+from plan import Plan
+import filesink
+import logsink
+from logsink import transcripts
 import os
 from dotenv import load_dotenv
 import re
@@ -11,17 +20,22 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 
+log = logging.getLogger(__name__)
 
 # Initialize tools
-news_search_tool = SerperDevTool()
+news_search_tool = CachedSerperDevTool()
 
 # Setup output callbacks
 def json_callback(output, type):
-    """Save task output to JSON file with consistent JSON structure"""
+    """
+    Parse a designer's JSON output, hand it to the pipeline as the task's
+    json_dict and save it to a JSON file with consistent JSON structure.
+
+    Returns:
+        The parsed dict, or None if the output held no valid JSON
+    """
     try:
-        # Create output directory if it doesn't exist
         output_dir = "output"
-        os.makedirs(output_dir, exist_ok=True)
         
         # type is agents or tasks
         filename = f"{output_dir}/{type}.json"
@@ -73,54 +87,59 @@ def json_callback(output, type):
                         formatted_data[formatted_key] = value
                     json_data = formatted_data
                 
+                # Later stages read the parsed dict, not the file
+                if hasattr(output, 'json_dict'):
+                    output.json_dict = json_data
                 # Save as JSON with indentation for readability
-                with open(filename, 'w') as file:
-                    json.dump(json_data, file, indent=2)
-                print(f"✅ JSON output successfully saved to {filename}")
-                return filename
+                if filesink.write_text(filename, json.dumps(json_data, indent=2)):
+                    log.info(f"✅ JSON output successfully saved to {filename}")
+                store.record('record_plan', type, json_data)
+                return json_data
             except json.JSONDecodeError as je:
-                print(f"❌ Error parsing JSON: {str(je)}")
+                log.error(f"❌ Error parsing JSON: {str(je)}")
                 # Fall back to saving the raw text
-                with open(filename, 'w') as file:
-                    file.write(json_str)
-                print(f"✅ Saved raw JSON string to {filename}")
-                return filename
+                if filesink.write_text(filename, json_str):
+                    log.info(f"✅ Saved raw JSON string to {filename}")
+                return None
         else:
-            print("❌ No JSON data found in the output")
+            log.error("❌ No JSON data found in the output")
             # Save whatever we have
-            with open(filename, 'w') as file:
-                file.write(data_to_process)
-            print(f"✅ Saved raw output to {filename}")
-            return filename
+            if filesink.write_text(filename, data_to_process):
+                log.info(f"✅ Saved raw output to {filename}")
+            return None
             
     except Exception as e:
-        print(f"❌ Error saving JSON output: {str(e)}")
+        log.error(f"❌ Error saving JSON output: {str(e)}")
         return None
     
-agents_json_callback = partial(json_callback, type="agents")
 tasks_json_callback = partial(json_callback, type="tasks")
 
-def save_query(output):
-    with open("output/title.txt", "w") as wr:
-        # If output is a TaskOutput object
-        if hasattr(output, 'raw'):
-            wr.write(output.raw)
-        # If output is a string
-        else:
-            wr.write(str(output))
+def agents_json_callback(output):
+    """Save the agent design, then hand the task designer only agent ids, roles and goals"""
+    agents_data = json_callback(output, type="agents")
+    if isinstance(agents_data, dict):
+        compaction.compact_output(output, "agent design", compaction.compact_agents(agents_data))
 
-# Pydantic models for validation
-class AgentConfig(BaseModel):
-    """Configuration for an agent with proper validation"""
-    role: str = Field(..., description="The role of the agent")
-    goal: str = Field(..., description="The primary goal of the agent")
-    backstory: str = Field(..., description="Background story for the agent")
-    
-class TaskConfig(BaseModel):
-    """Configuration for a task with proper validation"""
-    description: str = Field(..., description="Detailed description of the task")
-    agent: str = Field(..., description="ID of the agent assigned to this task")
-    expected_output: str = Field(..., description="Description of expected output format")
+def analysis_callback(output):
+    """Start searching for the analysed entities and perspectives right away"""
+    raw = output.raw if hasattr(output, 'raw') else str(output)
+    store.record('record_query', 'analysis', raw)
+    prefetch.start_prefetch(raw)
+    preview.update(analysis=raw)
+    # Read by both designers
+    compaction.compact_output(output, "query analysis", compaction.compact_analysis(raw), consumers=2)
+
+def save_query(output):
+    # If output is a TaskOutput object
+    if hasattr(output, 'raw'):
+        text = output.raw
+    # If output is a string
+    else:
+        text = str(output)
+    filesink.write_text("output/title.txt", text)
+    store.record('record_query', 'enhanced', text)
+    preview.update(enhanced=text)
+    compaction.compact_output(output, "query enhancement", compaction.compact_enhancement(text))
 
 def create_agents():
     """Create all agents for the integrated workflow"""
@@ -130,8 +149,10 @@ def create_agents():
         backstory="""You are an expert in query refinement with expertise in information retrieval techniques, 
         natural language processing, and domain-specific knowledge. You can identify missing context, 
         suggest relevant keywords, and reframe questions to yield optimal results.""",
-        verbose=True,
+        verbose=logsink.VERBOSE,
         tools=[news_search_tool],
+        llm=MeteredLLM("Query Enhancement Specialist", "planning", "query_enhancement_task"),
+        step_callback=transcripts.callback("Query Enhancement Specialist"),
         allow_delegation=False
     )
     
@@ -142,8 +163,10 @@ def create_agents():
         Your specialty is identifying underlying narratives, key stakeholders, and critical perspectives
         that need investigation. You have a knack for recognizing when a topic needs historical context
         or future implications analysis.""",
-        verbose=True,
+        verbose=logsink.VERBOSE,
         tools=[news_search_tool],
+        llm=MeteredLLM("News Query Analyst", "planning", "query_analysis_task"),
+        step_callback=transcripts.callback("News Query Analyst"),
         allow_delegation=False
     )
 
@@ -154,8 +177,10 @@ def create_agents():
         You understand how to design agents with clear roles, goals, and backstories that are optimized
         for specific information gathering tasks. You ensure that your agent designs provide balanced
         coverage of all perspectives without bias.""",
-        verbose=True,
+        verbose=logsink.VERBOSE,
         tools=[news_search_tool],
+        llm=MeteredLLM("Agent Architecture Designer", "planning", "agent_design_task"),
+        step_callback=transcripts.callback("Agent Architecture Designer"),
         allow_delegation=False
     )
 
@@ -166,7 +191,9 @@ def create_agents():
         research projects into concrete, actionable tasks. You know exactly how to structure
         task descriptions with clear inputs, processes, and expected outputs that will guide
         agents effectively and ensure high-quality results.""",
-        verbose=True,
+        verbose=logsink.VERBOSE,
+        llm=MeteredLLM("Task Framework Engineer", "planning", "task_design_task"),
+        step_callback=transcripts.callback("Task Framework Engineer"),
         allow_delegation=False
     )
     
@@ -205,7 +232,8 @@ def create_tasks(agents, query: str = "{query}"):
         - 'research_areas': list of specific aspects needing investigation
         - 'temporal_aspects': dict with 'historical_context' and 'future_implications' keys""",
         agent=agents["query_analysis_agent"],
-        context=[query_enhancement_task]
+        context=[query_enhancement_task],
+        callback=analysis_callback
     )
 
     # Modified task to ensure specific JSON output format
@@ -236,7 +264,6 @@ def create_tasks(agents, query: str = "{query}"):
         - 'verbose': boolean for logging (default True)""",
         agent=agents["agent_designer"],
         context=[query_analysis_task],
-        output_json=AgentConfig,
         callback=agents_json_callback
     )
 
@@ -267,7 +294,6 @@ def create_tasks(agents, query: str = "{query}"):
         - 'verbose': boolean for logging (default True)""",
         agent=agents["task_designer"],
         context=[query_analysis_task, agent_design_task],
-        output_json=TaskConfig,
         callback=tasks_json_callback
     )
     
@@ -284,20 +310,42 @@ def create_crew(query: str = None):
         agents=agents_list,
         tasks=tasks,
         process=Process.sequential, 
-        verbose=True
+        verbose=logsink.VERBOSE
     )
 
     return crew
 
-def main():
-    
-    user_query = input("Your Query: ")
+def main(query=None):
+    """
+    Enhance and analyse the query and design the research agents and tasks.
+
+    Args:
+        query: The user's query; asked for on the console if not given
+
+    Returns:
+        The designed Plan, or None if the designers' output could not be
+        parsed or validated (dynamic_crew then falls back to the plan stored
+        with the run, see dynamic_crew.load_plan)
+    """
+    user_query = query if query is not None else input("Your Query: ")
+    store.record('record_query', 'user', user_query)
+    compaction.reset()
     crew = create_crew(user_query)
     result = crew.kickoff()
-    print("\nCrew analysis complete!")
-    print(result)
-    print("\nOutput files available in the 'output' directory:")
+    log.info("Crew analysis complete!")
+    log.debug(str(result))
+
+    agents_data, tasks_data = (getattr(task.output, 'json_dict', None) for task in crew.tasks[2:4])
+    if not isinstance(agents_data, dict) or not isinstance(tasks_data, dict):
+        log.error("❌ The agent or task design could not be parsed")
+        return None
+    try:
+        return Plan.from_dicts(agents_data, tasks_data)
+    except ValueError as e:
+        log.error(f"❌ The designed plan is invalid: {e}")
+        return None
 
 
 if __name__ == "__main__":
+    logsink.setup()
     main()
\ No newline at end of file
@@ -0,0 +1,268 @@
+import logging
+import os
+import json
+import time
+import sqlite3
+import threading
+
+log = logging.getLogger(__name__)
+
+# Queue shared by the coordinator and the workers. Workers on other hosts
+# need this file on a filesystem with working locks.
+QUEUE_PATH = 'cache/jobs.db'
+
+# A claimed job belongs to its worker this long without a heartbeat; the
+# heartbeat also uploads the job's progress, so it comes often
+LEASE_SECONDS = 120
+HEARTBEAT_SECONDS = 10
+
+# Attempts per job, and the pause before a failed job can be claimed again
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    heartbeat_at REAL,
+    result TEXT,
+    progress TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS jobs_run ON jobs (run_id);
+CREATE TABLE IF NOT EXISTS workers (
+    name TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+"""
+
+class JobCancelled(Exception):
+    """Raised in a job that lost its lease, to stop its crew"""
+
+class JobQueue:
+    """
+    Job queue in SQLite with leases, heartbeats and retries.
+
+    A worker claims a job with a lease and keeps it with heartbeats. A job
+    whose lease runs out (the worker died or hung) goes back to the queue,
+    as does a job that failed; either way it is given up on after
+    max_attempts attempts. Workers are seen when they claim jobs or send
+    heartbeats, so the coordinator can tell when none is left. Only the worker holding the lease can finish a
+    job, so a job that was taken over is not finished twice. Heartbeats can
+    carry the job's progress, which is what is left of a job cancelled
+    before it finished.
+    """
+
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        self.local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            # Queues created before jobs reported their progress
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            if 'progress' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN progress TEXT')
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA busy_timeout=30000')
+            self.local.conn = conn
+        return conn
+
+    def _transaction(self, work):
+        """Run work(conn) in a write transaction, taken up front so claims never race"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = work(conn)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def publish(self, run_id, name, payload, max_attempts=MAX_ATTEMPTS):
+        """Add a job and return its id"""
+        now = time.time()
+        def work(conn):
+            return conn.execute(
+                'INSERT INTO jobs (run_id, name, payload, max_attempts, available_at, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (run_id, name, json.dumps(payload), max_attempts, now, now, now)).lastrowid
+        return self._transaction(work)
+
+    @staticmethod
+    def _reclaim(conn, now):
+        # Jobs whose worker went quiet are up for grabs again, or given up
+        failed = conn.execute("UPDATE jobs SET status = 'failed', error = 'lease expired', updated_at = ? "
+                              "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+                              (now, now)).rowcount
+        return failed + conn.execute("UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ? "
+                                     "WHERE status = 'leased' AND lease_expires < ?", (now, now)).rowcount
+
+    @staticmethod
+    def _seen(conn, worker, now):
+        conn.execute('INSERT INTO workers (name, seen_at) VALUES (?, ?) '
+                     'ON CONFLICT (name) DO UPDATE SET seen_at = excluded.seen_at', (worker, now))
+
+    def reclaim_expired(self):
+        """Put jobs whose lease ran out back on the queue, or fail them once out of attempts; returns how many"""
+        now = time.time()
+        return self._transaction(lambda conn: self._reclaim(conn, now))
+
+    def claim(self, worker, lease_seconds=LEASE_SECONDS):
+        """
+        Lease the oldest job that is ready to run to worker.
+
+        Returns:
+            Dict with the job's id, run_id, name, payload and attempt, or None
+        """
+        now = time.time()
+        def work(conn):
+            self._seen(conn, worker, now)
+            self._reclaim(conn, now)
+            row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' AND available_at <= ? "
+                               "ORDER BY available_at, id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'leased', attempts = attempts + 1, worker = ?, "
+                         "lease_expires = ?, heartbeat_at = ?, updated_at = ? WHERE id = ?",
+                         (worker, now + lease_seconds, now, now, row['id']))
+            return {'id': row['id'], 'run_id': row['run_id'], 'name': row['name'],
+                    'payload': json.loads(row['payload']), 'attempt': row['attempts'] + 1}
+        return self._transaction(work)
+
+    def heartbeat(self, job_id, worker, progress=None, lease_seconds=LEASE_SECONDS):
+        """Extend the lease and store the job's progress, if given; False if the job is no longer this worker's"""
+        now = time.time()
+        encoded = json.dumps(progress) if progress is not None else None
+        def work(conn):
+            self._seen(conn, worker, now)
+            return conn.execute("UPDATE jobs SET lease_expires = ?, heartbeat_at = ?, updated_at = ?, "
+                                "progress = COALESCE(?, progress) "
+                                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                                (now + lease_seconds, now, now, encoded, job_id, worker)).rowcount == 1
+        return self._transaction(work)
+
+    def complete(self, job_id, worker, result):
+        """Store a job's result; False if the job is no longer this worker's"""
+        now = time.time()
+        def work(conn):
+            return conn.execute("UPDATE jobs SET status = 'done', result = ?, lease_expires = NULL, updated_at = ? "
+                                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                                (json.dumps(result), now, job_id, worker)).rowcount == 1
+        return self._transaction(work)
+
+    def fail(self, job_id, worker, error, retry_delay=RETRY_DELAY):
+        """Give a failed job back to the queue, or fail it for good once out of attempts"""
+        now = time.time()
+        def work(conn):
+            return conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+                "worker = NULL, lease_expires = NULL, available_at = ?, error = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (now + retry_delay, error, now, job_id, worker)).rowcount == 1
+        return self._transaction(work)
+
+    def cancel_run(self, run_id):
+        """Stop every unfinished job of a run from being claimed or finished"""
+        now = time.time()
+        def work(conn):
+            return conn.execute("UPDATE jobs SET status = 'cancelled', updated_at = ? "
+                                "WHERE run_id = ? AND status IN ('queued', 'leased')", (now, run_id)).rowcount
+        return self._transaction(work)
+
+    def abandon(self, run_id, error):
+        """Fail the jobs of a run that a worker started but that are back in the queue; returns how many"""
+        now = time.time()
+        def work(conn):
+            return conn.execute("UPDATE jobs SET status = 'failed', error = ?, updated_at = ? "
+                                "WHERE run_id = ? AND status = 'queued' AND attempts > 0",
+                                (error, now, run_id)).rowcount
+        return self._transaction(work)
+
+    def workers(self, within=LEASE_SECONDS):
+        """Names of the workers that claimed a job or sent a heartbeat in the last within seconds"""
+        rows = self.connection().execute('SELECT name FROM workers WHERE seen_at >= ? ORDER BY name',
+                                         (time.time() - within,))
+        return [row['name'] for row in rows]
+
+    def jobs(self, run_id):
+        """Every job of a run, with its result and progress decoded"""
+        rows = self.connection().execute('SELECT * FROM jobs WHERE run_id = ? ORDER BY id', (run_id,))
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job['payload'] = json.loads(job['payload'])
+            job['result'] = json.loads(job['result']) if job['result'] else None
+            job['progress'] = json.loads(job['progress']) if job['progress'] else None
+            jobs.append(job)
+        return jobs
+
+    def pending(self, run_id=None):
+        """Number of jobs still queued or running"""
+        if run_id is None:
+            row = self.connection().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'leased')").fetchone()
+        else:
+            row = self.connection().execute(
+                "SELECT COUNT(*) FROM jobs WHERE run_id = ? AND status IN ('queued', 'leased')", (run_id,)).fetchone()
+        return row[0]
+
+class Heartbeat:
+    """
+    Keeps a claimed job's lease alive from a background thread while the job
+    runs. With a progress function, each heartbeat also uploads what it
+    returns. Once the lease is lost (the job was cancelled or taken over),
+    the stop event is set, so the job's requests can stop it.
+    """
+
+    def __init__(self, queue, job_id, worker, every=HEARTBEAT_SECONDS, progress=None, stop=None):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker = worker
+        self.every = every
+        self.progress = progress
+        self.stop = stop or threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._beat, daemon=True)
+
+    @property
+    def lost(self):
+        return self.stop.is_set()
+
+    def _beat(self):
+        while not self.stopped.wait(self.every):
+            try:
+                progress = self.progress() if self.progress else None
+                if not self.queue.heartbeat(self.job_id, self.worker, progress):
+                    self.stop.set()
+                    log.error(f"❌ Lost the lease on job {self.job_id}")
+                    return
+            except sqlite3.Error as e:
+                log.error(f"❌ Heartbeat for job {self.job_id} failed: {e}")
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
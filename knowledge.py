@@ -0,0 +1,231 @@
+import logging
+import os
+import re
+import json
+import time
+import sqlite3
+import datetime
+import threading
+from typing import Type
+from pydantic import BaseModel, Field
+from crewai.tools import BaseTool
+from search import SEARCH_CACHE_DIR
+import store
+
+log = logging.getLogger(__name__)
+
+# BM25 index over past reports and cached searches, kept between runs
+KNOWLEDGE_PATH = 'cache/knowledge.db'
+
+# The tool picks up new reports and searches at most this often
+REFRESH_INTERVAL = 60
+
+# Snippets returned to an agent per lookup
+KNOWLEDGE_RESULTS = 6
+
+# Matches in a title count this much more than matches in the body
+TITLE_WEIGHT = 4.0
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    title,
+    body,
+    source UNINDEXED,
+    url UNINDEXED,
+    created_at UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    version REAL NOT NULL
+);
+"""
+
+def split_sections(markdown):
+    """Split a report into (heading, text) chunks at its ## headings, ignoring code fences"""
+    sections = []
+    heading, lines, in_fence = '', [], False
+    for line in markdown.splitlines():
+        if line.lstrip().startswith(('```', '~~~')):
+            in_fence = not in_fence
+        if not in_fence and re.match(r'#{1,2}\s', line):
+            if ''.join(lines).strip():
+                sections.append((heading, '\n'.join(lines).strip()))
+            heading, lines = line.lstrip('#').strip(), []
+        else:
+            lines.append(line)
+    if ''.join(lines).strip():
+        sections.append((heading, '\n'.join(lines).strip()))
+    return sections
+
+def search_documents(results):
+    """(title, body, url, date) for each hit in a Serper result"""
+    if isinstance(results, str):
+        try:
+            results = json.loads(results)
+        except json.JSONDecodeError:
+            return []
+    if not isinstance(results, dict):
+        return []
+    documents = []
+    for key in ('organic', 'news', 'topStories'):
+        for item in results.get(key) or []:
+            if isinstance(item, dict) and (item.get('title') or item.get('snippet')):
+                documents.append((item.get('title', ''), item.get('snippet', ''),
+                                  item.get('link', ''), item.get('date')))
+    return documents
+
+def match_expression(query):
+    """FTS5 query matching any of the words in query; quoting keeps operators out"""
+    terms = [term for term in re.findall(r'\w+', query.lower()) if len(term) > 1]
+    return ' OR '.join(f'"{term}"' for term in dict.fromkeys(terms))
+
+class KnowledgeIndex:
+    """
+    Incrementally updated BM25 index (SQLite FTS5) of earlier research
+    reports from the run store and of cached search results.
+
+    Each indexed source remembers the version it was indexed at, so refresh()
+    only reads reports and search results that are new or have changed.
+    """
+
+    def __init__(self, path=KNOWLEDGE_PATH, search_cache_dir=SEARCH_CACHE_DIR):
+        self.path = path
+        self.search_cache_dir = search_cache_dir
+        self.lock = threading.Lock()
+        self.last_refresh = 0.0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+        self.versions = dict(self.conn.execute('SELECT source, version FROM sources'))
+
+    def _replace(self, source, version, rows):
+        """Swap the documents of one source for rows of (title, body, url, created_at)"""
+        self.conn.execute('DELETE FROM documents WHERE source = ?', (source,))
+        self.conn.executemany(
+            'INSERT INTO documents (title, body, source, url, created_at) VALUES (?, ?, ?, ?, ?)',
+            [(title, body, source, url, created_at) for title, body, url, created_at in rows]
+        )
+        self.conn.execute('INSERT OR REPLACE INTO sources (source, version) VALUES (?, ?)', (source, version))
+        self.versions[source] = version
+
+    def _index_reports(self):
+        newest = max((version for source, version in self.versions.items() if source.startswith('report:')),
+                      default=0.0)
+        rows = store.get_store().execute(
+            'SELECT run_id, role, markdown, created_at FROM outputs WHERE created_at > ? AND incomplete = 0',
+            (newest,)
+        ).fetchall()
+        for row in rows:
+            when = datetime.datetime.fromtimestamp(row['created_at']).isoformat(timespec='minutes')
+            source = f"report:{row['run_id']}:{row['role']}"
+            documents = [(f"{row['role']}: {heading}" if heading else row['role'], text, '', when)
+                         for heading, text in split_sections(row['markdown'])]
+            self._replace(source, row['created_at'], documents)
+        return len(rows)
+
+    def _index_searches(self):
+        try:
+            names = [name for name in os.listdir(self.search_cache_dir) if name.endswith('.json')]
+        except OSError:
+            return 0
+        count = 0
+        for name in names:
+            path = os.path.join(self.search_cache_dir, name)
+            source = f"search:{name[:-5]}"
+            try:
+                version = os.path.getmtime(path)
+                if self.versions.get(source) == version:
+                    continue
+                with open(path, 'r', encoding='utf-8') as file:
+                    entry = json.load(file)
+            except (OSError, json.JSONDecodeError):
+                continue
+            searched = datetime.datetime.fromtimestamp(entry.get('time', version)).isoformat(timespec='minutes')
+            documents = [(title, body, url, date or searched)
+                         for title, body, url, date in search_documents(entry.get('results'))]
+            self._replace(source, version, documents)
+            count += 1
+        return count
+
+    def refresh(self, force=False):
+        """Index reports and searches added since the last refresh"""
+        with self.lock:
+            if not force and time.monotonic() - self.last_refresh < REFRESH_INTERVAL:
+                return
+            self.last_refresh = time.monotonic()
+            try:
+                with self.conn:
+                    reports = self._index_reports()
+                    searches = self._index_searches()
+            except sqlite3.Error as e:
+                log.error(f"❌ Knowledge index refresh failed: {e}")
+                return
+        if reports or searches:
+            log.info(f"📚 Indexed {reports} past reports and {searches} cached searches")
+
+    def search(self, query, limit=KNOWLEDGE_RESULTS):
+        """
+        Best BM25 matches for query.
+
+        Returns:
+            List of dicts with title, snippet, source, url and created_at
+        """
+        expression = match_expression(query)
+        if not expression:
+            return []
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT title, snippet(documents, 1, '', '', ' … ', 40), source, url, created_at "
+                "FROM documents WHERE documents MATCH ? ORDER BY bm25(documents, ?, 1.0) LIMIT ?",
+                (expression, TITLE_WEIGHT, limit)
+            ).fetchall()
+        return [dict(zip(('title', 'snippet', 'source', 'url', 'created_at'), row)) for row in rows]
+
+class KnowledgeSearchInput(BaseModel):
+    """Input for LocalKnowledgeTool"""
+    query: str = Field(..., description="What to look up in earlier analyses and searches")
+
+class LocalKnowledgeTool(BaseTool):
+    name: str = "Search past analyses"
+    description: str = (
+        "Searches the reports written in earlier runs and the web search results "
+        "already gathered, without going to the web. Returns dated snippets. Use it "
+        "first for background and for stories that were covered before; use the web "
+        "search for anything recent or not found here."
+    )
+    args_schema: Type[BaseModel] = KnowledgeSearchInput
+
+    def _run(self, query: str) -> str:
+        index = get_index()
+        index.refresh()
+        hits = index.search(query)
+        if not hits:
+            return "Nothing relevant found in past analyses."
+        lines = []
+        for hit in hits:
+            kind, _, name = hit['source'].partition(':')
+            origin = hit['url'] if kind == 'search' else f"report from run {name.split(':')[0]}"
+            lines.append(f"[{hit['created_at']}] {hit['title']} ({origin})\n{hit['snippet']}")
+        return '\n\n'.join(lines)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = KnowledgeIndex()
+        return _index
+
+if __name__ == "__main__":
+    # python knowledge.py QUERY: try the index from the command line
+    import sys
+    index = get_index()
+    index.refresh(force=True)
+    for hit in index.search(' '.join(sys.argv[1:])):
+        print(f"[{hit['created_at']}] {hit['title']}\n    {hit['snippet']}\n")
@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+import filesink
+
+# One JSONL log per run (or per worker)
+LOG_DIR = 'logs'
+
+# Records waiting for the writer thread; past this, records are dropped
+# rather than blocking the agent that logged them
+LOG_QUEUE_SIZE = 10000
+
+# The JSONL file is written in batches of this many records, straight away
+# for errors, and at least every this many seconds
+FLUSH_RECORDS = 200
+FLUSH_SECONDS = 2.0
+
+# Steps kept per agent, and characters kept per step, for recent transcripts
+TRANSCRIPT_STEPS = 40
+TRANSCRIPT_CHARS = 2000
+TRANSCRIPTS_PATH = 'output/transcripts.json'
+
+# crewai's own step-by-step stdout output; off unless asked for, since it
+# prints whole agent transcripts from the crew's threads
+VERBOSE = os.getenv('SATYARTHI_VERBOSE', '').lower() in ('1', 'true', 'yes')
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that never blocks: when the queue is full the record is counted and dropped"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class Listener(QueueListener):
+    """Queue listener whose stop waits for room in a full queue instead of failing"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+class JSONLHandler(logging.Handler):
+    """
+    Appends records to a JSONL file in batches. Records come from the
+    listener thread; a timer thread writes what is buffered every
+    FLUSH_SECONDS, so records are not held back while the run is quiet.
+    """
+
+    def __init__(self, path, level=logging.NOTSET):
+        super().__init__(level)
+        self.path = path
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.closed = threading.Event()
+        self.timer = threading.Thread(target=self._flush_every, name='jsonl-flush', daemon=True)
+        self.timer.start()
+
+    def _flush_every(self):
+        while not self.closed.wait(FLUSH_SECONDS):
+            with self.lock:
+                self.flush()
+
+    def emit(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        self.buffer.append(json.dumps(entry, ensure_ascii=False, default=str))
+        if (len(self.buffer) >= FLUSH_RECORDS or record.levelno >= logging.ERROR
+                or time.monotonic() - self.last_flush >= FLUSH_SECONDS):
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            filesink.append_text(self.path, '\n'.join(self.buffer) + '\n')
+            self.buffer.clear()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.closed.set()
+        self.timer.join()
+        with self.lock:
+            self.flush()
+        super().close()
+
+class TranscriptBuffer:
+    """
+    The last TRANSCRIPT_STEPS steps of every agent (thoughts, tool calls and
+    results), kept in memory so a failed or cut-off agent can be looked into
+    without printing every transcript as it happens.
+    """
+
+    def __init__(self, steps=TRANSCRIPT_STEPS, chars=TRANSCRIPT_CHARS):
+        self.steps = steps
+        self.chars = chars
+        self.agents = {}
+        self.lock = threading.Lock()
+
+    def add(self, role, kind, text):
+        text = str(text)
+        if len(text) > self.chars:
+            text = text[:self.chars] + ' …'
+        with self.lock:
+            steps = self.agents.setdefault(role, deque(maxlen=self.steps))
+            steps.append({'ts': round(time.time(), 3), 'kind': kind, 'text': text})
+
+    def add_step(self, role, step):
+        """crewai step callback: keep the step's thought, tool call and result"""
+        for kind in ('thought', 'tool', 'tool_input', 'result', 'output'):
+            value = getattr(step, kind, None)
+            if value:
+                self.add(role, kind, value)
+
+    def callback(self, role):
+        return lambda step: self.add_step(role, step)
+
+    def snapshot(self):
+        with self.lock:
+            return {role: list(steps) for role, steps in self.agents.items()}
+
+    def write(self, path=TRANSCRIPTS_PATH):
+        snapshot = self.snapshot()
+        if not snapshot:
+            return None
+        return filesink.write_text(path, json.dumps(snapshot, indent=2, ensure_ascii=False))
+
+    def reset(self):
+        with self.lock:
+            self.agents.clear()
+
+# Shared by every agent in the process
+transcripts = TranscriptBuffer()
+
+_listener = None
+_handler = None
+
+def setup(name=None, level='INFO'):
+    """
+    Send every log record through a queue to a writer thread that prints
+    INFO and above to the console and appends everything at level to
+    logs/<name>.jsonl. level only applies to the file, so the console keeps
+    its progress messages. Calling it again restarts logging with a new file.
+
+    Returns:
+        Path of the JSONL log, or None without a name
+    """
+    global _listener, _handler
+    shutdown()
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter('%(message)s'))
+    handlers = [console]
+    path = None
+    if name:
+        path = os.path.join(LOG_DIR, f"{name}.jsonl")
+        handlers.append(JSONLHandler(path, level))
+    _listener = Listener(log_queue, *handlers, respect_handler_level=True)
+    _handler = DroppingQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    root.handlers = [handler for handler in root.handlers if not isinstance(handler, DroppingQueueHandler)]
+    root.addHandler(_handler)
+    # Low enough for the console and the file
+    root.setLevel(min(handler.level for handler in handlers))
+    # Third-party libraries log a lot at INFO; only their warnings are kept
+    for noisy in ('httpx', 'httpcore', 'LiteLLM', 'litellm', 'urllib3'):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    _listener.start()
+    return path
+
+def shutdown():
+    """Write the records still queued and stop the writer thread"""
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    logging.getLogger().removeHandler(_handler)
+    if _handler.dropped:
+        sys.stderr.write(f"❌ {_handler.dropped} log records were dropped, the log queue was full\n")
+    _listener = _handler = None
@@ -1,9 +1,11 @@
 import os
 import shutil
-import initial
-import dynamic_crew
-import paste
-import run
+import logging
+import argparse
+import usage
+import logsink
+from preview import PREVIEW_PATH
+from pipeline import PipelineOptions, run_pipeline
 
 directories = [
     'data/',
@@ -26,15 +28,95 @@ for dir_path in directories:
     else:
         print(f"Directory does not exist: {dir_path}")
 
-def main():
-    initial.main()
-    dynamic_crew.main()
-    paste.main()
-    run.create_navigation_html()
-    print("✅ Completed Successfully!")
-    print("✅ Now open main.html!")
+log = logging.getLogger(__name__)
+
+def main(deadline_seconds=None, max_agents=None, budget=None, profile=False, token_budgets=None,
+         refresh=None, rerun=None, show_preview=False, workers=None, log_level='INFO',
+         parquet=False, max_hedges=0):
+    """
+    Run the whole pipeline from the command line (see pipeline.run_pipeline).
+
+    Args:
+        deadline_seconds: Optional wall-clock budget for the run. Agents still
+            researching when their share runs out are cut off and their
+            partial results are rendered, marked as incomplete.
+        max_agents: Cap on the number of research agents
+        budget: Research budget in USD, turned into an agent cap
+        profile: Write CPU (pstats) and memory profiles of every stage to
+            profiles/<run id>/
+        token_budgets: Token/cost budgets per call, agent, task, stage and
+            run, as parsed by usage.parse_budgets
+        refresh: Id of an earlier run (or 'latest') to refresh instead of
+            planning from scratch; only its stale agents research again
+        rerun: Agent keys or roles to rerun in a refresh even if fresh
+        show_preview: Keep preview.html up to date from the query analysis
+            on, adding research reports as they arrive
+        workers: Publish the research agents as jobs on the queue and start
+            this many local workers for them (0: only workers started
+            separately with worker.py, possibly on other machines). None runs
+            the agents in this process.
+        log_level: Lowest level written to logs/<run id>.jsonl
+        parquet: Also write the run's analytics rows as Parquet
+        max_hedges: Duplicate requests the run may send for LLM calls and
+            searches slower than their usual p95 latency; the first answer
+            wins. 0 only bounds calls by their timeouts.
+    """
+    options = PipelineOptions(deadline_seconds=deadline_seconds, max_agents=max_agents, budget=budget,
+                              token_budgets=token_budgets or {}, profile=profile, refresh=refresh,
+                              rerun=rerun or [], show_preview=show_preview, workers=workers,
+                              log_level=log_level, analytics_parquet=parquet, max_hedges=max_hedges)
+    result = run_pipeline(options=options)
+    log.info(f"✅ Completed Successfully! (run {result.run_id})")
+    log.info("✅ Now open main.html!")
 
 if __name__ =="__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Satyarthi news analysis")
+    parser.add_argument('--deadline', type=float, metavar='SECONDS',
+                        help="wall-clock budget; return partial results when it runs out")
+    parser.add_argument('--max-agents', type=int, metavar='N',
+                        help="cap on research agents; overlapping ones are merged first")
+    parser.add_argument('--budget', type=float, metavar='USD',
+                        help="research budget, converted into an agent cap")
+    parser.add_argument('--profile', action='store_true',
+                        help="write per-stage CPU and memory profiles to profiles/<run id>/")
+    parser.add_argument('--token-budget', action='append', metavar='SCOPE=LIMIT',
+                        help="token (e.g. agent=40000) or USD (e.g. run=$0.50) budget for "
+                             "call, agent, task, stage or run; repeatable")
+    parser.add_argument('--refresh', nargs='?', const='latest', metavar='RUN_ID',
+                        help="refresh an earlier run (default: the latest), rerunning only stale agents")
+    parser.add_argument('--preview', action='store_true',
+                        help=f"write {PREVIEW_PATH} as soon as the query is analysed and update it as reports arrive")
+    parser.add_argument('--rerun', action='append', metavar='AGENT',
+                        help="with --refresh, also rerun this agent (key or role); repeatable")
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help="run research agents as jobs on the queue with N local workers "
+                             "(0: only workers started with worker.py)")
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                        help="lowest level written to logs/<run id>.jsonl")
+    parser.add_argument('--hedge', type=int, default=0, metavar='N',
+                        help="send a duplicate of LLM calls and searches that are slower than usual, "
+                             "at most N per run")
+    parser.add_argument('--parquet', action='store_true',
+                        help="also write the run's analytics rows as Parquet (needs pyarrow)")
+    parser.add_argument('--verbose', action='store_true',
+                        help="print crewai's full agent transcripts as they happen (slow with many agents)")
+    args = parser.parse_args()
+    if args.verbose:
+        # Also picked up by local workers
+        os.environ['SATYARTHI_VERBOSE'] = '1'
+        logsink.VERBOSE = True
+    if args.rerun and not args.refresh:
+        parser.error("--rerun only works with --refresh")
+    try:
+        token_budgets = usage.parse_budgets(args.token_budget)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        main(deadline_seconds=args.deadline, max_agents=args.max_agents, budget=args.budget,
+             profile=args.profile, token_budgets=token_budgets, refresh=args.refresh, rerun=args.rerun,
+             show_preview=args.preview, workers=args.workers, log_level=args.log_level,
+             parquet=args.parquet, max_hedges=args.hedge)
+    finally:
+        logsink.shutdown()
 
 
@@ -1,71 +1,197 @@
+import io
+import logging
 import re
 import sys
 import os
-from bs4 import BeautifulSoup, Tag
+import copy
+import shutil
+import tempfile
+import threading
+from bs4 import BeautifulSoup, Tag, Comment
 import markdown
 import textwrap
+from deadline import INCOMPLETE_MARKER
+import store
+import filesink
+from render_cache import get_render_cache, section_key
 
-def convert_markdown_to_html_cards(markdown_file_path, char_limit=300):
+log = logging.getLogger(__name__)
+
+# Markdown extensions used for every render
+MARKDOWN_EXTENSIONS = ['tables', 'fenced_code']
+
+# One converter per thread; setting one up costs more than converting a section
+_converters = threading.local()
+
+def convert_markdown(text):
+    """Markdown to HTML with MARKDOWN_EXTENSIONS"""
+    converter = getattr(_converters, 'markdown', None)
+    if converter is None:
+        converter = _converters.markdown = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return converter.reset().convert(text)
+
+# Card layouts: 'classic' puts a truncated preview in the card and the full
+# content in a modal per section; 'compact' stores the content once in the
+# card, clamps it with CSS and shows it in one shared modal
+LAYOUTS = ['classic', 'compact']
+
+# Cards after this many are rendered by the browser only when scrolled near
+LAZY_AFTER = 6
+
+# Placeholders marking where modals and cards go in the page skeleton
+MODALS_MARKER = 'satyarthi:modals'
+CARDS_MARKER = 'satyarthi:cards'
+
+# Sections are cached with this in place of their card number, which is
+# filled in when the page is put together
+INDEX_PLACEHOLDER = 'satyarthi-index'
+
+# Part of every render cache key; bump it whenever the card or modal markup
+# changes so cached sections are rendered again
+TEMPLATE_VERSION = 1
+
+# Parser backends, fastest first; the first installed one is the default.
+# selectolax (lexbor, in C) and lxml tokenize in C and hand the tree to
+# BeautifulSoup; html.parser is pure Python and always available.
+PARSER_BACKENDS = ['selectolax', 'lxml', 'html.parser']
+
+# Markup as Python-Markdown (with MARKDOWN_EXTENSIONS) generates it: these
+# tags, closed and nested the way HTML expects. Every backend parses such
+# markup to the same tree. The parsers' error recovery differs, so anything
+# else (raw HTML from the report that is malformed or nested in ways HTML
+# would repair) is always parsed with html.parser.
+INLINE_TAGS = frozenset(['em', 'strong', 'a', 'code', 'img', 'br'])
+BLOCK_TAGS = frozenset(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'blockquote', 'pre', 'hr',
+                        'table', 'thead', 'tbody', 'tr', 'th', 'td'])
+VOID_TAGS = frozenset(['img', 'br', 'hr'])
+# Tags that only hold inline content
+PHRASING_TAGS = frozenset(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'th', 'td']) | INLINE_TAGS
+# Tags that must sit directly in one of these
+REQUIRED_PARENTS = {
+    'li': ('ul', 'ol'), 'thead': ('table',), 'tbody': ('table',), 'tr': ('thead', 'tbody'), 'th': ('tr',),
+    'td': ('tr',),
+}
+TABLE_TAGS = frozenset(['table', 'thead', 'tbody', 'tr'])
+TAG_PATTERN = re.compile(r'<(/?)([A-Za-z][A-Za-z0-9]*)\b[^>]*>|<')
+
+def available_parsers():
+    """List the installed parser backends, fastest first"""
+    available = []
+    for name in PARSER_BACKENDS:
+        try:
+            if name == 'selectolax':
+                import selectolax.lexbor  # noqa: F401
+            elif name == 'lxml':
+                import lxml  # noqa: F401
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+PARSER = available_parsers()[0]
+
+def set_parser(name):
     """
-    Convert a markdown file to HTML where ## headings become cards arranged 2 per row
-    with a "See More" option for long content
-    
+    Select the parser backend used for every render.
+
     Args:
-        markdown_file_path: Path to the markdown file
-        char_limit: Character limit before adding a "See More" button
+        name: One of PARSER_BACKENDS, or None for the fastest installed one
     """
-    # Read markdown file
-    with open(markdown_file_path, 'r', encoding='utf-8') as file:
-        markdown_content = file.read()
-    
-    # First convert markdown to HTML using markdown library with extra extensions
-    html_content = markdown.markdown(markdown_content, extensions=['tables', 'fenced_code'])
-    
-    # Parse the HTML
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Get the main heading (h1) if it exists
-    main_heading = soup.find('h1')
-    main_heading_text = main_heading.text if main_heading else "News Analysis"
-    
-    # Find all h2 headings
-    h2_headings = soup.find_all('h2')
-    
-    # Create new HTML structure
-    new_soup = BeautifulSoup('', 'html.parser')
-    
-    # Add HTML5 doctype
-    doctype = '<!DOCTYPE html>'
-    
-    # Create HTML structure
-    html_tag = new_soup.new_tag('html')
-    head_tag = new_soup.new_tag('head')
-    
-    # Add meta tags
-    meta_charset = new_soup.new_tag('meta')
-    meta_charset['charset'] = 'UTF-8'
-    head_tag.append(meta_charset)
-    
-    meta_viewport = new_soup.new_tag('meta')
-    meta_viewport['name'] = 'viewport'
-    meta_viewport['content'] = 'width=device-width, initial-scale=1.0'
-    head_tag.append(meta_viewport)
+    global PARSER
+    available = available_parsers()
+    if name is None:
+        name = available[0]
+    if name not in available:
+        raise ValueError(f"Parser '{name}' is not available, choose from {available}")
+    PARSER = name
+
+def is_markdown_markup(markup):
+    """
+    Whether markup only holds MARKDOWN tags, closed and nested as HTML
+    expects, so that every parser backend reads it the same way. Comments,
+    other tags and markup HTML parsers would repair (a block inside a <p>,
+    a link inside a link, text loose in a table) do not pass.
+    """
+    stack = []
+    position = 0
+    for match in TAG_PATTERN.finditer(markup):
+        # Text loose in a table is moved out of it by HTML5 parsers
+        if stack and stack[-1] in TABLE_TAGS and markup[position:match.start()].strip():
+            return False
+        position = match.end()
+        name = match.group(2)
+        if name is None:
+            return False
+        name = name.lower()
+        if name not in INLINE_TAGS and name not in BLOCK_TAGS:
+            return False
+        if match.group(1):
+            if not stack or stack.pop() != name:
+                return False
+            continue
+        if stack and (stack[-1] in PHRASING_TAGS and name in BLOCK_TAGS
+                      or stack[-1] == 'pre' and name != 'code'
+                      or stack[-1] in TABLE_TAGS and name not in BLOCK_TAGS):
+            return False
+        if name in REQUIRED_PARENTS and (not stack or stack[-1] not in REQUIRED_PARENTS[name]):
+            return False
+        if name == 'a' and 'a' in stack:
+            return False
+        # HTML parsers drop a newline straight after <pre>
+        if name == 'pre' and not markup.startswith('<code', match.end()):
+            return False
+        if name not in VOID_TAGS:
+            stack.append(name)
+    return not stack
+
+def lexbor_soup(markup):
+    """Parse markup with selectolax's lexbor and build the BeautifulSoup tree from it"""
+    from selectolax.lexbor import LexborHTMLParser
     
-    # Add title
-    title_tag = new_soup.new_tag('title')
-    title_tag.string = main_heading_text
-    head_tag.append(title_tag)
+    soup = BeautifulSoup('', 'html.parser')
     
-    # Add favicon link (optional - you can replace with your own favicon)
-    favicon = new_soup.new_tag('link')
-    favicon['rel'] = 'icon'
-    favicon['href'] = 'data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><text y=".9em" font-size="90">📰</text></svg>'
-    favicon['type'] = 'image/svg+xml'
-    head_tag.append(favicon)
+    def build(node):
+        child = node.child
+        while child is not None:
+            if child.tag == '-text':
+                soup.handle_data(child.text_content)
+                soup.endData()
+            elif not child.tag.startswith('-'):
+                soup.handle_starttag(child.tag, None, None, dict(child.attributes))
+                build(child)
+                soup.handle_endtag(child.tag)
+            child = child.next
     
-    # Add CSS styles here (using your modernized CSS)
-    style_tag = new_soup.new_tag('style')
-    style_tag.string = """
+    build(LexborHTMLParser(markup).body)
+    return soup
+
+def lxml_soup(markup):
+    """Parse markup with lxml, without the <html><body> wrapper it adds to fragments"""
+    soup = BeautifulSoup(markup, 'lxml')
+    # Move children out front to back; unwrap() is quadratic on long fragments
+    if soup.body is not None:
+        for child in list(soup.body.contents):
+            soup.append(child)
+    if soup.html is not None:
+        soup.html.decompose()
+    return soup
+
+def make_soup(markup, parser=None):
+    """
+    Parse an HTML fragment with the selected backend (PARSER).
+
+    Every backend gives the same tree: fragments the C parsers would read
+    differently from html.parser (raw HTML, leading text, which lxml wraps
+    in a <p>) go through html.parser whatever is selected.
+    """
+    parser = parser or PARSER
+    if parser == 'html.parser' or not markup.startswith('<') or not is_markdown_markup(markup):
+        return BeautifulSoup(markup, 'html.parser')
+    if parser == 'selectolax':
+        return lexbor_soup(markup)
+    return lxml_soup(markup)
+
+PAGE_STYLE = """
 :root {
   --primary-color: #2d3748;
   --secondary-color: #2d3748;
@@ -110,6 +236,10 @@ h1 {
   font-weight: 400;
 }
 
+.incomplete-note {
+  color: #c05621;
+}
+
 .container {
   max-width: 1200px;
   margin: 0 auto;
@@ -137,6 +267,22 @@ h1 {
   max-height: 600px;
 }
 
+.card[data-lazy] .card-content {
+  min-height: 12rem;
+}
+
+.card.incomplete .card-header h2::after {
+  content: 'Incomplete';
+  margin-left: 0.75rem;
+  padding: 0.15rem 0.5rem;
+  font-size: 0.75rem;
+  font-weight: 600;
+  vertical-align: middle;
+  color: #c05621;
+  background-color: rgba(237, 137, 54, 0.15);
+  border-radius: 999px;
+}
+
 .card:hover {
   transform: translateY(-3px);
   box-shadow: var(--shadow-lg);
@@ -174,6 +320,14 @@ h1 {
   max-height: 400px; /* Control the maximum height of content */
 }
 
+.card-content.clamped {
+  display: block;
+  max-height: 14rem;
+  overflow: hidden;
+  -webkit-mask-image: linear-gradient(to bottom, #000 70%, transparent);
+  mask-image: linear-gradient(to bottom, #000 70%, transparent);
+}
+
 .card-content p {
   margin-top: 0;
   color: var(--secondary-color);
@@ -430,60 +584,151 @@ footer p {
   }
 }
     """
-    head_tag.append(style_tag)
-    
-    # Add JavaScript for modal functionality
-    script_tag = new_soup.new_tag('script')
-    script_content = """
+
+PAGE_SCRIPT = """
     document.addEventListener('DOMContentLoaded', function() {
-        // Get all modals
-        var modals = document.querySelectorAll('.modal');
-        
-        // Get all buttons that open a modal
-        var btns = document.querySelectorAll('.see-more-btn');
-        
-        // Get all elements that close the modal
-        var spans = document.querySelectorAll('.close');
-        
-        // When the user clicks the button, open the modal
-        btns.forEach(function(btn) {
-            btn.addEventListener('click', function() {
-                var modalId = this.getAttribute('data-modal');
-                document.getElementById(modalId).style.display = 'block';
-                document.body.style.overflow = 'hidden';
-            });
-        });
+        // Only one modal is open at a time
+        var openModal = null;
         
-        // When the user clicks on <span> (x), close the modal
-        spans.forEach(function(span) {
-            span.addEventListener('click', closeModals);
-        });
+        // Render content kept in a <template> until it is needed
+        function inflate(element) {
+            var template = element.querySelector('template');
+            if (template) {
+                template.replaceWith(template.content);
+            }
+        }
         
-        // When the user clicks anywhere outside of the modal, close it
-        window.addEventListener('click', function(event) {
-            modals.forEach(function(modal) {
-                if (event.target == modal) {
-                    closeModals();
-                }
-            });
-        });
+        function showModal(modal) {
+            modal.style.display = 'block';
+            document.body.style.overflow = 'hidden';
+            openModal = modal;
+        }
         
         function closeModals() {
-            modals.forEach(function(modal) {
-                modal.style.display = 'none';
-            });
+            if (openModal) {
+                openModal.style.display = 'none';
+                // Drop the copy held by the shared modal
+                if (openModal.id === 'modal-shared') {
+                    openModal.querySelector('.modal-body').innerHTML = '';
+                }
+                openModal = null;
+            }
             document.body.style.overflow = 'auto';
         }
         
+        // One delegated listener handles every button, close icon and backdrop
+        document.addEventListener('click', function(event) {
+            var target = event.target;
+            var btn = target.closest('.see-more-btn');
+            
+            if (btn) {
+                var cardId = btn.getAttribute('data-card');
+                var modal;
+                if (cardId) {
+                    // Compact layout: fill the shared modal from the card
+                    var card = document.getElementById(cardId);
+                    modal = document.getElementById('modal-shared');
+                    inflate(card);
+                    modal.querySelector('.modal-header h2').textContent = card.querySelector('.card-header h2').textContent;
+                    modal.querySelector('.modal-body').innerHTML = card.querySelector('.card-content').innerHTML;
+                } else {
+                    modal = document.getElementById(btn.getAttribute('data-modal'));
+                    inflate(modal);
+                }
+                showModal(modal);
+            } else if (target.classList.contains('close') || target === openModal) {
+                closeModals();
+            }
+        });
+        
         // Close modal with Escape key
         document.addEventListener('keydown', function(event) {
             if (event.key === 'Escape') {
                 closeModals();
             }
         });
+        
+        // Render lazy cards as they come close to the viewport
+        var lazyCards = document.querySelectorAll('.card[data-lazy]');
+        if ('IntersectionObserver' in window) {
+            var observer = new IntersectionObserver(function(entries) {
+                entries.forEach(function(entry) {
+                    if (entry.isIntersecting) {
+                        inflate(entry.target);
+                        entry.target.removeAttribute('data-lazy');
+                        observer.unobserve(entry.target);
+                    }
+                });
+            }, {rootMargin: '600px 0px'});
+            lazyCards.forEach(function(card) {
+                observer.observe(card);
+            });
+        } else {
+            lazyCards.forEach(function(card) {
+                inflate(card);
+                card.removeAttribute('data-lazy');
+            });
+        }
     });
     """
-    script_tag.string = script_content
+
+def build_page_skeleton(main_heading_text, layout='classic', incomplete=False):
+    """
+    Build the page around the cards: head with styles and script, header, the
+    (empty) card container and footer.
+
+    Args:
+        main_heading_text: Text used for the page title and header
+        layout: One of LAYOUTS; 'compact' adds the shared modal
+        incomplete: Flag the report as cut off before the agent finished
+
+    Returns:
+        Tuple of (new_soup, modals_marker, card_container). Modals go before
+        modals_marker and cards are appended to card_container.
+    """
+    new_soup = BeautifulSoup('', 'html.parser')
+    
+    # Create HTML structure
+    html_tag = new_soup.new_tag('html')
+    head_tag = new_soup.new_tag('head')
+    
+    # Add meta tags
+    meta_charset = new_soup.new_tag('meta')
+    meta_charset['charset'] = 'UTF-8'
+    head_tag.append(meta_charset)
+    
+    meta_viewport = new_soup.new_tag('meta')
+    meta_viewport['name'] = 'viewport'
+    meta_viewport['content'] = 'width=device-width, initial-scale=1.0'
+    head_tag.append(meta_viewport)
+    
+    if incomplete:
+        # Lets the navigation page spot partial reports
+        meta_status = new_soup.new_tag('meta')
+        meta_status['name'] = 'satyarthi-status'
+        meta_status['content'] = 'incomplete'
+        head_tag.append(meta_status)
+    
+    # Add title
+    title_tag = new_soup.new_tag('title')
+    title_tag.string = main_heading_text
+    head_tag.append(title_tag)
+    
+    # Add favicon link (optional - you can replace with your own favicon)
+    favicon = new_soup.new_tag('link')
+    favicon['rel'] = 'icon'
+    favicon['href'] = 'data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><text y=".9em" font-size="90">📰</text></svg>'
+    favicon['type'] = 'image/svg+xml'
+    head_tag.append(favicon)
+    
+    # Add CSS styles
+    style_tag = new_soup.new_tag('style')
+    style_tag.string = PAGE_STYLE
+    head_tag.append(style_tag)
+    
+    # Add JavaScript for modal functionality
+    script_tag = new_soup.new_tag('script')
+    script_tag.string = PAGE_SCRIPT
     head_tag.append(script_tag)
     
     html_tag.append(head_tag)
@@ -497,8 +742,20 @@ footer p {
     h1_tag.string = main_heading_text
     header_tag.append(h1_tag)
     
+    if incomplete:
+        note = new_soup.new_tag('p')
+        note['class'] = 'subtitle incomplete-note'
+        note.string = 'Research was cut off at the deadline; this report is partial.'
+        header_tag.append(note)
+    
     body_tag.append(header_tag)
     
+    # Modals are added to body (outside container), right before it
+    modals_marker = Comment(MODALS_MARKER)
+    body_tag.append(modals_marker)
+    if layout == 'compact':
+        modals_marker.insert_before(build_modal(new_soup, 'modal-shared', '', None))
+    
     # Create container
     container_tag = new_soup.new_tag('div')
     container_tag['class'] = 'container'
@@ -507,107 +764,6 @@ footer p {
     card_container = new_soup.new_tag('div')
     card_container['class'] = 'card-container'
     
-    # Process each h2 heading and create cards
-    for index, h2 in enumerate(h2_headings):
-        card_id = f"card-{index}"
-        modal_id = f"modal-{index}"
-        
-        # Create card div
-        card_div = new_soup.new_tag('div')
-        card_div['class'] = 'card'
-        card_div['id'] = card_id
-        
-        # Create card header
-        card_header = new_soup.new_tag('div')
-        card_header['class'] = 'card-header'
-        
-        # Create h2 for card header
-        card_h2 = new_soup.new_tag('h2')
-        card_h2.string = h2.text
-        card_header.append(card_h2)
-        card_div.append(card_header)
-        
-        # Create card content
-        card_content = new_soup.new_tag('div')
-        card_content['class'] = 'card-content'
-        
-        # Get content for this card (all elements between this h2 and the next h2)
-        content_elements = []
-        current = h2.next_sibling
-        
-        while current and not (isinstance(current, Tag) and current.name == 'h2'):
-            if current.name and current.name != 'h1':
-                content_elements.append(current)
-            current = current.next_sibling
-        
-        # Convert content elements to HTML string
-        content_html = ''.join(str(elem) for elem in content_elements)
-        content_soup = BeautifulSoup(content_html, 'html.parser')
-        
-        # Check if content is longer than char_limit
-        content_text = content_soup.get_text()
-        is_content_long = len(content_text) > char_limit
-        
-        # If content is long, truncate it for the card but preserve structure
-        if is_content_long:
-            # Create a temporary soup to handle truncation while preserving structure
-            truncated_html = truncate_html_content(content_soup, char_limit)
-            truncated_soup = BeautifulSoup(truncated_html, 'html.parser')
-            
-            # Add truncated structured content to the card
-            card_content.append(truncated_soup)
-            
-            # Add card footer with "See More" button
-            card_footer = new_soup.new_tag('div')
-            card_footer['class'] = 'card-footer'
-            
-            see_more_btn = new_soup.new_tag('button')
-            see_more_btn['class'] = 'see-more-btn'
-            see_more_btn['data-modal'] = modal_id
-            see_more_btn.string = 'See More'
-            
-            card_footer.append(see_more_btn)
-            card_div.append(card_content)
-            card_div.append(card_footer)
-            
-            # Create modal with full content
-            modal_div = new_soup.new_tag('div')
-            modal_div['id'] = modal_id
-            modal_div['class'] = 'modal'
-            
-            modal_content = new_soup.new_tag('div')
-            modal_content['class'] = 'modal-content'
-            
-            modal_header = new_soup.new_tag('div')
-            modal_header['class'] = 'modal-header'
-            
-            modal_title = new_soup.new_tag('h2')
-            modal_title.string = h2.text
-            modal_header.append(modal_title)
-            
-            close_span = new_soup.new_tag('span')
-            close_span['class'] = 'close'
-            close_span.string = '×'
-            modal_header.append(close_span)
-            
-            modal_body = new_soup.new_tag('div')
-            modal_body['class'] = 'modal-body'
-            modal_body.append(content_soup)
-            
-            modal_content.append(modal_header)
-            modal_content.append(modal_body)
-            modal_div.append(modal_content)
-            
-            # Add modal to body (outside container)
-            body_tag.append(modal_div)
-        else:
-            # Content is short enough, just add it to the card
-            card_content.append(content_soup)
-            card_div.append(card_content)
-        
-        # Add card to container
-        card_container.append(card_div)
-    
     # Add card container to main container
     container_tag.append(card_container)
     
@@ -625,11 +781,552 @@ footer p {
     html_tag.append(body_tag)
     new_soup.append(html_tag)
     
+    return new_soup, modals_marker, card_container
+
+def get_section_content(h2):
+    """
+    Collect the content of one section (all elements between this h2 and the
+    next h2) into its own soup.
+    """
+    content_elements = []
+    current = h2.next_sibling
+    
+    while current and not (isinstance(current, Tag) and current.name == 'h2'):
+        if current.name and current.name != 'h1':
+            content_elements.append(current)
+        current = current.next_sibling
+    
+    # Copy the elements into their own soup instead of re-parsing them
+    content_soup = BeautifulSoup('', 'html.parser')
+    for elem in content_elements:
+        content_soup.append(copy.copy(elem))
+    return content_soup
+
+def build_template(new_soup, content_soup):
+    """Wrap content in a <template>, which the browser parses but does not render"""
+    template = new_soup.new_tag('template')
+    template.append(content_soup)
+    return template
+
+def build_modal(new_soup, modal_id, heading_text, content_soup):
+    """
+    Build a modal showing heading_text and content_soup (may be None).
+    The content stays in a <template> until the modal is first opened.
+    """
+    modal_div = new_soup.new_tag('div')
+    modal_div['id'] = modal_id
+    modal_div['class'] = 'modal'
+    
+    modal_content = new_soup.new_tag('div')
+    modal_content['class'] = 'modal-content'
+    
+    modal_header = new_soup.new_tag('div')
+    modal_header['class'] = 'modal-header'
+    
+    modal_title = new_soup.new_tag('h2')
+    modal_title.string = heading_text
+    modal_header.append(modal_title)
+    
+    close_span = new_soup.new_tag('span')
+    close_span['class'] = 'close'
+    close_span.string = '×'
+    modal_header.append(close_span)
+    
+    modal_body = new_soup.new_tag('div')
+    modal_body['class'] = 'modal-body'
+    if content_soup is not None:
+        modal_body.append(build_template(new_soup, content_soup))
+    
+    modal_content.append(modal_header)
+    modal_content.append(modal_body)
+    modal_div.append(modal_content)
+    
+    return modal_div
+
+def render_section(new_soup, index, heading_text, content_soup, char_limit, layout='classic', lazy=False, incomplete=False):
+    """
+    Build the card for one section, plus a modal with the full content when
+    the section is longer than char_limit.
+
+    In the 'compact' layout a long section keeps its full content in the card,
+    clamped by CSS, and is shown in the shared modal instead of its own.
+    A lazy card keeps its content in a <template> until it scrolls into view.
+    Cards from an incomplete report carry an "Incomplete" badge.
+
+    Returns:
+        Tuple of (card_div, modal_div); modal_div is None for short sections
+        and in the compact layout
+    """
+    card_id = f"card-{index}"
+    modal_id = f"modal-{index}"
+    
+    # Create card div
+    card_div = new_soup.new_tag('div')
+    card_div['class'] = 'card incomplete' if incomplete else 'card'
+    card_div['id'] = card_id
+    if lazy:
+        card_div['data-lazy'] = ''
+    
+    # Create card header
+    card_header = new_soup.new_tag('div')
+    card_header['class'] = 'card-header'
+    
+    # Create h2 for card header
+    card_h2 = new_soup.new_tag('h2')
+    card_h2.string = heading_text
+    card_header.append(card_h2)
+    card_div.append(card_header)
+    
+    # Create card content
+    card_content = new_soup.new_tag('div')
+    card_content['class'] = 'card-content'
+    
+    # Check if content is longer than char_limit
+    content_text = content_soup.get_text()
+    is_content_long = len(content_text) > char_limit
+    
+    if not is_content_long:
+        # Content is short enough, just add it to the card
+        card_content.append(build_template(new_soup, content_soup) if lazy else content_soup)
+        card_div.append(card_content)
+        return card_div, None
+    
+    # Add card footer with "See More" button
+    card_footer = new_soup.new_tag('div')
+    card_footer['class'] = 'card-footer'
+    
+    see_more_btn = new_soup.new_tag('button')
+    see_more_btn['class'] = 'see-more-btn'
+    see_more_btn.string = 'See More'
+    card_footer.append(see_more_btn)
+    
+    if layout == 'compact':
+        # Content is stored once; the browser clamps the preview
+        card_content['class'] = 'card-content clamped'
+        card_content.append(build_template(new_soup, content_soup) if lazy else content_soup)
+        see_more_btn['data-card'] = card_id
+        card_div.append(card_content)
+        card_div.append(card_footer)
+        return card_div, None
+    
+    # Content is long: truncate it for the card but preserve structure
+    truncated_html = truncate_html_content(content_soup, char_limit)
+    truncated_soup = make_soup(truncated_html)
+    
+    # Add truncated structured content to the card
+    card_content.append(build_template(new_soup, truncated_soup) if lazy else truncated_soup)
+    
+    see_more_btn['data-modal'] = modal_id
+    card_div.append(card_content)
+    card_div.append(card_footer)
+    
+    # Create modal with full content
+    modal_div = build_modal(new_soup, modal_id, heading_text, content_soup)
+    
+    return card_div, modal_div
+
+def split_page_skeleton(main_heading_text, layout='classic', incomplete=False):
+    """
+    Build the page skeleton and split its HTML around the modals and cards.
+
+    Returns:
+        Tuple of (new_soup, page_start, container_start, page_end): the page
+        is page_start + modals + container_start + cards + page_end
+    """
+    new_soup, modals_marker, card_container = build_page_skeleton(main_heading_text, layout, incomplete)
+    card_container.append(Comment(CARDS_MARKER))
+    page = '<!DOCTYPE html>' + str(new_soup)
+    page_start, page_rest = page.split(f'<!--{MODALS_MARKER}-->')
+    container_start, page_end = page_rest.split(f'<!--{CARDS_MARKER}-->')
+    return new_soup, page_start, container_start, page_end
+
+def render_cached_section(new_soup, index, section_markdown, char_limit, layout='classic', incomplete=False):
+    """
+    Render one ## section of a report, given as markdown followed by the
+    report's link reference definitions (see with_references), to its card
+    and modal HTML.
+
+    Sections are looked up in the render cache by a hash of that markdown and
+    of everything else that shapes their card, so a section rendered before
+    (in this report or any other) is not converted, parsed, truncated or
+    serialized again.
+
+    Returns:
+        Tuple of (card_html, modal_html); modal_html is None when the card has
+        no modal of its own
+    """
+    lazy = index >= LAZY_AFTER
+    cache = get_render_cache()
+    cached = None
+    if cache is not None:
+        key = section_key(TEMPLATE_VERSION, layout, char_limit, lazy, incomplete, section_markdown)
+        cached = cache.get(key)
+    if cached is not None:
+        card_html, modal_html, _ = cached
+    else:
+        html_content = convert_markdown(section_markdown)
+        h2 = make_soup(html_content).find('h2')
+        content_soup = get_section_content(h2)
+        card_div, modal_div = render_section(
+            new_soup, INDEX_PLACEHOLDER, h2.text, content_soup, char_limit, layout,
+            lazy=lazy, incomplete=incomplete
+        )
+        card_html = str(card_div)
+        modal_html = str(modal_div) if modal_div is not None else None
+        if cache is not None:
+            cache.put(key, card_html, modal_html, card_div.find('button', class_='see-more-btn') is not None)
+    
+    def number(html):
+        for prefix in ('card', 'modal'):
+            html = html.replace(f'"{prefix}-{INDEX_PLACEHOLDER}"', f'"{prefix}-{index}"')
+        return html
+    
+    return number(card_html), number(modal_html) if modal_html is not None else None
+
+def convert_markdown_to_html_cards(markdown_file_path, char_limit=300, stream=False, output_dir='htmls', layout='classic'):
+    """
+    Convert a markdown file to HTML where ## headings become cards arranged 2 per row
+    with a "See More" option for long content
+    
+    Args:
+        markdown_file_path: Path to the markdown file
+        char_limit: Character limit before adding a "See More" button
+        stream: Render one section at a time (see stream_markdown_to_html_cards)
+        output_dir: Directory the HTML file is written to
+        layout: One of LAYOUTS
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}', choose from {LAYOUTS}")
+    if stream:
+        return stream_markdown_to_html_cards(markdown_file_path, char_limit, output_dir, layout)
+    
+    # Read markdown file
+    with open(markdown_file_path, 'r', encoding='utf-8') as file:
+        markdown_content = file.read()
+    
     # Output HTML file
     name = markdown_file_path.stem
-    output_filename = f"htmls/{name}.html"
+    output_filename = os.path.join(output_dir, f"{name}.html")
     with open(output_filename, 'w', encoding='utf-8') as file:
-        file.write(doctype + str(new_soup))
+        file.write(render_markdown(markdown_content, char_limit, layout))
+    
+    return output_filename
+
+def render_markdown(markdown_content, char_limit=300, layout='classic'):
+    """
+    Render markdown text to the card page convert_markdown_to_html_cards
+    writes, and return the page as a string.
+
+    Each ## section is converted on its own, and only when the render cache
+    does not hold its card yet (see render_cached_section). Reports that
+    cannot be split into sections the way Python-Markdown reads them (see
+    iter_markdown_lines) are rendered whole.
+    """
+    main_heading_text, incomplete, references, splittable = scan_markdown(io.StringIO(markdown_content))
+    if not splittable:
+        return render_whole_markdown(markdown_content, char_limit, layout)
+    
+    new_soup, page_start, container_start, page_end = split_page_skeleton(
+        main_heading_text or "News Analysis", layout, incomplete)
+    
+    modals = []
+    cards = []
+    for index, section_markdown in enumerate(iter_markdown_sections(io.StringIO(markdown_content))):
+        card_html, modal_html = render_cached_section(new_soup, index, with_references(section_markdown, references),
+                                                      char_limit, layout, incomplete)
+        if modal_html is not None:
+            modals.append(modal_html)
+        cards.append(card_html)
+    
+    return ''.join([page_start, *modals, container_start, *cards, page_end])
+
+def render_whole_markdown(markdown_content, char_limit=300, layout='classic'):
+    """
+    Render markdown text like render_markdown, from one conversion of the
+    whole report and without the render cache. The cards are the ones the
+    section by section render has to match.
+    """
+    # First convert markdown to HTML using markdown library with extra extensions
+    html_content = convert_markdown(markdown_content)
+    
+    # Parse the HTML
+    soup = make_soup(html_content)
+    
+    # Get the main heading (h1) if it exists
+    main_heading = soup.find('h1')
+    main_heading_text = main_heading.text if main_heading else "News Analysis"
+    
+    # Reports cut off at a deadline carry a marker
+    incomplete = INCOMPLETE_MARKER in markdown_content
+    
+    new_soup, page_start, container_start, page_end = split_page_skeleton(main_heading_text, layout, incomplete)
+    
+    modals = []
+    cards = []
+    for index, h2 in enumerate(soup.find_all('h2')):
+        card_div, modal_div = render_section(new_soup, index, h2.text, get_section_content(h2), char_limit, layout,
+                                             lazy=index >= LAZY_AFTER, incomplete=incomplete)
+        if modal_div is not None:
+            modals.append(str(modal_div))
+        cards.append(str(card_div))
+    
+    return ''.join([page_start, *modals, container_start, *cards, page_end])
+
+def render_reports(reports, char_limit=300, output_dir='htmls', layout='classic'):
+    """
+    Render reports held in memory, written to output_dir as well when file
+    output is on (see filesink).
+
+    Args:
+        reports: Dict of report name (the agent's role) to markdown
+        char_limit: Character limit before adding a "See More" button
+        output_dir: Directory the HTML files are written to
+        layout: One of LAYOUTS
+
+    Returns:
+        Dict of page path (output_dir/<name>.html) to HTML
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}', choose from {LAYOUTS}")
+    pages = {}
+    cache = get_render_cache()
+    for name, markdown_content in reports.items():
+        output_filename = os.path.join(output_dir, f"{name}.html")
+        hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+        pages[output_filename] = render_markdown(markdown_content, char_limit, layout)
+        if filesink.write_text(output_filename, pages[output_filename]):
+            store.record('record_artifact', os.path.basename(output_filename), 'report', output_filename)
+        if cache is not None:
+            hits, misses = cache.hits - hits, cache.misses - misses
+            log.info(f"done: {name} ({hits} of {hits + misses} sections from the render cache)")
+        else:
+            log.info(f"done: {name}")
+    return pages
+
+# Block-level markdown syntax, as Python-Markdown (with fenced_code) reads it
+FENCE_PATTERN = re.compile(r"""(~{3,}|`{3,})[ ]*((\{[^\n]*\})|(\.?[\w#.+-]*[ ]*)?(hl_lines=("|').*?\6[ ]*)?)$""")
+ATX_HEADING_PATTERN = re.compile(r'(#{1,6})')
+SETEXT_UNDERLINE_PATTERN = re.compile(r'(=+|-+)[ ]*$')
+HR_PATTERN = re.compile(r'[ ]{0,3}((-+[ ]{0,2}){3,}|(_+[ ]{0,2}){3,}|(\*+[ ]{0,2}){3,})$')
+REFERENCE_PATTERN = re.compile(r"""[ ]{0,3}\[([^\[\]]*)\]:[ ]*(\S+)[ ]*((["'])(.*)\4[ ]*|\((.*)\)[ ]*)?$""")
+
+# Constructs the line scanner does not follow. Python-Markdown keeps raw HTML
+# blocks (and comments) as they are, headings or not, parses headings nested
+# in lists and quotes, reads tables and indented blocks to their end, and
+# lets a reference definition run on to the next line.
+UNSPLITTABLE = 'unsplittable'
+RAW_HTML_PATTERN = re.compile(
+    r'<(?:[!?]|/?(?:%s)(?![\w-]))' % '|'.join(markdown.Markdown().block_level_elements), re.IGNORECASE)
+NESTED_PREFIX_PATTERN = re.compile(r'(?:[ ]*(?:>|[*+-][ ]|\d+\.[ ]))*[ ]*')
+NESTED_BLOCK_PATTERN = re.compile(r'#|`{3}|~{3}|(=+|-+)[ ]*$|\[[^\[\]]*\]:')
+REFERENCE_START_PATTERN = re.compile(r'[ ]{0,3}\[[^\[\]]*\]:')
+
+def iter_markdown_lines(file):
+    """
+    Read an open markdown file line by line and tell which lines start a
+    heading, the way Python-Markdown sees them: ATX headings ("## Title")
+    and setext headings (a title line underlined with = or -), but nothing
+    inside fenced code.
+
+    Lines where Python-Markdown may find headings the scanner does not, or
+    none where it does (raw HTML, nested headings, tables and indented
+    blocks running into a heading, multi-line reference definitions), come
+    with kind UNSPLITTABLE, and so does a final empty line when a fence is
+    never closed (Python-Markdown then reads it as text). Splitting such a
+    report into sections would not give the cards of the whole document.
+
+    Yields:
+        Tuples of (line, kind, underline). kind is 'h1' ... 'h6' for the
+        first line of a heading, 'code' inside fenced code, UNSPLITTABLE as
+        above and None otherwise. underline is the next line for setext
+        headings, which is then yielded on its own with kind None.
+    """
+    fence = None
+    # A setext title is the first line of a block; it waits here until the
+    # next line shows whether it is underlined
+    pending = None
+    block_start = True
+    # First line of the current block, and whether the line before was a
+    # reference definition
+    block_first = ''
+    after_reference = False
+    
+    for line in file:
+        text = line.rstrip('\r\n').expandtabs(4)
+        if pending is not None:
+            if SETEXT_UNDERLINE_PATTERN.match(text):
+                yield pending, 'h1' if text.startswith('=') else 'h2', line
+                yield line, None, None
+                pending = None
+                block_start = True
+                continue
+            yield pending, None, None
+            block_start = bool(HR_PATTERN.match(block_first))
+            pending = None
+        
+        if fence is not None:
+            if text.rstrip(' ') == fence:
+                fence = None
+                block_start = True
+            yield line, 'code', None
+            continue
+        fence_match = FENCE_PATTERN.match(text)
+        if fence_match:
+            fence = fence_match.group(1)
+            yield line, 'code', None
+            continue
+        
+        if not text.strip():
+            block_start = True
+            after_reference = False
+            yield line, None, None
+            continue
+        if block_start:
+            block_first = text
+        nested = NESTED_PREFIX_PATTERN.match(text).end()
+        reference = bool(REFERENCE_START_PATTERN.match(text))
+        if ('\r' in text or text.startswith(('```', '~~~')) or RAW_HTML_PATTERN.search(text)
+                or (nested and NESTED_BLOCK_PATTERN.match(text, nested) and not REFERENCE_PATTERN.match(text))
+                or (reference and not REFERENCE_PATTERN.match(text))
+                or (after_reference and not reference)
+                or (not block_start and (block_first.startswith('    ') or '|' in block_first)
+                    and (reference or ATX_HEADING_PATTERN.match(text)))):
+            yield line, UNSPLITTABLE, None
+            block_start = False
+            after_reference = reference
+            continue
+        after_reference = reference
+        heading = ATX_HEADING_PATTERN.match(text)
+        if heading:
+            block_start = True
+            yield line, f"h{len(heading.group(1))}", None
+            continue
+        if block_start and not text.startswith('    '):
+            pending = line
+            block_start = False
+            continue
+        yield line, None, None
+        block_start = bool(HR_PATTERN.match(text))
+    
+    if pending is not None:
+        yield pending, None, None
+    if fence is not None:
+        yield '', UNSPLITTABLE, None
+
+def with_references(section_markdown, references):
+    """A section's markdown followed by the report's link reference definitions"""
+    if not references:
+        return section_markdown
+    return section_markdown.rstrip('\n') + '\n\n' + references
+
+def iter_markdown_sections(file):
+    """
+    Yield the markdown of each ## section from an open file, one at a time.
+
+    Text before the first ## heading is skipped, as in the card layout.
+    Setext headings start sections too; lines inside fenced code never do.
+    """
+    section = None
+    
+    for line, kind, _ in iter_markdown_lines(file):
+        if kind == 'h2':
+            if section is not None:
+                yield ''.join(section)
+            section = []
+        
+        if section is not None:
+            section.append(line)
+    
+    if section is not None:
+        yield ''.join(section)
+
+def scan_markdown(file):
+    """
+    Read through an open markdown file line by line.
+
+    Returns:
+        Tuple of (title, incomplete, references, splittable): the text of
+        the first # heading (or None), whether the report carries
+        INCOMPLETE_MARKER, the report's link reference definitions
+        ("[1]: https://..."), which every section needs to resolve its
+        reference links, and whether the report can be rendered one section
+        at a time (see iter_markdown_lines)
+    """
+    title = None
+    incomplete = False
+    references = []
+    splittable = True
+    
+    for line, kind, underline in iter_markdown_lines(file):
+        if INCOMPLETE_MARKER in line:
+            incomplete = True
+        if kind == UNSPLITTABLE:
+            splittable = False
+        elif kind is None and REFERENCE_PATTERN.match(line.rstrip('\r\n').expandtabs(4)):
+            references.append(line if line.endswith('\n') else line + '\n')
+        elif title is None and kind == 'h1':
+            title = line + (underline or '')
+    
+    references = ''.join(references)
+    if title is not None:
+        # The title may hold reference links too
+        heading = BeautifulSoup(markdown.markdown(with_references(title, references)), 'html.parser').find('h1')
+        title = heading.text if heading else None
+    return title, incomplete, references, splittable
+
+def stream_markdown_to_html_cards(markdown_file_path, char_limit=300, output_dir='htmls', layout='classic'):
+    """
+    Streaming variant of convert_markdown_to_html_cards.
+
+    Reads the markdown one ## section at a time, renders it and writes it out
+    before moving to the next one, so peak memory is bounded by the largest
+    section instead of the whole document. Cards are spooled to a temporary
+    file because the modals precede them in the page. A first pass finds the
+    title and the link reference definitions, which are added to every
+    section so its reference links resolve as in the whole document. Reports
+    that cannot be split into sections the way Python-Markdown reads them
+    (see iter_markdown_lines) are rendered whole instead.
+    
+    Args:
+        markdown_file_path: Path to the markdown file
+        char_limit: Character limit before adding a "See More" button
+        output_dir: Directory the HTML file is written to
+        layout: One of LAYOUTS
+    """
+    with open(markdown_file_path, 'r', encoding='utf-8') as file:
+        main_heading_text, incomplete, references, splittable = scan_markdown(file)
+    main_heading_text = main_heading_text or "News Analysis"
+    
+    name = markdown_file_path.stem
+    output_filename = os.path.join(output_dir, f"{name}.html")
+    if not splittable:
+        log.debug(f"{markdown_file_path} cannot be split into sections, rendering it whole")
+        with open(markdown_file_path, 'r', encoding='utf-8') as file:
+            markdown_content = file.read()
+        with open(output_filename, 'w', encoding='utf-8') as output:
+            output.write(render_whole_markdown(markdown_content, char_limit, layout))
+        return output_filename
+    
+    # Split the page skeleton into the parts around the modals and the cards
+    new_soup, page_start, container_start, page_end = split_page_skeleton(main_heading_text, layout, incomplete)
+    
+    with open(markdown_file_path, 'r', encoding='utf-8') as file, \
+            open(output_filename, 'w', encoding='utf-8') as output, \
+            tempfile.TemporaryFile('w+', encoding='utf-8') as cards:
+        output.write(page_start)
+        
+        for index, section_markdown in enumerate(iter_markdown_sections(file)):
+            card_html, modal_html = render_cached_section(new_soup, index, with_references(section_markdown, references),
+                                                          char_limit, layout, incomplete)
+            
+            if modal_html is not None:
+                output.write(modal_html)
+            cards.write(card_html)
+        
+        output.write(container_start)
+        cards.seek(0)
+        shutil.copyfileobj(cards, output)
+        output.write(page_end)
     
     return output_filename
 
@@ -644,16 +1341,15 @@ def truncate_html_content(soup, char_limit):
     Returns:
         HTML string truncated to char_limit while preserving structure
     """
-    # Convert to string and create a new soup to work with
-    soup_str = str(soup)
-    soup_copy = BeautifulSoup(soup_str, 'html.parser')
-    
     # Get total text length
-    total_text = soup_copy.get_text()
+    total_text = soup.get_text()
     
     # If already under limit, return as is
     if len(total_text) <= char_limit:
-        return soup_str
+        return str(soup)
+    
+    # Work on a copy of the tree; copying is much cheaper than re-parsing it
+    soup_copy = copy.copy(soup)
     
     # Get all text nodes in order of appearance
     text_nodes = list(soup_copy.find_all(string=True))
@@ -734,7 +1430,7 @@ def get_current_date():
     return datetime.now().strftime("%B %d, %Y")
 
 
-def main():
+def main(stream=False, layout='classic'):
   from pathlib import Path
 
   # Set the folder path
@@ -742,8 +1438,12 @@ def main():
  # Get all .md files in the folder
   md_files = folder_path.glob('*.md')
   for md_file in md_files:
-   convert_markdown_to_html_cards(md_file)
-   print("done: ", md_file.stem )
+   output_filename = convert_markdown_to_html_cards(md_file, stream=stream, layout=layout)
+   store.record('record_artifact', os.path.basename(output_filename), 'report', output_filename)
+   log.info(f"done: {md_file.stem}")
 
 if __name__ == "__main__":
-    main()
+    if '--parser' in sys.argv:
+        set_parser(sys.argv[sys.argv.index('--parser') + 1])
+    layout = sys.argv[sys.argv.index('--layout') + 1] if '--layout' in sys.argv else 'classic'
+    main(stream='--stream' in sys.argv, layout=layout)
@@ -0,0 +1,157 @@
+import os
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+import initial
+import dynamic_crew
+import paste
+import run
+import store
+import usage
+import compaction
+import filesink
+import logsink
+import analytics
+from deadline import Deadline
+from profiling import PROFILE_DIR, Profiler
+from freshness import prepare_refresh
+from routing import latency_router
+from hedging import hedger
+from preview import PREVIEW_PATH, preview
+from jobs import JobQueue
+from worker import start_local_workers, stop_local_workers
+from logsink import TRANSCRIPTS_PATH, transcripts
+from plan import Plan
+
+log = logging.getLogger(__name__)
+
+class PipelineOptions(BaseModel):
+    """Options for run_pipeline; the defaults run everything in this process"""
+    deadline_seconds: Optional[float] = Field(None, description="Wall-clock budget for the run; agents "
+                                              "still researching when their share runs out are cut off")
+    max_agents: Optional[int] = Field(None, description="Cap on the number of research agents")
+    budget: Optional[float] = Field(None, description="Research budget in USD, turned into an agent cap")
+    token_budgets: Dict = Field(default_factory=dict, description="Budgets as parsed by usage.parse_budgets")
+    max_hedges: int = Field(0, description="Duplicate LLM and search requests the run may send for slow "
+                            "calls (see hedging.Hedger); 0 only times calls out")
+    profile: bool = Field(False, description="Write per-stage CPU and memory profiles to profiles/<run id>/")
+    refresh: Optional[str] = Field(None, description="Run id (or 'latest') to refresh instead of planning")
+    rerun: List[str] = Field(default_factory=list, description="Agent keys or roles to rerun in a refresh")
+    show_preview: bool = Field(False, description="Keep preview.html up to date during the run")
+    workers: Optional[int] = Field(None, description="Run research agents as jobs with this many local "
+                                   "workers (0: only separately started ones); None runs them here")
+    layout: str = Field('classic', description="Card layout of the rendered reports, one of paste.LAYOUTS")
+    write_files: bool = Field(True, description="Also write output/*.json, data/*.md, htmls/*.html "
+                              "and main.html; results are returned either way")
+    analytics: bool = Field(True, description="Append the run to the analytics dataset in analytics/")
+    analytics_parquet: bool = Field(False, description="Also write the analytics rows as Parquet (needs pyarrow)")
+    log_level: Optional[str] = Field(None, description="Set up logging to logs/<run id>.jsonl at this "
+                                     "level; None leaves logging to the caller")
+
+class PipelineResult(BaseModel):
+    """Everything a run produced, handed back in memory"""
+    run_id: str
+    plan: Optional[Plan] = Field(None, description="Research plan after merging overlapping agents")
+    reports: Dict[str, str] = Field(default_factory=dict, description="Markdown report by agent role")
+    pages: Dict[str, str] = Field(default_factory=dict, description="Rendered HTML by page path")
+    navigation: str = Field('', description="HTML of the navigation page (main.html)")
+    usage: Dict = Field(default_factory=dict, description="usage.UsageMeter summary")
+
+@contextmanager
+def stage(name, profiler=None):
+    """Time a pipeline stage and, in profile mode, profile it"""
+    with store.timed(name):
+        if profiler is None:
+            yield
+        else:
+            with profiler.stage(name):
+                yield
+
+def run_pipeline(query=None, options=None):
+    """
+    Run the whole pipeline: plan, research, render and build the navigation
+    page. The plan, the reports and the pages go from stage to stage in
+    memory; files are only an optional copy (options.write_files).
+
+    Not reentrant: the run's state (store.current_run_id, the usage meter,
+    the hedger, filesink.enabled, logging) lives in module globals, so only
+    one pipeline may run in a process at a time.
+
+    Args:
+        query: The news query; asked for on the console if not given (and
+            not refreshing)
+        options: PipelineOptions
+
+    Returns:
+        PipelineResult
+    """
+    options = options or PipelineOptions()
+    deadline = Deadline(options.deadline_seconds) if options.deadline_seconds else None
+    usage.meter.configure(options.token_budgets)
+    hedger.configure(options.max_hedges)
+    run_id = store.start_run()
+    write_files = filesink.enabled
+    filesink.enabled = options.write_files
+    if options.log_level:
+        # Without file output, logging goes to the console only
+        log_path = logsink.setup(run_id if options.write_files else None, options.log_level)
+        if log_path:
+            store.record('record_artifact', 'log', 'log', log_path)
+    transcripts.reset()
+    profiler = Profiler(os.path.join(PROFILE_DIR, run_id)) if options.profile else None
+    if options.show_preview:
+        preview.enable()
+        log.info(f"👀 Open {PREVIEW_PATH} for a preview that fills in as the run goes")
+    queue = JobQueue() if options.workers is not None else None
+    local_workers = []
+    try:
+        if options.refresh:
+            with stage('planning', profiler):
+                agents_data, tasks_data, stale, reused = prepare_refresh(
+                    None if options.refresh == 'latest' else options.refresh, options.rerun)
+            with stage('research', profiler):
+                local_workers = start_local_workers(options.workers or 0)
+                research_plan, reports = dynamic_crew.main(deadline=deadline, plan=(agents_data, tasks_data),
+                                                           agent_keys=stale, queue=queue)
+            reports = {**reused, **reports}
+        else:
+            with stage('planning', profiler):
+                designed = initial.main(query)
+            with stage('research', profiler):
+                local_workers = start_local_workers(options.workers or 0)
+                research_plan, reports = dynamic_crew.main(deadline=deadline, max_agents=options.max_agents,
+                                                           budget=options.budget, queue=queue,
+                                                           designed=designed)
+        with stage('rendering', profiler):
+            pages = paste.render_reports(reports, layout=options.layout)
+        with stage('navigation', profiler):
+            navigation = run.create_navigation_html(usage=usage.meter.summary()['run'], pages=pages)
+    except BaseException:
+        store.finish_run('failed', {'usage': usage.meter.summary()})
+        raise
+    finally:
+        stop_local_workers(local_workers)
+        preview.finish()
+        if transcripts.write():
+            store.record('record_artifact', 'transcripts.json', 'log', TRANSCRIPTS_PATH)
+        filesink.enabled = write_files
+        if profiler is not None:
+            summary_path = profiler.write_summary()
+            store.record('record_artifact', 'profile', 'profile', summary_path)
+    usage_summary = usage.meter.summary()
+    hedging = hedger.summary()
+    store.finish_run(summary={'usage': usage_summary, 'latency': latency_router.summary(),
+                              'compaction': compaction.compaction_summary(), 'hedging': hedging})
+    if options.analytics:
+        analytics_path = analytics.export_run(run_id, parquet=options.analytics_parquet)
+        if analytics_path:
+            store.record('record_artifact', 'analytics', 'analytics', analytics_path)
+    log.info(f"💸 LLM usage: {usage.format_usage(usage_summary['run'])}")
+    if hedging['hedged'] or hedging['timeouts']:
+        log.info(f"🏇 {hedging['hedged']} hedged requests ({hedging['hedge_wins']} won), "
+                 f"{hedging['timeouts']} timed out")
+    for stopped in usage_summary['stopped']:
+        log.warning(f"   {stopped['agent']} stopped by its {stopped['budget']} budget")
+    return PipelineResult(run_id=run_id, plan=research_plan, reports=reports, pages=pages,
+                          navigation=navigation, usage=usage_summary)
@@ -0,0 +1,38 @@
+from typing import Dict, Optional
+from pydantic import BaseModel, Field
+
+# Pydantic models for validation
+class AgentConfig(BaseModel):
+    """Configuration for an agent with proper validation"""
+    model_config = {'extra': 'allow'}
+
+    role: str = Field(..., description="The role of the agent")
+    goal: str = Field(..., description="The primary goal of the agent")
+    backstory: str = Field(..., description="Background story for the agent")
+    llm: Optional[str] = Field(None, description="Model for this agent, if it needs a specific one")
+    
+class TaskConfig(BaseModel):
+    """Configuration for a task with proper validation"""
+    model_config = {'extra': 'allow'}
+
+    description: str = Field(..., description="Detailed description of the task")
+    agent: str = Field(..., description="ID of the agent assigned to this task")
+    expected_output: str = Field(..., description="Description of expected output format")
+
+class Plan(BaseModel):
+    """
+    Research agents and the tasks assigned to them, keyed by agent id
+    (agent_1, ...) and task id (task_1, ...), as handed from the designers to
+    the research crew. Extra fields (verbose, temporal, merged_from) are kept.
+    """
+    agents: Dict[str, AgentConfig] = Field(default_factory=dict)
+    tasks: Dict[str, TaskConfig] = Field(default_factory=dict)
+
+    @classmethod
+    def from_dicts(cls, agents_data, tasks_data):
+        return cls(agents=agents_data, tasks=tasks_data)
+
+    def to_dicts(self):
+        """Plain (agents_data, tasks_data) dicts, as stored and passed to the optimiser"""
+        return ({key: agent.model_dump(exclude_none=True) for key, agent in self.agents.items()},
+                {key: task.model_dump(exclude_none=True) for key, task in self.tasks.items()})
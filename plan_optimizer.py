@@ -0,0 +1,185 @@
+import logging
+import re
+import json
+import math
+import filesink
+
+log = logging.getLogger(__name__)
+
+# Agents whose role, goal and tasks are at least this similar are merged
+SIMILARITY_THRESHOLD = 0.5
+
+# Rough cost of one research agent (search calls plus LLM steps), in USD
+ESTIMATED_COST_PER_AGENT = 0.05
+
+# Merges are logged here so a run can be audited later
+MERGE_LOG_PATH = 'output/plan_merges.json'
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have how in into is it its of on or
+that the their this to was were will with you your they them what which who
+agent analyst analysis research researcher specialist expert perspective
+""".split())
+
+def tokenize(text):
+    """Lower-cased content words of text"""
+    return [word for word in re.findall(r'[a-z0-9]+', text.lower())
+            if len(word) > 2 and word not in STOPWORDS]
+
+def tfidf_vectors(documents):
+    """TF-IDF vector (dict of term to weight, unit length) for each document"""
+    tokenized = [tokenize(doc) for doc in documents]
+    document_frequency = {}
+    for tokens in tokenized:
+        for term in set(tokens):
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    vectors = []
+    for tokens in tokenized:
+        vector = {}
+        for term in tokens:
+            vector[term] = vector.get(term, 0) + 1
+        for term, count in vector.items():
+            vector[term] = count * (math.log((1 + len(documents)) / (1 + document_frequency[term])) + 1)
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        vectors.append({term: weight / norm for term, weight in vector.items()})
+    return vectors
+
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+def centroid(vectors):
+    total = {}
+    for vector in vectors:
+        for term, weight in vector.items():
+            total[term] = total.get(term, 0.0) + weight
+    norm = math.sqrt(sum(weight * weight for weight in total.values())) or 1.0
+    return {term: weight / norm for term, weight in total.items()}
+
+def agent_cap(max_agents=None, budget=None):
+    """Agent limit from an explicit cap and/or a USD budget; None means no limit"""
+    caps = []
+    if max_agents:
+        caps.append(max_agents)
+    if budget:
+        caps.append(max(1, int(budget / ESTIMATED_COST_PER_AGENT)))
+    return min(caps) if caps else None
+
+def cluster_agents(agents_data, tasks_data, threshold=SIMILARITY_THRESHOLD, cap=None):
+    """
+    Group agent keys whose role, goal and task descriptions are near-duplicates.
+
+    Clusters are merged greedily, most similar first, while their similarity
+    reaches threshold, and then further until there are at most cap clusters.
+
+    Returns:
+        List of (cluster, similarity) merges performed, and the final clusters
+        as lists of agent keys in plan order
+    """
+    keys = list(agents_data)
+    documents = []
+    for key in keys:
+        agent = agents_data[key]
+        task_text = ' '.join(task.get('description', '') for task in tasks_data.values()
+                             if task.get('agent') == key)
+        documents.append(f"{agent.get('role', '')} {agent.get('role', '')} {agent.get('goal', '')} {task_text}")
+
+    vectors = dict(zip(keys, tfidf_vectors(documents)))
+    clusters = [[key] for key in keys]
+    merges = []
+
+    while len(clusters) > 1:
+        centroids = [centroid([vectors[key] for key in cluster]) for cluster in clusters]
+        best, best_pair = -1.0, None
+        for i in range(len(clusters)):
+            for j in range(i + 1, len(clusters)):
+                similarity = cosine(centroids[i], centroids[j])
+                if similarity > best:
+                    best, best_pair = similarity, (i, j)
+
+        over_cap = cap is not None and len(clusters) > cap
+        if best < threshold and not over_cap:
+            break
+
+        i, j = best_pair
+        merges.append((clusters[i] + clusters[j], best))
+        clusters[i] = clusters[i] + clusters[j]
+        del clusters[j]
+
+    order = {key: index for index, key in enumerate(keys)}
+    clusters = [sorted(cluster, key=order.get) for cluster in clusters]
+    clusters.sort(key=lambda cluster: order[cluster[0]])
+    return merges, clusters
+
+def optimize_plan(agents_data, tasks_data, max_agents=None, budget=None, threshold=SIMILARITY_THRESHOLD):
+    """
+    Merge near-duplicate agents (and their tasks) and enforce the agent cap.
+
+    The first agent of each cluster stays and takes over the other agents'
+    goals and tasks. Each surviving agent ends up with a single task that
+    covers everything its cluster was asked to do, since an agent writes one
+    report.
+
+    Args:
+        agents_data: Agents from output/agents.json
+        tasks_data: Tasks from output/tasks.json
+        max_agents: Hard cap on the number of agents
+        budget: Research budget in USD, converted to a cap with
+            ESTIMATED_COST_PER_AGENT
+        threshold: Similarity at which agents count as duplicates
+
+    Returns:
+        Tuple of (agents_data, tasks_data) for the optimised plan
+    """
+    cap = agent_cap(max_agents, budget)
+    merges, clusters = cluster_agents(agents_data, tasks_data, threshold, cap)
+
+    # Tasks pointing at agents that do not exist are left for the crew to report
+    tasks_by_agent = {}
+    for task_key, task in tasks_data.items():
+        tasks_by_agent.setdefault(task.get('agent'), []).append(task_key)
+
+    new_agents = {}
+    new_tasks = {}
+    merge_log = []
+    for cluster in clusters:
+        keeper = cluster[0]
+        agent = dict(agents_data[keeper])
+        others = cluster[1:]
+        if others:
+            covered = '; '.join(f"{agents_data[key]['role']}: {agents_data[key]['goal']}" for key in others)
+            agent['goal'] = f"{agent['goal']} Also cover: {covered}"
+            agent['merged_from'] = others
+            merge_log.append({'kept': keeper, 'merged': others,
+                              'roles': [agents_data[key]['role'] for key in cluster]})
+            log.info(f"🔗 Merged {', '.join(others)} into {keeper} ({agent['role']})")
+        new_agents[keeper] = agent
+
+        task_keys = [task_key for key in cluster for task_key in tasks_by_agent.get(key, [])]
+        if not task_keys:
+            continue
+        task = dict(tasks_data[task_keys[0]])
+        task['agent'] = keeper
+        extra = [tasks_data[task_key]['description'] for task_key in task_keys[1:]]
+        if extra:
+            task['description'] = task['description'] + "\n\nAlso address:\n" + '\n'.join(f"- {text}" for text in extra)
+            task['merged_from'] = task_keys[1:]
+        new_tasks[task_keys[0]] = task
+
+    for agent_key in tasks_by_agent.keys() - set(agents_data):
+        for task_key in tasks_by_agent[agent_key]:
+            new_tasks[task_key] = tasks_data[task_key]
+
+    # Keep the tasks in plan order
+    new_tasks = {task_key: new_tasks[task_key] for task_key in tasks_data if task_key in new_tasks}
+
+    if merge_log or cap is not None:
+        log.info(f"🔗 Plan optimised: {len(agents_data)} agents -> {len(new_agents)}"
+              + (f" (cap {cap})" if cap is not None else ""))
+    filesink.write_text(MERGE_LOG_PATH, json.dumps(
+        {'cap': cap, 'merges': merge_log,
+         'similarities': [round(similarity, 3) for _, similarity in merges]}, indent=2))
+
+    return new_agents, new_tasks
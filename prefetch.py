@@ -0,0 +1,115 @@
+import logging
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor, wait
+from crewai_tools import SerperDevTool
+from search import search_cache
+from hedging import SEARCH_TIMEOUT, hedger
+
+log = logging.getLogger(__name__)
+
+# Upper bound on speculative searches per run
+MAX_PREFETCH_QUERIES = 12
+
+# Searches running at once while the designers work
+PREFETCH_WORKERS = 4
+
+_executor = None
+_futures = []
+
+def parse_analysis(raw):
+    """
+    Extract the structured analysis (entities, perspectives, research areas)
+    from the query analysis output. Returns an empty dict if none is found.
+    """
+    matches = re.search(r'(\{[\s\S]*\})', raw)
+    if not matches:
+        return {}
+    try:
+        analysis = json.loads(matches.group(1))
+    except json.JSONDecodeError:
+        return {}
+    return analysis if isinstance(analysis, dict) else {}
+
+def _as_text(item):
+    """Items may be plain strings or small dicts such as {"name": ..., "description": ...}"""
+    if isinstance(item, str):
+        return item.strip()
+    if isinstance(item, dict):
+        for key in ('name', 'perspective', 'area', 'title'):
+            if isinstance(item.get(key), str):
+                return item[key].strip()
+        for value in item.values():
+            if isinstance(value, str):
+                return value.strip()
+    return ''
+
+def build_queries(analysis, limit=MAX_PREFETCH_QUERIES):
+    """
+    Turn the analysis into search queries: one per entity, and one per
+    perspective and research area anchored on the main entity.
+    """
+    entities = [_as_text(item) for item in analysis.get('entities', [])]
+    entities = [entity for entity in entities if entity]
+    topic = entities[0] if entities else ''
+
+    queries = list(entities)
+    for key in ('perspectives', 'research_areas'):
+        for item in analysis.get(key, []):
+            text = _as_text(item)
+            if not text:
+                continue
+            if topic and topic.lower() not in text.lower():
+                text = f"{topic} {text}"
+            queries.append(text)
+
+    # Keep the first occurrence of each query
+    seen = set()
+    unique = []
+    for query in queries:
+        if query.lower() not in seen:
+            seen.add(query.lower())
+            unique.append(query)
+    return unique[:limit]
+
+def _search(tool, query):
+    # Plain tool: a cached lookup would wait on this very search
+    try:
+        # Speculative, so never hedged, but a hung search must not keep the
+        # agents waiting on it
+        search_cache.put(query, hedger.call('serper', lambda attempt: tool.run(search_query=query),
+                                            timeout=SEARCH_TIMEOUT, hedge=False))
+    except Exception as e:
+        search_cache.cancel(query)
+        log.error(f"❌ Prefetch search failed for '{query}': {e}")
+
+def start_prefetch(raw):
+    """
+    Start searching, in the background, for everything the analysis names.
+    Results land in the shared search cache that the research agents use.
+
+    Args:
+        raw: Raw output of the query analysis task
+
+    Returns:
+        The list of queries being prefetched
+    """
+    global _executor
+    queries = build_queries(parse_analysis(raw))
+    if not queries:
+        log.error("❌ No entities or perspectives found to prefetch")
+        return []
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='prefetch')
+    tool = SerperDevTool()
+    for query in queries:
+        search_cache.mark_pending(query)
+        _futures.append(_executor.submit(_search, tool, query))
+
+    log.info(f"🔎 Prefetching {len(queries)} searches while agents are designed")
+    return queries
+
+def wait_for_prefetch(timeout=None):
+    """Block until every prefetch search has finished (or timeout seconds pass)"""
+    wait(_futures, timeout=timeout)
@@ -0,0 +1,129 @@
+import logging
+import os
+import re
+import json
+import threading
+import paste
+from deadline import INCOMPLETE_MARKER
+from prefetch import parse_analysis, _as_text
+
+log = logging.getLogger(__name__)
+
+# Preview page, next to main.html
+PREVIEW_PATH = 'preview.html'
+
+# The page reloads itself this often while research is still running
+PREVIEW_REFRESH_SECONDS = 5
+
+# Characters of each finished report shown in the preview
+PREVIEW_REPORT_CHARS = 1200
+
+class Preview:
+    """
+    Preview page that is rendered as soon as the query is analysed and
+    re-rendered whenever a research report arrives.
+
+    The page goes through the paste card renderer like the final reports,
+    and is replaced atomically so a reader never sees half a page.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.enhanced = None
+        self.analysis = {}
+        self.agents = []
+        self.reports = {}
+        self.done = False
+
+    def enable(self):
+        with self.lock:
+            self.enabled = True
+            self.reset()
+
+    def update(self, enhanced=None, analysis=None, agents=None):
+        """Add the enhanced query, the raw analysis output or the research agents' roles"""
+        if not self.enabled:
+            return
+        with self.lock:
+            if enhanced is not None:
+                self.enhanced = enhanced.strip()
+            if analysis is not None:
+                self.analysis = parse_analysis(analysis)
+            if agents is not None:
+                self.agents = list(agents)
+            self._render()
+
+    def add_report(self, role, markdown):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.reports[role] = markdown
+            self._render()
+
+    def finish(self):
+        """Render the last version, which no longer reloads itself"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.done = True
+            self._render()
+
+    def _markdown(self):
+        title = self.enhanced.splitlines()[0] if self.enhanced else "Analysis in progress"
+        lines = [f"# {title.lstrip('#').strip()}", ""]
+        if self.enhanced:
+            lines += ["## Enhanced query", "", self.enhanced, ""]
+        for key, heading in (('entities', 'Entities'), ('perspectives', 'Perspectives'),
+                             ('research_areas', 'Research areas')):
+            items = [_as_text(item) for item in self.analysis.get(key, [])]
+            if any(items):
+                lines += [f"## {heading}", ""] + [f"- {item}" for item in items if item] + [""]
+        temporal = self.analysis.get('temporal_aspects')
+        if isinstance(temporal, dict) and temporal:
+            lines += ["## Temporal aspects", ""]
+            for key, value in temporal.items():
+                text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+                lines.append(f"- **{key.replace('_', ' ').capitalize()}**: {text}")
+            lines.append("")
+
+        if self.agents or self.reports:
+            lines += ["## Research progress", ""]
+            for role in self.agents or self.reports:
+                if role in self.reports:
+                    status = "partial" if INCOMPLETE_MARKER in self.reports[role] else "done"
+                else:
+                    status = "not finished" if self.done else "researching…"
+                lines.append(f"- {role}: {status}")
+            lines.append("")
+        for role, report in self.reports.items():
+            lines += [f"## {role}", "", excerpt(report), ""]
+        return '\n'.join(lines)
+
+    def _render(self):
+        try:
+            html = paste.render_markdown(self._markdown())
+            if not self.done:
+                html = html.replace('<head>', f'<head><meta http-equiv="refresh" content="{PREVIEW_REFRESH_SECONDS}"/>', 1)
+            temporary = f"{PREVIEW_PATH}.tmp"
+            with open(temporary, 'w', encoding='utf-8') as file:
+                file.write(html)
+            os.replace(temporary, PREVIEW_PATH)
+        except (OSError, ValueError) as e:
+            log.error(f"❌ Could not update the preview: {e}")
+
+def excerpt(report, limit=PREVIEW_REPORT_CHARS):
+    """Start of a report, with its headings turned into bold lines so it stays one card"""
+    text = re.sub(r'<!--.*?-->', '', report, flags=re.S)
+    text = re.sub(r'^#{1,6}\s+(.+)$', r'**\1**', text, flags=re.M).strip()
+    if len(text) > limit:
+        text = text[:limit].rsplit(' ', 1)[0] + ' …'
+        if text.count('```') % 2:
+            text += '\n```'
+    return text
+
+# Shared by the pipeline stages
+preview = Preview()
@@ -0,0 +1,128 @@
+import logging
+import os
+import sys
+import json
+import time
+import cProfile
+import pstats
+import resource
+import tracemalloc
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# Profiles are kept per run, outside the folders main.py clears
+PROFILE_DIR = 'profiles'
+
+# Allocation sites listed per stage
+TOP_ALLOCATIONS = 25
+
+# Frames kept per allocation; more frames cost more memory while tracing
+TRACEMALLOC_FRAMES = 10
+
+# Functions listed per stage in the summary, by cumulative time
+TOP_FUNCTIONS = 10
+
+# Allocations made by the profilers themselves are left out of the report
+IGNORED_ALLOCATIONS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class Profiler:
+    """
+    CPU and memory profiler for the pipeline stages.
+
+    Each stage gets a cProfile pstats file and a list of the allocation sites
+    that grew most while it ran (tracemalloc); write_summary() adds wall and
+    CPU time, traced peak memory and peak RSS per stage.
+
+    cProfile only sees the thread that runs the stage, so agents running on
+    their own threads (deadline mode) show up in the allocations but not in
+    the pstats files.
+    """
+
+    def __init__(self, output_dir, top=TOP_ALLOCATIONS):
+        self.output_dir = output_dir
+        self.top = top
+        self.stages = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    @contextmanager
+    def stage(self, name):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot().filter_traces(IGNORED_ALLOCATIONS)
+
+        profile = cProfile.Profile()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            _, traced_peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(IGNORED_ALLOCATIONS)
+            self._write_stage(name, profile, before, after, wall, cpu, traced_peak)
+
+    def _write_stage(self, name, profile, before, after, wall, cpu, traced_peak):
+        stats_path = os.path.join(self.output_dir, f"{name}.pstats")
+        profile.dump_stats(stats_path)
+
+        growth = after.compare_to(before, 'lineno')[:self.top]
+        allocations_path = os.path.join(self.output_dir, f"{name}_allocations.txt")
+        with open(allocations_path, 'w', encoding='utf-8') as file:
+            file.write(f"Top {len(growth)} allocation sites during '{name}'\n\n")
+            for stat in growth:
+                file.write(f"{stat}\n")
+
+        stats = pstats.Stats(profile)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        self.stages.append({
+            'stage': name,
+            'wall_seconds': round(wall, 3),
+            'cpu_seconds': round(cpu, 3),
+            'traced_peak_mb': round(traced_peak / (1024 * 1024), 2),
+            'peak_rss_mb': round(peak_rss_mb(), 2),
+            'top_functions': [
+                {'function': f"{os.path.basename(filename)}:{line}({function})", 'calls': calls,
+                 'cumulative_seconds': round(cumulative, 3)}
+                for (filename, line, function), (_, calls, _, cumulative, _) in functions
+            ],
+            'pstats': stats_path,
+            'allocations': allocations_path,
+        })
+
+    def write_summary(self):
+        """Write summary.json, print the per-stage table and stop tracing"""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        summary = {'peak_rss_mb': round(peak_rss_mb(), 2), 'stages': self.stages}
+        path = os.path.join(self.output_dir, 'summary.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=2)
+
+        log.info(f"📈 Profile written to {self.output_dir}/")
+        log.info(f"   {'stage':<12} {'wall s':>8} {'cpu s':>8} {'traced MB':>10} {'RSS MB':>8}")
+        for stage in self.stages:
+            log.info(f"   {stage['stage']:<12} {stage['wall_seconds']:>8} {stage['cpu_seconds']:>8} "
+                  f"{stage['traced_peak_mb']:>10} {stage['peak_rss_mb']:>8}")
+        log.info(f"   Peak RSS: {summary['peak_rss_mb']} MB")
+        return path
+
+if __name__ == "__main__":
+    # python profiling.py FILE.pstats [N]: show the top N functions of a stage
+    stats = pstats.Stats(sys.argv[1])
+    stats.sort_stats('cumulative').print_stats(int(sys.argv[2]) if len(sys.argv) > 2 else TOP_FUNCTIONS)
@@ -0,0 +1,83 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+# crewai opens an agent's system prompt with "You are {role}. {backstory}
+# \nYour personal goal is: {goal}" and follows it with one of these blocks
+# of tool (or no-tool) instructions
+INSTRUCTION_MARKERS = (
+    "\nYou ONLY have access to the following tools",
+    "\nTo give my best complete final answer",
+)
+
+# Instructions shared by every agent of a stage. They are sent in the stable
+# part of the prompt instead of being appended to each task.
+STAGE_INSTRUCTIONS = {
+    'research': "Present your findings in a clear, well-structured markdown format. "
+                "Your final answer must be a Markdown report.",
+}
+
+def split_persona(system):
+    """
+    Split crewai's system prompt into the agent's persona and the
+    instructions that follow it.
+
+    Returns:
+        Tuple of (persona, instructions), or (None, system) if the prompt
+        does not look like one of crewai's
+    """
+    if not system.startswith("You are "):
+        return None, system
+    positions = [system.find(marker) for marker in INSTRUCTION_MARKERS]
+    positions = [position for position in positions if position > 0]
+    if not positions:
+        return None, system
+    split = min(positions)
+    return system[:split].strip(), system[split:].strip('\n')
+
+def assemble(messages, stage=None):
+    """
+    Reorder an agent's prompt so the part every agent shares comes first.
+
+    The system prompt becomes the tool and format instructions, then the
+    stage's shared instructions, then the agent's persona. Agents with the
+    same tools thus send the same opening tokens, which providers that cache
+    prompt prefixes (OpenAI, DeepSeek, Gemini) bill and serve as cached. The
+    task text already comes after the system prompt.
+
+    If the prompt is not laid out as expected (crewai changed it), it is
+    left in its order and the stage's instructions are added at its end, so
+    they are never lost.
+
+    Returns:
+        A new message list (or string, for a plain prompt)
+    """
+    if not messages:
+        return messages
+    persona = None
+    if not isinstance(messages, str) and messages[0].get('role') == 'system':
+        persona, instructions = split_persona(messages[0].get('content') or '')
+    if persona is None:
+        return append_stage_instructions(messages, stage)
+    blocks = [instructions]
+    if STAGE_INSTRUCTIONS.get(stage):
+        blocks.append(STAGE_INSTRUCTIONS[stage])
+    blocks.append(persona)
+    return [dict(messages[0], content='\n\n'.join(blocks))] + list(messages[1:])
+
+_warned = False
+
+def append_stage_instructions(messages, stage):
+    """messages with the stage's shared instructions added at the end of the system prompt, or of the text"""
+    global _warned
+    text = STAGE_INSTRUCTIONS.get(stage)
+    if not text:
+        return messages
+    if not _warned:
+        _warned = True
+        log.warning("⚠️ Agent prompt not laid out as expected, sending the stage instructions after it")
+    if isinstance(messages, str):
+        return f"{messages}\n\n{text}"
+    if messages[0].get('role') == 'system':
+        return [dict(messages[0], content=f"{messages[0].get('content') or ''}\n\n{text}")] + list(messages[1:])
+    return [{'role': 'system', 'content': text}] + list(messages)
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+
+log = logging.getLogger(__name__)
+
+# Rendered card fragments, kept between runs
+RENDER_CACHE_PATH = 'cache/render.db'
+
+# Size bound on the cached HTML; 0 turns the cache off
+RENDER_CACHE_MAX_BYTES = int(float(os.getenv('RENDER_CACHE_MB', 64)) * 1024 * 1024)
+
+# When the bound is passed, least recently used sections are dropped until
+# the cache is down to this share of it, so eviction runs rarely
+EVICT_TO = 0.8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (
+    key TEXT PRIMARY KEY,
+    card TEXT NOT NULL,
+    modal TEXT,
+    see_more INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sections_used_at ON sections (used_at);
+"""
+
+def section_key(*parts):
+    """Cache key for a section: a hash of its content and everything else its card depends on"""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class RenderCache:
+    """
+    Persistent, size-bounded cache of rendered sections: the card, the modal
+    (if any) and whether the card has a "See More" button, keyed by
+    section_key(). Errors are reported and treated as misses, so the cache
+    never breaks a render.
+    """
+
+    def __init__(self, path=RENDER_CACHE_PATH, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self.size = conn.execute('SELECT COALESCE(SUM(size), 0) FROM sections').fetchone()[0]
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA busy_timeout=30000')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Tuple of (card, modal, see_more) for key, or None"""
+        try:
+            with self.connection() as conn:
+                row = conn.execute('SELECT card, modal, see_more FROM sections WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    conn.execute('UPDATE sections SET used_at = ? WHERE key = ?', (time.time(), key))
+        except sqlite3.Error as e:
+            log.error(f"❌ Render cache error: {e}")
+            row = None
+        with self.lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return (row[0], row[1], bool(row[2])) if row is not None else None
+
+    def put(self, key, card, modal, see_more):
+        size = len(card) + len(modal or '')
+        try:
+            with self.connection() as conn:
+                # A section rendered again (by another process) replaces its row
+                row = conn.execute('SELECT size FROM sections WHERE key = ?', (key,)).fetchone()
+                conn.execute('INSERT OR REPLACE INTO sections (key, card, modal, see_more, size, used_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', (key, card, modal, int(see_more), size, time.time()))
+        except sqlite3.Error as e:
+            log.error(f"❌ Render cache error: {e}")
+            return
+        with self.lock:
+            self.size += size - (row[0] if row is not None else 0)
+            full = self.size > self.max_bytes
+        if full:
+            self.evict()
+
+    def evict(self):
+        """Drop the least recently used sections until the cache is down to EVICT_TO of its bound"""
+        try:
+            with self.connection() as conn:
+                # Other processes share the file, so the size is counted afresh
+                size = conn.execute('SELECT COALESCE(SUM(size), 0) FROM sections').fetchone()[0]
+                target = self.max_bytes * EVICT_TO
+                dropped = []
+                for key, entry_size in conn.execute('SELECT key, size FROM sections ORDER BY used_at'):
+                    if size <= target:
+                        break
+                    dropped.append((key,))
+                    size -= entry_size
+                conn.executemany('DELETE FROM sections WHERE key = ?', dropped)
+        except sqlite3.Error as e:
+            log.error(f"❌ Render cache error: {e}")
+            return
+        with self.lock:
+            self.size = size
+        log.debug(f"Render cache: dropped {len(dropped)} sections")
+
+_cache = None
+_unavailable = False
+
+def get_render_cache():
+    """The process's render cache, or None when it is turned off or cannot be opened"""
+    global _cache, _unavailable
+    if _cache is None and RENDER_CACHE_MAX_BYTES > 0 and not _unavailable:
+        try:
+            _cache = RenderCache()
+        except (sqlite3.Error, OSError) as e:
+            # Rendering goes on without the cache, which is not tried again
+            log.error(f"❌ Render cache unavailable, rendering without it: {e}")
+            _unavailable = True
+    return _cache
@@ -0,0 +1,124 @@
+import logging
+import os
+import json
+import math
+import time
+import threading
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+# Same default model crewai picks when an agent is given none
+DEFAULT_MODEL = os.getenv("MODEL") or os.getenv("OPENAI_MODEL_NAME") or "gpt-4o-mini"
+
+# Optional routing file, merged over the defaults below
+ROUTING_PATH = 'routing.json'
+
+# Which model each stage and agent uses, and which faster model stands in for
+# a model that gets slow. Example routing.json:
+#   {
+#     "stages": {"planning": "gpt-4o-mini", "research": "gpt-4o"},
+#     "agents": {"Task Framework Engineer": "gpt-4o-mini"},
+#     "fallbacks": {"gpt-4o": {"model": "gpt-4o-mini", "p95_seconds": 30}}
+#   }
+DEFAULT_ROUTING = {
+    'stages': {
+        'planning': os.getenv("PLANNING_MODEL"),
+        'research': os.getenv("RESEARCH_MODEL"),
+    },
+    'agents': {},
+    'fallbacks': {},
+}
+
+# Latency samples kept per model, and how many are needed before judging it
+LATENCY_WINDOW = 50
+MIN_LATENCY_SAMPLES = 5
+
+# How long a slow model is skipped before it is tried again
+FALLBACK_COOLDOWN = 120
+
+def load_routing(path=ROUTING_PATH):
+    """Default routing with routing.json (if there is one) merged over it"""
+    routing = {key: dict(value) for key, value in DEFAULT_ROUTING.items()}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as file:
+                overrides = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            log.error(f"❌ Could not read {path}, using default models: {e}")
+            return routing
+        for key in routing:
+            routing[key].update(overrides.get(key) or {})
+    return routing
+
+routing = load_routing()
+
+def model_for(stage, role=None, requested=None):
+    """
+    Model for an agent: the one its plan asks for (the optional 'llm' field
+    of agents.json), else the one routed to its role, else to its stage,
+    else DEFAULT_MODEL.
+    """
+    return (requested
+            or routing['agents'].get(role)
+            or routing['stages'].get(stage)
+            or DEFAULT_MODEL)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+class LatencyRouter:
+    """
+    Sends calls for a model to its configured fallback while the model's p95
+    latency is above the fallback's threshold.
+
+    Once tripped, the slow model is skipped for FALLBACK_COOLDOWN seconds and
+    its samples are dropped, so it is judged afresh when tried again.
+    """
+
+    def __init__(self, fallbacks=None):
+        self.fallbacks = fallbacks if fallbacks is not None else routing['fallbacks']
+        self.samples = {}
+        self.tripped_until = {}
+        self.switches = 0
+        self.lock = threading.Lock()
+
+    def choose(self, model):
+        """Model to call instead of model right now"""
+        fallback = self.fallbacks.get(model)
+        if not fallback:
+            return model
+        with self.lock:
+            if time.monotonic() < self.tripped_until.get(model, 0):
+                return fallback['model']
+        return model
+
+    def record(self, model, seconds):
+        """Add the latency of a finished call and trip the fallback if the model got too slow"""
+        fallback = self.fallbacks.get(model)
+        with self.lock:
+            samples = self.samples.setdefault(model, deque(maxlen=LATENCY_WINDOW))
+            samples.append(seconds)
+            if not fallback or len(samples) < MIN_LATENCY_SAMPLES:
+                return
+            p95 = percentile(samples, 0.95)
+            if p95 <= fallback['p95_seconds']:
+                return
+            self.tripped_until[model] = time.monotonic() + FALLBACK_COOLDOWN
+            samples.clear()
+            self.switches += 1
+        log.warning(f"🐢 {model} p95 latency {p95:.1f}s is over {fallback['p95_seconds']}s, "
+              f"using {fallback['model']} for the next {FALLBACK_COOLDOWN}s")
+
+    def summary(self):
+        """p95 latency per model over the current window, and how often a fallback was tripped"""
+        with self.lock:
+            return {
+                'p95_seconds': {model: round(percentile(samples, 0.95), 2)
+                                for model, samples in self.samples.items() if samples},
+                'fallback_switches': self.switches,
+            }
+
+# Shared by every agent in the process
+latency_router = LatencyRouter()
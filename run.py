@@ -1,30 +1,71 @@
 #!/usr/bin/env python3
+import logging
 import os
+import re
 import glob
 import datetime
+import store
+import filesink
 
-def create_navigation_html():
+log = logging.getLogger(__name__)
+
+# Enough of a report to cover its <head>
+HEAD_READ_BYTES = 32 * 1024
+
+def is_incomplete(html_file, html=None):
+    """Check the status meta tag paste writes into reports cut off at a deadline"""
+    if html is not None:
+        head = html[:HEAD_READ_BYTES]
+    else:
+        with open(html_file, 'r', encoding='utf-8', errors='ignore') as f:
+            head = f.read(HEAD_READ_BYTES)
+    status = re.search(r'<meta[^>]*satyarthi-status[^>]*>', head)
+    return bool(status and 'incomplete' in status.group(0))
+
+def create_navigation_html(usage=None, pages=None):
     """
     Creates a main.html file that serves as a navigation page for all HTML files
     in the /htmls directory.
+
+    Args:
+        usage: Optional run totals from usage.UsageMeter, shown in the footer
+            and written to the page's metadata
+        pages: Optional dict of page path to HTML, as returned by
+            paste.render_reports, listed instead of the files in /htmls
+
+    Returns:
+        The navigation page's HTML
     """
-    # Make sure htmls directory exists
-    if not os.path.exists('htmls'):
-        os.makedirs('htmls')
-        print("Created /htmls directory since it didn't exist.")
-    
-    # Get all HTML files in the htmls directory
-    html_files = glob.glob('htmls/*.html')
+    if pages is None:
+        # Make sure htmls directory exists
+        if not os.path.exists('htmls'):
+            os.makedirs('htmls')
+            log.info("Created /htmls directory since it didn't exist.")
+        
+        # Get all HTML files in the htmls directory
+        html_files = glob.glob('htmls/*.html')
+    else:
+        html_files = list(pages)
     
     # Sort files alphabetically
     html_files.sort()
     
+    usage_meta = ''
+    usage_line = ''
+    if usage:
+        usage_meta = f"""
+    <meta name="satyarthi-tokens" content="{usage['total_tokens']}">
+    <meta name="satyarthi-llm-calls" content="{usage['calls']}">
+    <meta name="satyarthi-cost-usd" content="{usage['cost']:.4f}">"""
+        usage_line = f"""<br>
+        {usage['total_tokens']:,} tokens in {usage['calls']} LLM calls, about ${usage['cost']:.2f}"""
+
     # Create the main HTML content
     html_content = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">{usage_meta}
     <title>HTML Files Navigator</title>
     <style>
         body {{
@@ -66,6 +107,10 @@ def create_navigation_html():
             color: #666;
             margin-top: 3px;
         }}
+        .incomplete {{
+            color: #c05621;
+            font-weight: 600;
+        }}
         .empty-message {{
             color: #666;
             font-style: italic;
@@ -92,16 +137,23 @@ def create_navigation_html():
         for html_file in html_files:
             file_name = os.path.basename(html_file)
             file_path = html_file
-            file_stats = os.stat(file_path)
-            file_size = file_stats.st_size
-            mod_time = datetime.datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+            if pages is None:
+                file_stats = os.stat(file_path)
+                file_size = file_stats.st_size
+                mod_time = datetime.datetime.fromtimestamp(file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+            else:
+                file_size = len(pages[file_path].encode('utf-8'))
+                mod_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             
             # Format size in KB
             size_kb = file_size / 1024
             
+            html = pages[file_path] if pages is not None else None
+            status = ' | <span class="incomplete">Incomplete</span>' if is_incomplete(file_path, html) else ''
+            
             html_content += f"""        <li>
             <a href="{file_path}" target="_blank">{file_name}</a>
-            <div class="info">Size: {size_kb:.1f} KB | Last modified: {mod_time}</div>
+            <div class="info">Size: {size_kb:.1f} KB | Last modified: {mod_time}{status}</div>
         </li>
 """
     else:
@@ -113,17 +165,17 @@ def create_navigation_html():
     html_content += f"""    </ul>
     
     <div class="footer">
-        Generated on {current_time}
+        Generated on {current_time}{usage_line}
     </div>
 </body>
 </html>
 """
     
     # Write to file
-    with open('main.html', 'w') as f:
-        f.write(html_content)
-    
-    print(f"Successfully created main.html with links to {len(html_files)} HTML files.")
+    if filesink.write_text('main.html', html_content):
+        store.record('record_artifact', 'main.html', 'navigation', 'main.html')
+        log.info(f"Successfully created main.html with links to {len(html_files)} HTML files.")
+    return html_content
 
 if __name__ == "__main__":
     create_navigation_html()
\ No newline at end of file
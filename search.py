@@ -0,0 +1,288 @@
+import logging
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from typing import List, Optional, Type, Union
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from pydantic import BaseModel, Field
+from crewai.tools import BaseTool
+from crewai_tools import SerperDevTool
+from dedup import duplicate_filter
+from hedging import SEARCH_TIMEOUT, hedger
+
+log = logging.getLogger(__name__)
+
+# Search results are cached here so agents can reuse them across the run
+SEARCH_CACHE_DIR = 'cache/search'
+
+# News goes stale quickly; cached results older than this are ignored
+SEARCH_CACHE_TTL = 6 * 60 * 60
+
+# A cached query whose words overlap this much with a new query answers it too
+SEARCH_CACHE_MIN_SIMILARITY = 0.75
+
+# How long a lookup waits for the same search already running elsewhere
+PENDING_WAIT_TIMEOUT = 30
+
+def query_terms(query):
+    """Lower-cased set of words in a search query"""
+    return frozenset(re.findall(r'\w+', query.lower()))
+
+def key_terms(query):
+    """Numbers (years, figures) and names (capitalised words) in a search query, lower-cased"""
+    return frozenset(word.lower() for word in re.findall(r'\w+', query)
+                     if word[0].isupper() or any(char.isdigit() for char in word))
+
+def query_key(query):
+    """Cache key for a query; word order, case and punctuation do not matter"""
+    return hashlib.sha1(' '.join(sorted(query_terms(query))).encode('utf-8')).hexdigest()
+
+class SearchCache:
+    """
+    Thread-safe cache of search results, kept in memory and on disk.
+
+    Searches that are still running can be registered with mark_pending(), so
+    a lookup for the same query waits for that result instead of searching
+    again.
+    """
+
+    def __init__(self, cache_dir=SEARCH_CACHE_DIR, ttl=SEARCH_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.entries = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _fresh(self, entry, max_age=None):
+        ttl = min(self.ttl, max_age) if max_age else self.ttl
+        return entry is not None and time.time() - entry['time'] < ttl
+
+    def get(self, query, wait=True, max_age=None):
+        """
+        Return the cached results for query, or None.
+
+        Falls back to the most similar cached query when the words overlap by
+        at least SEARCH_CACHE_MIN_SIMILARITY and each query has every number
+        and name of the other ("rates 2024" never answers "rates 2025"). With
+        max_age, only results at most that many seconds old are returned.
+        """
+        key = query_key(query)
+        with self.lock:
+            pending = self.pending.get(key)
+        if pending is not None and wait:
+            pending.wait(PENDING_WAIT_TIMEOUT)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self._load(key)
+                if entry is not None:
+                    self.entries[key] = entry
+            if self._fresh(entry, max_age):
+                return entry['results']
+
+            # Closest query already answered in this run
+            terms = query_terms(query)
+            names = key_terms(query)
+            best, best_score = None, SEARCH_CACHE_MIN_SIMILARITY
+            for candidate in self.entries.values():
+                if not self._fresh(candidate, max_age):
+                    continue
+                candidate_terms = query_terms(candidate['query'])
+                if not (names <= candidate_terms and key_terms(candidate['query']) <= terms):
+                    continue
+                union = terms | candidate_terms
+                score = len(terms & candidate_terms) / len(union) if union else 0
+                if score >= best_score:
+                    best, best_score = candidate, score
+            return best['results'] if best else None
+
+    def mark_pending(self, query):
+        """Register a search for query that is about to run"""
+        with self.lock:
+            self.pending.setdefault(query_key(query), threading.Event())
+
+    def put(self, query, results):
+        """Store results for query and wake anyone waiting for them"""
+        key = query_key(query)
+        entry = {'query': query, 'time': time.time(), 'results': results}
+        with self.lock:
+            self.entries[key] = entry
+            event = self.pending.pop(key, None)
+        if event is not None:
+            event.set()
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._path(key), 'w', encoding='utf-8') as file:
+                json.dump(entry, file)
+        except (OSError, TypeError) as e:
+            log.error(f"❌ Could not write search cache entry: {e}")
+
+    def cancel(self, query):
+        """Drop a pending search that failed"""
+        with self.lock:
+            event = self.pending.pop(query_key(query), None)
+        if event is not None:
+            event.set()
+
+# Shared by every search tool in the process
+search_cache = SearchCache()
+
+class CachedSerperDevTool(SerperDevTool):
+    """
+    SerperDevTool that answers from the shared search cache when it can, and
+    leaves out stories already returned to an agent in this run. Searches are
+    bounded by SEARCH_TIMEOUT and hedged when slow.
+    """
+
+    # Oldest cached results this tool may answer with; None for the cache's TTL
+    max_age: Optional[float] = None
+
+    def _run(self, **kwargs):
+        search_query = kwargs.get("search_query") or kwargs.get("query")
+        if search_query:
+            cached = search_cache.get(search_query, max_age=self.max_age)
+            if cached is not None:
+                return duplicate_filter.filter_search_results(cached)
+
+        search = super()._run
+        results = hedger.call('serper', lambda attempt: search(**kwargs), timeout=SEARCH_TIMEOUT)
+        if search_query:
+            search_cache.put(search_query, results)
+        return duplicate_filter.filter_search_results(results)
+
+# Serper answers a JSON list of queries in one request
+SERPER_SEARCH_URL = 'https://google.serper.dev/search'
+
+# Queries per batch tool call, and hits kept per query
+MAX_BATCH_QUERIES = 6
+BATCH_RESULTS_PER_QUERY = 6
+
+def parse_queries(queries):
+    """Queries from a list, or from one string with one query per line or separated by ';'"""
+    if isinstance(queries, str):
+        queries = re.split(r'[\n;]+', queries)
+    unique = {}
+    for query in queries:
+        query = str(query).strip().strip('"\'-• ').strip()
+        if query and query_key(query) not in unique:
+            unique[query_key(query)] = query
+    return list(unique.values())
+
+def serper_batch(queries, num=BATCH_RESULTS_PER_QUERY):
+    """Run queries as one Serper batch request; returns a result per query, in order"""
+    def request(attempt):
+        with httpx.Client(timeout=SEARCH_TIMEOUT) as client:
+            # Closing the client aborts a request that lost to its hedge
+            attempt.on_cancel(client.close)
+            response = client.post(SERPER_SEARCH_URL, json=[{'q': query, 'num': num} for query in queries],
+                                   headers={'X-API-KEY': os.environ['SERPER_API_KEY'],
+                                            'Content-Type': 'application/json'})
+            response.raise_for_status()
+            return response.json()
+
+    results = hedger.call('serper_batch', request, timeout=SEARCH_TIMEOUT)
+    if not isinstance(results, list) or len(results) != len(queries):
+        raise ValueError("Serper batch answer does not match the queries")
+    return results
+
+def serper_each(queries):
+    """Fallback for serper_batch: one search per query, all at once"""
+    tool = SerperDevTool()
+    with ThreadPoolExecutor(max_workers=len(queries), thread_name_prefix='batch-search') as executor:
+        return list(executor.map(
+            lambda query: hedger.call('serper', lambda attempt: tool.run(search_query=query), timeout=SEARCH_TIMEOUT),
+            queries))
+
+def format_batch(results_by_query):
+    """Hits grouped under the query that found them"""
+    sections = []
+    for query, hits in results_by_query.items():
+        lines = [f"### {query}"]
+        for hit in hits:
+            details = [hit.get('link', '')]
+            if hit.get('date'):
+                details.append(hit['date'])
+            if hit.get('also_reported_by'):
+                details.append(f"also in {', '.join(hit['also_reported_by'])}")
+            lines.append(f"- {hit.get('title', '')} ({'; '.join(details)})")
+            if hit.get('snippet'):
+                lines.append(f"  {hit['snippet']}")
+        if not hits:
+            lines.append("- No new results (everything found was already returned)")
+        sections.append('\n'.join(lines))
+    return '\n\n'.join(sections)
+
+class BatchSearchInput(BaseModel):
+    """Input for BatchSearchTool"""
+    queries: Union[List[str], str] = Field(..., description="Search queries to run together, one per angle")
+
+class BatchSearchTool(BaseTool):
+    name: str = "Search several queries at once"
+    description: str = (
+        f"Runs up to {MAX_BATCH_QUERIES} web searches in one step and returns the results grouped by "
+        "query, without repeats. Use it to cover several angles of a topic at once instead of "
+        "searching one query at a time."
+    )
+    args_schema: Type[BaseModel] = BatchSearchInput
+    # Oldest cached results this tool may answer with; None for the cache's TTL
+    max_age: Optional[float] = None
+
+    def _run(self, queries: Union[List[str], str]) -> str:
+        queries = parse_queries(queries)[:MAX_BATCH_QUERIES]
+        if not queries:
+            return "No queries given."
+
+        results = {}
+        missing = []
+        for query in queries:
+            cached = search_cache.get(query, max_age=self.max_age)
+            if cached is not None:
+                results[query] = cached
+            else:
+                search_cache.mark_pending(query)
+                missing.append(query)
+
+        if missing:
+            try:
+                try:
+                    fetched = serper_batch(missing)
+                except (httpx.HTTPError, KeyError, ValueError, TimeoutError) as e:
+                    log.error(f"❌ Batch search failed ({e}), searching one query at a time")
+                    fetched = serper_each(missing)
+            except Exception:
+                for query in missing:
+                    search_cache.cancel(query)
+                raise
+            for query, result in zip(missing, fetched):
+                search_cache.put(query, result)
+                results[query] = result
+
+        # Hits already shown for an earlier query of this batch are left out too
+        seen_links = set()
+        grouped = {}
+        for query in queries:
+            filtered = duplicate_filter.filter_search_results(results[query])
+            hits = []
+            for hit in (filtered.get('organic') or []) if isinstance(filtered, dict) else []:
+                if isinstance(hit, dict) and hit.get('link') not in seen_links:
+                    seen_links.add(hit.get('link'))
+                    hits.append(hit)
+            grouped[query] = hits[:BATCH_RESULTS_PER_QUERY]
+        log.info(f"🔎 Batch search: {len(queries)} queries, {len(missing)} sent to Serper")
+        return format_batch(grouped)
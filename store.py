@@ -0,0 +1,300 @@
+import logging
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# The store outlives the per-run folders that main.py clears
+STORE_PATH = 'cache/satyarthi.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id TEXT PRIMARY KEY,
+    query TEXT,
+    title TEXT,
+    status TEXT NOT NULL DEFAULT 'running',
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+
+CREATE TABLE IF NOT EXISTS queries (
+    run_id TEXT NOT NULL REFERENCES runs (id),
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (run_id, kind)
+);
+CREATE INDEX IF NOT EXISTS queries_kind ON queries (kind, created_at);
+
+CREATE TABLE IF NOT EXISTS plans (
+    run_id TEXT NOT NULL REFERENCES runs (id),
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (run_id, kind)
+);
+
+CREATE TABLE IF NOT EXISTS agents (
+    run_id TEXT NOT NULL REFERENCES runs (id),
+    agent_key TEXT NOT NULL,
+    role TEXT,
+    goal TEXT,
+    backstory TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (run_id, agent_key)
+);
+CREATE INDEX IF NOT EXISTS agents_role ON agents (role);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    run_id TEXT NOT NULL REFERENCES runs (id),
+    task_key TEXT NOT NULL,
+    agent_key TEXT,
+    description TEXT,
+    expected_output TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (run_id, task_key)
+);
+CREATE INDEX IF NOT EXISTS tasks_agent ON tasks (run_id, agent_key);
+
+CREATE TABLE IF NOT EXISTS outputs (
+    run_id TEXT NOT NULL REFERENCES runs (id),
+    role TEXT NOT NULL,
+    markdown TEXT NOT NULL,
+    incomplete INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (run_id, role)
+);
+CREATE INDEX IF NOT EXISTS outputs_role ON outputs (role, created_at);
+
+CREATE TABLE IF NOT EXISTS timings (
+    run_id TEXT NOT NULL REFERENCES runs (id),
+    stage TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timings_run ON timings (run_id);
+
+CREATE TABLE IF NOT EXISTS artifacts (
+    run_id TEXT NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    path TEXT,
+    size INTEGER,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+"""
+
+class RunStore:
+    """
+    Embedded SQLite store for everything a run produces.
+
+    The database runs in WAL mode so several runs (and the threads inside
+    one run) can write at the same time. Each thread gets its own connection.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA busy_timeout=30000')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params)
+
+    # Writing
+
+    def start_run(self, query=None):
+        """Create a run and return its id"""
+        run_id = f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self.execute('INSERT INTO runs (id, query, started_at) VALUES (?, ?, ?)',
+                     (run_id, query, time.time()))
+        return run_id
+
+    def finish_run(self, run_id, status='completed', summary=None):
+        self.execute('UPDATE runs SET status = ?, finished_at = ?, summary = ? WHERE id = ?',
+                     (status, time.time(), json.dumps(summary) if summary is not None else None, run_id))
+
+    def record_query(self, run_id, kind, text):
+        """Store one form of the query: 'user', 'enhanced' or 'analysis'"""
+        self.execute('INSERT OR REPLACE INTO queries (run_id, kind, text, created_at) VALUES (?, ?, ?, ?)',
+                     (run_id, kind, text, time.time()))
+        if kind == 'user':
+            self.execute('UPDATE runs SET query = ? WHERE id = ?', (text, run_id))
+        elif kind == 'enhanced':
+            self.execute('UPDATE runs SET title = ? WHERE id = ?', (text, run_id))
+
+    def record_plan(self, run_id, kind, data):
+        """
+        Store the 'agents' or 'tasks' half of a plan (or another variant such
+        as 'merges'); agents and tasks are also indexed row by row.
+        """
+        with self.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO plans (run_id, kind, data, created_at) VALUES (?, ?, ?, ?)',
+                         (run_id, kind, json.dumps(data), time.time()))
+            if kind == 'agents':
+                conn.execute('DELETE FROM agents WHERE run_id = ?', (run_id,))
+                conn.executemany(
+                    'INSERT INTO agents (run_id, agent_key, role, goal, backstory, data) VALUES (?, ?, ?, ?, ?, ?)',
+                    [(run_id, key, agent.get('role'), agent.get('goal'), agent.get('backstory'), json.dumps(agent))
+                     for key, agent in data.items() if isinstance(agent, dict)]
+                )
+            elif kind == 'tasks':
+                conn.execute('DELETE FROM tasks WHERE run_id = ?', (run_id,))
+                conn.executemany(
+                    'INSERT INTO tasks (run_id, task_key, agent_key, description, expected_output, data) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [(run_id, key, task.get('agent'), task.get('description'), task.get('expected_output'),
+                      json.dumps(task))
+                     for key, task in data.items() if isinstance(task, dict)]
+                )
+
+    def record_output(self, run_id, role, markdown, incomplete=False, created_at=None):
+        """Store an agent's report; created_at is kept when a report is reused from an earlier run"""
+        self.execute('INSERT OR REPLACE INTO outputs (run_id, role, markdown, incomplete, created_at) '
+                     'VALUES (?, ?, ?, ?, ?)',
+                     (run_id, role, markdown, int(incomplete), created_at or time.time()))
+
+    def record_timing(self, run_id, stage, started_at, seconds):
+        self.execute('INSERT INTO timings (run_id, stage, started_at, seconds) VALUES (?, ?, ?, ?)',
+                     (run_id, stage, started_at, seconds))
+
+    def record_artifact(self, run_id, name, kind, path):
+        size = os.path.getsize(path) if path and os.path.exists(path) else None
+        self.execute('INSERT OR REPLACE INTO artifacts (run_id, name, kind, path, size, created_at) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', (run_id, name, kind, path, size, time.time()))
+
+    # Reading
+
+    def get_run(self, run_id):
+        row = self.execute('SELECT * FROM runs WHERE id = ?', (run_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_runs(self, limit=20, search=None):
+        """Most recent runs, optionally only those whose query or title mention search"""
+        if search:
+            rows = self.execute(
+                'SELECT * FROM runs WHERE query LIKE ? OR title LIKE ? ORDER BY started_at DESC LIMIT ?',
+                (f'%{search}%', f'%{search}%', limit))
+        else:
+            rows = self.execute('SELECT * FROM runs ORDER BY started_at DESC LIMIT ?', (limit,))
+        return [dict(row) for row in rows]
+
+    def latest_run(self, status='completed'):
+        """Id of the most recent run with the given status, or None"""
+        row = self.execute('SELECT id FROM runs WHERE status = ? ORDER BY started_at DESC LIMIT 1',
+                           (status,)).fetchone()
+        return row['id'] if row else None
+
+    def get_query(self, run_id, kind):
+        row = self.execute('SELECT text FROM queries WHERE run_id = ? AND kind = ?', (run_id, kind)).fetchone()
+        return row['text'] if row else None
+
+    def get_plan(self, run_id, kind):
+        row = self.execute('SELECT data FROM plans WHERE run_id = ? AND kind = ?', (run_id, kind)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def get_outputs(self, run_id):
+        """Markdown outputs of a run, keyed by agent role"""
+        rows = self.execute('SELECT role, markdown, incomplete, created_at FROM outputs WHERE run_id = ?',
+                            (run_id,))
+        return {row['role']: dict(row) for row in rows}
+
+    def get_timings(self, run_id):
+        rows = self.execute('SELECT stage, started_at, seconds FROM timings WHERE run_id = ? ORDER BY started_at',
+                            (run_id,))
+        return [dict(row) for row in rows]
+
+    def get_artifacts(self, run_id):
+        rows = self.execute('SELECT * FROM artifacts WHERE run_id = ? ORDER BY name', (run_id,))
+        return [dict(row) for row in rows]
+
+    def export_run(self, run_id, output_dir='output', data_dir='data'):
+        """Write a stored run back out as the usual JSON and markdown files"""
+        os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(data_dir, exist_ok=True)
+        for kind in ('agents', 'tasks'):
+            plan = self.get_plan(run_id, kind)
+            if plan is not None:
+                with open(os.path.join(output_dir, f"{kind}.json"), 'w') as file:
+                    json.dump(plan, file, indent=2)
+        title = self.get_query(run_id, 'enhanced')
+        if title is not None:
+            with open(os.path.join(output_dir, 'title.txt'), 'w') as file:
+                file.write(title)
+        for role, output in self.get_outputs(run_id).items():
+            with open(os.path.join(data_dir, f"{role}.md"), 'w', encoding='utf-8') as file:
+                file.write(output['markdown'])
+
+# The store and run the current process is working on
+_store = None
+current_run_id = None
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = RunStore()
+    return _store
+
+def start_run(query=None):
+    """Start a new run in the store and make it the current one"""
+    global current_run_id
+    current_run_id = get_store().start_run(query)
+    return current_run_id
+
+def finish_run(status='completed', summary=None):
+    if current_run_id is not None:
+        get_store().finish_run(current_run_id, status, summary)
+
+def record(method, *args, **kwargs):
+    """
+    Call a RunStore writer for the current run. Does nothing when no run has
+    been started (a stage run on its own); failures are reported, not raised,
+    so the store never breaks a run.
+    """
+    if current_run_id is None:
+        return
+    try:
+        getattr(get_store(), method)(current_run_id, *args, **kwargs)
+    except sqlite3.Error as e:
+        log.error(f"❌ Run store error in {method}: {e}")
+
+@contextmanager
+def timed(stage):
+    """Record how long the enclosed stage takes for the current run"""
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record('record_timing', stage, started_at, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    # python store.py [search text]: list recent runs
+    runs = get_store().list_runs(search=sys.argv[1] if len(sys.argv) > 1 else None)
+    for run in runs:
+        started = datetime.datetime.fromtimestamp(run['started_at']).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{run['id']}  {started}  {run['status']:<10} {run['query'] or ''}")
@@ -0,0 +1,10 @@
+import pytest
+import render_cache
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Run every test in its own directory, with a fresh render cache there"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(render_cache, '_cache', None)
+    monkeypatch.setattr(render_cache, '_unavailable', False)
+    return tmp_path
@@ -0,0 +1,92 @@
+import json
+import time
+import pytest
+
+# Token counts for the sections come from litellm
+pytest.importorskip('litellm')
+import store
+from analytics import build_rows, export_run
+from deadline import INCOMPLETE_MARKER
+
+AGENTS = {
+    'economy': {'role': 'Economy Reporter', 'goal': 'Cover the economy'},
+    'weather': {'role': 'Weather Reporter', 'goal': 'Cover the weather'},
+}
+
+TASKS = {
+    'rates': {'agent': 'economy', 'description': 'Report on interest rates'},
+    'jobs': {'agent': 'economy', 'description': 'Report on jobs'},
+    'floods': {'agent': 'weather', 'description': 'Report on floods'},
+}
+
+REPORT = f"""# Economy
+
+## Rates
+Rates were held at four percent.
+
+## Jobs
+Unemployment fell.
+{INCOMPLETE_MARKER}
+"""
+
+def totals(calls, cost):
+    return {'calls': calls, 'prompt_tokens': 100 * calls, 'cached_tokens': 0,
+            'completion_tokens': 10 * calls, 'total_tokens': 110 * calls, 'cost': cost}
+
+@pytest.fixture
+def run_id(workdir, monkeypatch):
+    db = store.RunStore(str(workdir / 'runs.db'))
+    monkeypatch.setattr(store, '_store', db)
+    run_id = db.start_run('economy and weather')
+    db.record_plan(run_id, 'research_agents', AGENTS)
+    db.record_plan(run_id, 'research_tasks', TASKS)
+    started = time.time()
+    db.record_timing(run_id, 'planning', started - 5, 2.0)
+    db.record_timing(run_id, 'research', started - 3, 3.0)
+    db.record_output(run_id, 'Economy Reporter', REPORT, incomplete=True, created_at=started - 1)
+    db.finish_run(run_id, summary={
+        'usage': {'run': totals(3, 0.03),
+                  'agent': {'Economy Reporter': totals(3, 0.03)},
+                  'task': {'rates+jobs': totals(3, 0.03)},
+                  'agent_models': {'Economy Reporter': {'big-model': 1, 'small-model': 2}}},
+        'hedging': {'hedged': 4, 'hedge_wins': 1, 'timeouts': 0},
+    })
+    return run_id
+
+def test_rows_describe_the_run(run_id):
+    date, tables = build_rows(run_id)
+    run, = tables['runs']
+    assert (run['run_id'], run['date'], run['status']) == (run_id, date, 'completed')
+    assert (run['agents'], run['reports'], run['incomplete_reports']) == (2, 1, 1)
+    assert (run['planning_seconds'], run['research_seconds']) == (2.0, 3.0)
+    assert (run['hedged_requests'], run['hedge_wins'], run['calls'], run['cost']) == (4, 1, 3, 0.03)
+
+    economy, weather = tables['agents']
+    assert (economy['model'], economy['models']) == ('small-model', ['big-model', 'small-model'])
+    assert (economy['tasks'], economy['sections'], economy['incomplete'], economy['reused']) == (2, 2, True, False)
+    assert economy['seconds_to_report'] == 2.0
+    # Nothing was counted for an agent that never reported; that is not zero
+    assert (weather['has_report'], weather['model'], weather['calls'], weather['cost']) == (False, None, None, None)
+
+    assert [task['usage_label'] for task in tables['tasks']] == ['rates+jobs', 'rates+jobs', 'floods']
+    assert [task['calls'] for task in tables['tasks']] == [3, 3, None]
+
+    assert [section['heading'] for section in tables['sections']] == ['Rates', 'Jobs']
+    # The incomplete marker is not counted as text
+    assert tables['sections'][1]['words'] == 4
+    assert all(section['tokens'] > 0 for section in tables['sections'])
+
+def test_unknown_run_has_no_rows(run_id):
+    assert build_rows('missing') == (None, None)
+    assert export_run('missing') is None
+
+def test_runs_are_exported_once(run_id, workdir):
+    date, tables = build_rows(run_id)
+    path = export_run(run_id, output_dir='analytics')
+    assert path == f"analytics/runs/date={date}/{run_id}.jsonl"
+    for table in ('runs', 'agents', 'tasks', 'sections'):
+        written = (workdir / 'analytics' / table / f"date={date}" / f"{run_id}.jsonl").read_text()
+        assert [json.loads(line) for line in written.splitlines()] == tables[table]
+
+    assert export_run(run_id, output_dir='analytics') is None
+    assert len((workdir / path).read_text().splitlines()) == 1
@@ -0,0 +1,58 @@
+import json
+from dedup import DuplicateFilter, minhash, similarity
+
+STORY = ("The central bank held interest rates at four percent on Thursday, "
+         "citing slowing inflation and a weaker labour market across the region")
+REWORDED = ("The central bank held interest rates at four percent on Thursday, "
+            "citing slowing inflation and a weaker labour market in the region")
+OTHER = ("Heavy rain flooded low-lying streets in the capital overnight, "
+         "closing schools and forcing hundreds of families to leave their homes")
+
+def hit(link, title, snippet):
+    return {'title': title, 'link': link, 'snippet': snippet}
+
+def test_signatures_estimate_overlap():
+    assert similarity(minhash(STORY), minhash(STORY)) == 1
+    assert similarity(minhash(STORY), minhash(REWORDED)) >= 0.6
+    assert similarity(minhash(STORY), minhash(OTHER)) < 0.2
+    assert minhash("Too short to tell") is None
+
+def test_near_duplicate_is_suppressed_and_credited():
+    duplicates = DuplicateFilter()
+    assert duplicates.check('https://a.example/rates', 'Rates held', STORY) is None
+    story = duplicates.check('https://b.example/rates', 'Rates held', REWORDED)
+    assert story['url'] == 'https://a.example/rates'
+    assert story['alternates'] == ['https://b.example/rates']
+    assert duplicates.check('https://c.example/floods', 'Floods', OTHER) is None
+    # Seeing a story again at its own URL is not a duplicate
+    assert duplicates.check('https://a.example/rates', 'Rates held', STORY) is None
+
+def test_snippets_and_articles_are_compared_separately():
+    duplicates = DuplicateFilter()
+    assert duplicates.check('https://a.example/rates', 'Rates held', STORY) is None
+    assert duplicates.check('https://b.example/rates', 'Rates held', STORY, kind='article') is None
+
+def test_search_results_keep_the_first_copy(workdir):
+    duplicates = DuplicateFilter()
+    results = {'organic': [hit('https://www.a.example/rates', 'Rates held', STORY),
+                           hit('https://b.example/rates', 'Rates held', REWORDED),
+                           hit('https://c.example/floods', 'Floods', OTHER)],
+               'news': [hit('https://d.example/rates', 'Rates held', STORY)]}
+    filtered = duplicates.filter_search_results(results)
+    assert [item['link'] for item in filtered['organic']] == ['https://www.a.example/rates',
+                                                               'https://c.example/floods']
+    # Duplicates found in later lists are credited from the next search on
+    assert filtered['organic'][0]['also_reported_by'] == ['b.example']
+    assert filtered['news'] == []
+    assert filtered['duplicates_suppressed'] == 2
+    assert len(results['organic']) == 3
+
+    report = duplicates.write_report(str(workdir / 'duplicates.json'))
+    assert report['suppressed'] == 2
+    assert report['stories'] == [{'url': 'https://www.a.example/rates', 'title': 'Rates held',
+                                  'alternates': ['https://b.example/rates', 'https://d.example/rates']}]
+    assert json.loads((workdir / 'duplicates.json').read_text()) == report
+
+    duplicates.reset()
+    assert duplicates.filter_search_results(results)['duplicates_suppressed'] == 2
+    assert duplicates.report()['suppressed'] == 2
@@ -0,0 +1,73 @@
+import httpx
+import pytest
+
+# The fetch tool is a crewai tool
+pytest.importorskip('crewai')
+from fetch import Fetcher, PageCache, extract_article
+
+PARAGRAPH = "The committee published its findings on Tuesday after a year of hearings and reviews."
+
+ARTICLE = f"""<html><head><title>Site | Findings</title></head><body>
+<nav><a href="/">Home</a></nav>
+<div class="menu-bar">Sections and more sections of the site menu</div>
+<article>
+<h1>Committee publishes findings</h1>
+<p>{PARAGRAPH}</p>
+<div class="commentary"><p>Analysts read the findings as a rebuke of the regulator's approach.</p></div>
+<div class="share-buttons"><p>Share this story with your friends and followers today</p></div>
+<div id="comments"><p>First comment: this is the best thing I have read all week.</p></div>
+<p>Short</p>
+</article>
+<footer>Copyright notice and links that are not part of the story</footer>
+</body></html>"""
+
+def site(request):
+    """Local stand-in for the web"""
+    path = request.url.path
+    if path == '/moved':
+        return httpx.Response(301, headers={'location': '/article'})
+    if path == '/article':
+        return httpx.Response(200, html=ARTICLE)
+    if path == '/report.pdf':
+        return httpx.Response(200, content=b'%PDF-1.7', headers={'content-type': 'application/pdf'})
+    if path == '/slow':
+        raise httpx.ReadTimeout("timed out", request=request)
+    return httpx.Response(404)
+
+def fetch(workdir, *urls):
+    fetcher = Fetcher(cache=PageCache(str(workdir / 'pages')), transport=httpx.MockTransport(site))
+    return fetcher.fetch_batch(list(urls))
+
+def test_article_text_is_extracted(workdir):
+    result, = fetch(workdir, 'https://news.example/article')
+    assert result['status'] == 'fetched'
+    assert result['title'] == 'Committee publishes findings'
+    assert PARAGRAPH in result['text']
+    assert 'rebuke of the regulator' in result['text']
+    for boilerplate in ('site menu', 'Share this story', 'First comment', 'Copyright', 'Short'):
+        assert boilerplate not in result['text']
+
+def test_redirects_are_followed(workdir):
+    result, = fetch(workdir, 'https://news.example/moved')
+    assert result['status'] == 'fetched'
+    assert result['final_url'] == 'https://news.example/article'
+    assert PARAGRAPH in result['text']
+
+def test_errors_are_reported_per_url(workdir):
+    results = fetch(workdir, 'https://news.example/slow', 'https://news.example/report.pdf',
+                    'https://news.example/missing', 'https://news.example/article')
+    assert [result['status'] for result in results] == ['error', 'error', 'error', 'fetched']
+    assert results[0]['error'].startswith('ReadTimeout')
+    assert 'application/pdf' in results[1]['error']
+    assert results[2]['error'] == 'HTTP 404'
+
+def test_fetched_pages_are_cached(workdir):
+    fetch(workdir, 'https://news.example/article')
+    result, = fetch(workdir, 'https://news.example/article')
+    assert result['status'] == 'cached'
+    assert PARAGRAPH in result['text']
+
+def test_boilerplate_hints_match_whole_words():
+    _, text = extract_article(f'<div class="story-commentary"><p>{PARAGRAPH}</p></div>'
+                              f'<div class="related_links"><p>{PARAGRAPH} Related.</p></div>')
+    assert text == PARAGRAPH
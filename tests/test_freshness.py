@@ -0,0 +1,31 @@
+import pytest
+
+# freshness reads the analysis the way prefetch does, which uses crewai_tools
+pytest.importorskip('crewai_tools')
+from freshness import analysis_hints, temporal_category
+
+def category(description, role='Research Analyst', goal='Report on the topic', hints=None):
+    return temporal_category({'role': role, 'goal': goal}, [{'description': description}], hints)
+
+@pytest.mark.parametrize('description, expected', [
+    ("Follow the breaking reports on the earthquake as they come in", 'breaking'),
+    ("Track the live results of the election count", 'breaking'),
+    ("Cover the unfolding standoff at the border", 'breaking'),
+    ("Summarise the latest quarterly earnings of the big banks", 'current'),
+    ("Report what the central bank decided today", 'current'),
+    ("Describe the state of the chip industry", 'current'),
+    ("Trace the history of the dispute and its origins", 'historical'),
+    ("Assess the long-term implications for energy prices", 'outlook'),
+])
+def test_task_descriptions_are_classified(description, expected):
+    assert category(description) == expected
+
+def test_designer_category_wins():
+    task = {'description': "Cover the breaking news", 'temporal': 'historical'}
+    assert temporal_category({'role': 'Reporter'}, [task]) == 'historical'
+
+def test_analysis_hints_place_agents():
+    analysis = {'temporal_aspects': {'future_implications': "Tariffs, retaliation and supply chains"}}
+    hints = analysis_hints(analysis)
+    assert category("Study tariffs, retaliation and supply chains", hints=hints) == 'outlook'
+    assert category("Study tariffs", hints=hints) == 'current'
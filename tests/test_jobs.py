@@ -0,0 +1,123 @@
+import time
+import threading
+from jobs import Heartbeat, JobQueue
+
+def queues(workdir):
+    # Two workers in one process, each with its own connection to the queue
+    path = str(workdir / 'jobs.db')
+    return JobQueue(path), JobQueue(path), JobQueue(path)
+
+def test_jobs_are_claimed_once_in_order(workdir):
+    coordinator, first, second = queues(workdir)
+    ids = [coordinator.publish('run', name, {'agent': name}) for name in ('a', 'b')]
+    assert coordinator.pending('run') == 2
+
+    claimed = [first.claim('w1'), second.claim('w2')]
+    assert [job['id'] for job in claimed] == ids
+    assert [job['payload'] for job in claimed] == [{'agent': 'a'}, {'agent': 'b'}]
+    assert [job['attempt'] for job in claimed] == [1, 1]
+    assert first.claim('w1') is None
+    assert coordinator.workers() == ['w1', 'w2']
+
+def test_claims_from_threads_do_not_race(workdir):
+    coordinator, *_ = queues(workdir)
+    for index in range(20):
+        coordinator.publish('run', f"job-{index}", {})
+    claimed = {'w1': [], 'w2': []}
+
+    def work(worker):
+        queue = JobQueue(coordinator.path)
+        while (job := queue.claim(worker)) is not None:
+            claimed[worker].append(job['id'])
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in claimed]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = claimed['w1'] + claimed['w2']
+    assert sorted(ids) == list(range(1, 21))
+
+def test_only_the_lease_holder_finishes_a_job(workdir):
+    coordinator, first, second = queues(workdir)
+    job_id = coordinator.publish('run', 'a', {})
+    first.claim('w1')
+    assert not second.heartbeat(job_id, 'w2', {'thought': 'not mine'})
+    assert not second.complete(job_id, 'w2', {'markdown': 'not mine'})
+    assert first.heartbeat(job_id, 'w1', {'thought': 'halfway'})
+    assert coordinator.jobs('run')[0]['progress'] == {'thought': 'halfway'}
+
+    # A heartbeat without progress keeps the last one
+    assert first.heartbeat(job_id, 'w1')
+    assert first.complete(job_id, 'w1', {'markdown': '# Report'})
+    job, = coordinator.jobs('run')
+    assert (job['status'], job['worker'], job['result']) == ('done', 'w1', {'markdown': '# Report'})
+    assert job['progress'] == {'thought': 'halfway'}
+    assert coordinator.pending('run') == 0
+
+def test_expired_lease_is_taken_over(workdir):
+    coordinator, first, second = queues(workdir)
+    job_id = coordinator.publish('run', 'a', {})
+    first.claim('w1', lease_seconds=0.01)
+    time.sleep(0.05)
+    job = second.claim('w2')
+    assert (job['id'], job['attempt']) == (job_id, 2)
+    # The first worker lost the job and cannot finish it any more
+    assert not first.heartbeat(job_id, 'w1')
+    assert not first.complete(job_id, 'w1', {'markdown': 'late'})
+    assert second.complete(job_id, 'w2', {'markdown': 'on time'})
+    assert coordinator.jobs('run')[0]['result'] == {'markdown': 'on time'}
+
+def test_expired_lease_fails_after_the_last_attempt(workdir):
+    coordinator, first, _ = queues(workdir)
+    coordinator.publish('run', 'a', {}, max_attempts=1)
+    first.claim('w1', lease_seconds=0.01)
+    time.sleep(0.05)
+    assert coordinator.reclaim_expired() == 1
+    job, = coordinator.jobs('run')
+    assert (job['status'], job['error']) == ('failed', 'lease expired')
+
+def test_jobs_no_worker_is_left_for_are_abandoned(workdir):
+    coordinator, first, _ = queues(workdir)
+    started = coordinator.publish('run', 'a', {})
+    waiting = coordinator.publish('run', 'b', {})
+    first.claim('w1', lease_seconds=0.01)
+    time.sleep(0.05)
+    assert coordinator.reclaim_expired() == 1
+    assert coordinator.workers(within=0.01) == []
+    # Only the job a worker had started fails; the other still waits for one
+    assert coordinator.abandon('run', 'no worker left') == 1
+    statuses = [(job['id'], job['status']) for job in coordinator.jobs('run')]
+    assert statuses == [(started, 'failed'), (waiting, 'queued')]
+
+def test_cancelled_run_stops_its_workers(workdir):
+    coordinator, first, second = queues(workdir)
+    running = coordinator.publish('run', 'a', {})
+    coordinator.publish('run', 'b', {})
+    other = coordinator.publish('other', 'c', {})
+    first.claim('w1')
+    assert coordinator.cancel_run('run') == 2
+    assert coordinator.pending('run') == 0
+    assert not first.complete(running, 'w1', {'markdown': 'late'})
+    # Jobs of other runs are left alone
+    assert second.claim('w2')['id'] == other
+
+    stop = threading.Event()
+    with Heartbeat(first, running, 'w1', every=0.01, stop=stop) as heartbeat:
+        assert stop.wait(5)
+    assert heartbeat.lost
+
+def test_failed_job_is_retried_after_a_delay(workdir):
+    coordinator, first, second = queues(workdir)
+    job_id = coordinator.publish('run', 'a', {}, max_attempts=2)
+    first.claim('w1')
+    assert first.fail(job_id, 'w1', 'boom', retry_delay=0.05)
+    assert second.claim('w2') is None
+    assert not first.fail(job_id, 'w1', 'again')
+
+    time.sleep(0.1)
+    job = second.claim('w2')
+    assert (job['id'], job['attempt']) == (job_id, 2)
+    assert second.fail(job_id, 'w2', 'boom again', retry_delay=0)
+    job, = coordinator.jobs('run')
+    assert (job['status'], job['error']) == ('failed', 'boom again')
@@ -0,0 +1,221 @@
+import re
+from pathlib import Path
+import markdown
+import pytest
+import paste
+import render_cache
+from deadline import INCOMPLETE_MARKER
+
+LONG = "Officials said the measure would take effect next quarter, pending review. " * 8
+
+# Setext headings, reference links defined in another section, fenced code
+# that looks like a heading, raw inline HTML, tables and enough sections for
+# lazy cards
+REPORT = f"""Central Bank Digital Currencies
+===============================
+
+Intro text before the first section.
+
+## Overview
+
+See the [IMF note][imf] and the [BIS survey][2] for background.
+
+Key Stakeholders
+----------------
+
+- Central banks
+- Commercial banks, per the [BIS survey][2]
+
+{LONG}
+
+## Timeline
+
+```
+## not a heading
+Title
+-----
+```
+
+| Year | Event |
+|------|-------|
+| 2020 | Pilot |
+
+Historical Context
+------------------
+
+Text with <span class="note">raw <b>inline</b> HTML</span> and a <br> break.
+
+{LONG}
+
+## Outlook
+
+Short.
+
+## Risks
+
+{LONG}
+
+## Sources
+
+Listed [here][imf].
+
+## Appendix
+
+Final remarks.
+
+[imf]: https://www.imf.org/en/Topics/fintech "IMF"
+[2]: https://www.bis.org/publ/bppdf.htm
+"""
+
+def h2_count(text):
+    return len(re.findall(r'<h2[ >]', markdown.markdown(text, extensions=paste.MARKDOWN_EXTENSIONS)))
+
+@pytest.mark.parametrize('layout', paste.LAYOUTS)
+@pytest.mark.parametrize('incomplete', [False, True])
+def test_stream_matches_whole_render(workdir, layout, incomplete):
+    text = REPORT.replace("Short.", f"Short.\n\n{INCOMPLETE_MARKER}") if incomplete else REPORT
+    source = workdir / 'report.md'
+    source.write_text(text, encoding='utf-8')
+    outputs = {}
+    for stream in (False, True):
+        output_dir = workdir / f"out-{stream}"
+        output_dir.mkdir()
+        path = paste.convert_markdown_to_html_cards(source, stream=stream, output_dir=str(output_dir), layout=layout)
+        outputs[stream] = Path(path).read_text(encoding='utf-8')
+    assert outputs[True] == outputs[False] == paste.render_whole_markdown(text, layout=layout)
+
+# Reports where Python-Markdown finds other headings than a line scan would
+UNSPLITTABLE_REPORTS = {
+    'raw HTML block': "## First\n\nText.\n\n<div>\n## inside div\n</div>\n\n## Second\n\nMore.\n",
+    'unclosed fence': "## First\n\n```\ncode\n\n## Second\n\nMore.\n",
+    'fence in a list item': "## First\n\n- item\n\n    ```\n    ## in the list\n    ```\n\n## Second\n",
+    'heading in a quote': "## First\n\n> ## quoted\n\n## Second\n",
+    'heading after a table': "## First\n\n| a | b |\n|---|---|\n| 1 | 2 |\n## not a heading\n",
+}
+
+@pytest.mark.parametrize('text', UNSPLITTABLE_REPORTS.values(), ids=UNSPLITTABLE_REPORTS.keys())
+def test_stream_matches_whole_render_of_unsplittable_reports(workdir, text):
+    source = workdir / 'report.md'
+    source.write_text(text, encoding='utf-8')
+    outputs = {}
+    for stream in (False, True):
+        output_dir = workdir / f"out-{stream}"
+        output_dir.mkdir()
+        path = paste.convert_markdown_to_html_cards(source, stream=stream, output_dir=str(output_dir))
+        outputs[stream] = Path(path).read_text(encoding='utf-8')
+    assert outputs[True] == outputs[False]
+    assert outputs[True].count('class="card-header"') == h2_count(text)
+
+def test_reports_split_where_python_markdown_does():
+    for text in (REPORT, MARKUP_REPORT):
+        assert paste.scan_markdown(text.splitlines(keepends=True))[3]
+    for text in UNSPLITTABLE_REPORTS.values():
+        assert not paste.scan_markdown(text.splitlines(keepends=True))[3]
+    # A rule after a paragraph ends its block, so the next lines can be a
+    # setext heading; a fence with text after the language is no fence
+    text = "## First\n\npara\n***\nTitle\n---\n\n```python extra\n## Third\n"
+    assert len(list(paste.iter_markdown_sections(text.splitlines(keepends=True)))) == h2_count(text) == 3
+
+def test_sections_follow_markdown_headings(workdir):
+    html = paste.render_markdown(REPORT)
+    assert html.count('class="card-header"') == h2_count(REPORT) == 8
+    assert '<title>Central Bank Digital Currencies' in html
+    assert 'Key Stakeholders' in html and 'Historical Context' in html
+    assert '[imf]' not in html and '[2]' not in html
+    assert 'href="https://www.bis.org/publ/bppdf.htm"' in html
+    assert 'https://www.imf.org/en/Topics/fintech' in html
+
+def test_iter_markdown_sections_splits_setext_headings():
+    sections = list(paste.iter_markdown_sections(REPORT.splitlines(keepends=True)))
+    assert [section.splitlines()[0] for section in sections] == [
+        '## Overview', 'Key Stakeholders', '## Timeline', 'Historical Context',
+        '## Outlook', '## Risks', '## Sources', '## Appendix',
+    ]
+
+@pytest.mark.parametrize('layout', paste.LAYOUTS)
+def test_cached_render_matches_uncached(workdir, monkeypatch, layout):
+    cold = paste.render_markdown(REPORT, layout=layout)
+    warm = paste.render_markdown(REPORT, layout=layout)
+    assert render_cache.get_render_cache().hits == 8
+    monkeypatch.setattr(paste, 'get_render_cache', lambda: None)
+    assert cold == warm == paste.render_markdown(REPORT, layout=layout)
+
+def test_cached_sections_are_not_converted_again(workdir, monkeypatch):
+    conversions = []
+    convert = paste.convert_markdown
+
+    def counted(text):
+        conversions.append(text.splitlines()[0])
+        return convert(text)
+
+    monkeypatch.setattr(paste, 'convert_markdown', counted)
+    cold = paste.render_markdown(MARKUP_REPORT)
+    assert len(conversions) == h2_count(MARKUP_REPORT)
+    conversions.clear()
+    changed = MARKUP_REPORT.replace("Short.", "Shorter.")
+    warm = paste.render_markdown(changed)
+    assert conversions == ['## Outlook']
+    assert cold == paste.render_whole_markdown(MARKUP_REPORT)
+    assert warm == paste.render_whole_markdown(changed)
+
+def test_cached_sections_follow_reference_definitions(workdir):
+    paste.render_markdown(REPORT)
+    # The definition is outside the sections that use it
+    moved = REPORT.replace('https://www.imf.org/en/Topics/fintech', 'https://www.imf.org/en/Publications')
+    html = paste.render_markdown(moved)
+    assert 'https://www.imf.org/en/Publications' in html
+    assert 'https://www.imf.org/en/Topics/fintech' not in html
+
+# Lists, nested code, entities, emphasis in tables and images, next to the
+# raw HTML in REPORT
+MARKUP_REPORT = REPORT + """
+## Markup
+
+1. First, with `code` and **bold**
+    - nested *item* &amp; more &copy;
+2. Second
+
+> Quoted "text" with <a> & > signs
+
+| Left | Right |
+|:-----|------:|
+| *x*  | [link](https://example.com/?a=1&b=2 "Title") |
+
+![chart](https://example.com/chart.png)
+
+    indented code <b>not bold</b>
+
+Line one  
+line two
+"""
+
+@pytest.mark.parametrize('parser', paste.available_parsers())
+@pytest.mark.parametrize('stream', [False, True])
+def test_parsers_render_identically(workdir, monkeypatch, parser, stream):
+    source = workdir / 'report.md'
+    source.write_text(MARKUP_REPORT, encoding='utf-8')
+    # Every render from scratch, so the cache cannot hide a difference
+    monkeypatch.setattr(paste, 'get_render_cache', lambda: None)
+    pages = {}
+    for backend in ('html.parser', parser):
+        paste.set_parser(backend)
+        output_dir = workdir / backend
+        output_dir.mkdir(exist_ok=True)
+        path = paste.convert_markdown_to_html_cards(source, stream=stream, output_dir=str(output_dir))
+        pages[backend] = Path(path).read_text(encoding='utf-8')
+    paste.set_parser(None)
+    assert pages[parser] == pages['html.parser']
+    assert pages[parser].count('class="card-header"') == h2_count(MARKUP_REPORT)
+
+@pytest.mark.parametrize('parser', paste.available_parsers())
+def test_parsers_build_the_same_tree(parser):
+    html = markdown.markdown(MARKUP_REPORT, extensions=paste.MARKDOWN_EXTENSIONS)
+    sections = [markdown.markdown(section, extensions=paste.MARKDOWN_EXTENSIONS)
+                for section in paste.iter_markdown_sections(MARKUP_REPORT.splitlines(keepends=True))]
+    for markup in [html, *sections]:
+        assert str(paste.make_soup(markup, parser)) == str(paste.make_soup(markup, 'html.parser'))
+
+def test_unknown_parser_is_refused():
+    with pytest.raises(ValueError):
+        paste.set_parser('html5lib-missing')
+    assert paste.PARSER == paste.available_parsers()[0]
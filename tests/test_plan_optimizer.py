@@ -0,0 +1,56 @@
+import json
+from plan_optimizer import MERGE_LOG_PATH, agent_cap, optimize_plan
+
+AGENTS = {
+    'inflation': {'role': 'Inflation Analyst', 'goal': 'Track eurozone consumer price inflation and its drivers'},
+    'elections': {'role': 'Election Researcher', 'goal': 'Cover the regional election campaigns and polling'},
+    'prices': {'role': 'Price Analyst', 'goal': 'Track eurozone consumer price inflation trends'},
+    'climate': {'role': 'Climate Researcher', 'goal': 'Report on flooding and extreme weather this season'},
+}
+
+TASKS = {
+    'inflation_task': {'agent': 'inflation', 'description': 'Summarise the latest eurozone inflation figures'},
+    'elections_task': {'agent': 'elections', 'description': 'Summarise the election polling and campaigns'},
+    'prices_task': {'agent': 'prices', 'description': 'Summarise the latest eurozone inflation figures by country'},
+    'climate_task': {'agent': 'climate', 'description': 'Summarise the flooding and extreme weather news'},
+    'orphan_task': {'agent': 'missing', 'description': 'Written for an agent the plan forgot'},
+}
+
+def test_near_duplicate_agents_are_merged(workdir):
+    agents, tasks = optimize_plan(AGENTS, TASKS)
+    assert list(agents) == ['inflation', 'elections', 'climate']
+    assert agents['inflation']['merged_from'] == ['prices']
+    assert 'Also cover: Price Analyst: Track eurozone' in agents['inflation']['goal']
+
+    # The kept agent gets one task covering both; unknown agents keep theirs
+    assert list(tasks) == ['inflation_task', 'elections_task', 'climate_task', 'orphan_task']
+    assert tasks['inflation_task']['merged_from'] == ['prices_task']
+    assert tasks['inflation_task']['description'].endswith(
+        "Also address:\n- Summarise the latest eurozone inflation figures by country")
+    assert tasks['orphan_task'] == TASKS['orphan_task']
+    # The plan given is left as it was
+    assert 'merged_from' not in TASKS['inflation_task']
+
+    merge_log = json.loads((workdir / MERGE_LOG_PATH).read_text())
+    assert merge_log['cap'] is None
+    assert merge_log['merges'] == [{'kept': 'inflation', 'merged': ['prices'],
+                                    'roles': ['Inflation Analyst', 'Price Analyst']}]
+
+def test_distinct_agents_are_kept(workdir):
+    agents, tasks = optimize_plan(AGENTS, TASKS, threshold=1.01)
+    assert agents == AGENTS
+    assert tasks == TASKS
+
+def test_cap_merges_past_the_threshold(workdir):
+    agents, tasks = optimize_plan(AGENTS, TASKS, max_agents=2)
+    assert len(agents) == 2
+    assert sorted(key for agent_key, agent in agents.items()
+                  for key in [agent_key] + agent.get('merged_from', [])) == sorted(AGENTS)
+    assert {task['agent'] for task in tasks.values()} == set(agents) | {'missing'}
+
+def test_agent_cap():
+    assert agent_cap() is None
+    assert agent_cap(max_agents=3) == 3
+    assert agent_cap(budget=0.2) == 4
+    assert agent_cap(max_agents=3, budget=0.1) == 2
+    assert agent_cap(budget=0.01) == 1
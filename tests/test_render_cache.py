@@ -0,0 +1,21 @@
+import os
+import paste
+import render_cache
+from render_cache import RenderCache
+
+def test_replaced_section_is_counted_once(workdir):
+    cache = RenderCache('render.db', max_bytes=1000)
+    for _ in range(5):
+        cache.put('key', 'x' * 100, None, False)
+    assert cache.size == 100
+    cache.put('key', 'x' * 40, 'y' * 10, True)
+    assert cache.size == 50
+    assert cache.get('key') == ('x' * 40, 'y' * 10, True)
+
+def test_unreadable_cache_is_skipped(workdir):
+    os.makedirs(os.path.dirname(render_cache.RENDER_CACHE_PATH))
+    with open(render_cache.RENDER_CACHE_PATH, 'wb') as file:
+        file.write(b'not a database' * 100)
+    html = paste.render_markdown("# Title\n\n## Section\n\nText.\n")
+    assert 'class="card-header"' in html
+    assert render_cache.get_render_cache() is None
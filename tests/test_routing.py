@@ -0,0 +1,61 @@
+import json
+import time
+import pytest
+import routing
+from routing import DEFAULT_MODEL, LatencyRouter, load_routing, model_for
+
+FALLBACKS = {'big-model': {'model': 'small-model', 'p95_seconds': 10}}
+
+def test_routing_file_is_merged_over_the_defaults(workdir):
+    (workdir / 'routing.json').write_text(json.dumps({
+        'stages': {'research': 'big-model'},
+        'fallbacks': FALLBACKS,
+    }))
+    loaded = load_routing('routing.json')
+    assert loaded['stages']['research'] == 'big-model'
+    assert 'planning' in loaded['stages']
+    assert loaded['agents'] == {}
+    assert loaded['fallbacks'] == FALLBACKS
+
+def test_unreadable_routing_file_uses_the_defaults(workdir):
+    (workdir / 'routing.json').write_text('{"stages": ')
+    assert load_routing('routing.json') == load_routing('missing.json')
+
+def test_model_is_picked_by_plan_then_role_then_stage(monkeypatch):
+    monkeypatch.setattr(routing, 'routing', {
+        'stages': {'planning': None, 'research': 'stage-model'},
+        'agents': {'Fact Checker': 'role-model'},
+        'fallbacks': {},
+    })
+    assert model_for('research', 'Fact Checker', 'plan-model') == 'plan-model'
+    assert model_for('research', 'Fact Checker') == 'role-model'
+    assert model_for('research', 'Reporter') == 'stage-model'
+    assert model_for('planning') == DEFAULT_MODEL
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(routing, 'FALLBACK_COOLDOWN', 0.05)
+    return LatencyRouter(FALLBACKS)
+
+def test_slow_model_falls_back_until_the_cooldown_ends(router):
+    for seconds in (1, 2, 30, 40):
+        router.record('big-model', seconds)
+    # Too few samples to judge the model yet
+    assert router.choose('big-model') == 'big-model'
+
+    router.record('big-model', 50)
+    assert router.choose('big-model') == 'small-model'
+    assert router.choose('other-model') == 'other-model'
+    assert router.summary() == {'p95_seconds': {}, 'fallback_switches': 1}
+
+    time.sleep(0.1)
+    assert router.choose('big-model') == 'big-model'
+
+def test_fast_model_keeps_its_calls(router):
+    for seconds in (1, 2, 3, 4, 5, 6):
+        router.record('big-model', seconds)
+        router.record('other-model', 100)
+    assert router.choose('big-model') == 'big-model'
+    assert router.choose('other-model') == 'other-model'
+    assert router.summary() == {'p95_seconds': {'big-model': 6, 'other-model': 100},
+                                'fallback_switches': 0}
@@ -0,0 +1,26 @@
+import pytest
+
+# The search tools are crewai tools
+pytest.importorskip('crewai_tools')
+from search import SearchCache
+
+RESULTS = {'organic': [{'title': 'Rates held', 'link': 'https://news.example/rates'}]}
+
+@pytest.fixture
+def cache(workdir):
+    cache = SearchCache(str(workdir / 'search'))
+    cache.put("ECB interest rate decision June 2024 eurozone inflation", RESULTS)
+    return cache
+
+def test_reworded_query_is_a_near_hit(cache):
+    assert cache.get("eurozone inflation ECB interest rate decision June 2024 outlook") == RESULTS
+    assert cache.get("June 2024 ECB decision interest rate eurozone inflation") == RESULTS
+
+@pytest.mark.parametrize('query', [
+    "ECB interest rate decision June 2025 eurozone inflation",
+    "ECB interest rate decision July 2024 eurozone inflation",
+    "Fed interest rate decision June 2024 eurozone inflation",
+    "ECB interest rate decision June 2024 eurozone inflation 3",
+])
+def test_near_hit_needs_the_same_numbers_and_names(cache, query):
+    assert cache.get(query) is None
@@ -0,0 +1,326 @@
+import logging
+import re
+import time
+import threading
+import litellm
+from litellm.integrations.custom_logger import CustomLogger
+from crewai import LLM
+from deadline import INCOMPLETE_MARKER
+from routing import latency_router, model_for
+from prompts import assemble
+from hedging import LLM_TIMEOUT, hedger
+
+log = logging.getLogger(__name__)
+
+# Levels usage is added up at; budgets can be set for each
+SCOPES = ('call', 'agent', 'task', 'stage', 'run')
+
+# Tool results quoted in the answer of an agent stopped by its budget
+STOPPED_RESULTS_KEPT = 3
+STOPPED_RESULT_CHARS = 1500
+
+def parse_budgets(specs):
+    """
+    Parse budget specs such as "run=200000", "agent=40000" or "run=$0.50".
+
+    Plain numbers are token limits, numbers starting with $ are USD limits.
+
+    Returns:
+        Dict of scope to {'tokens': ..., 'cost': ...}
+    """
+    budgets = {}
+    for spec in specs or []:
+        scope, _, value = spec.partition('=')
+        scope = scope.strip()
+        if scope not in SCOPES or not value.strip():
+            raise ValueError(f"Budget must look like SCOPE=TOKENS or SCOPE=$USD with SCOPE one of {', '.join(SCOPES)}")
+        value = value.strip()
+        if value.startswith('$') and scope == 'call':
+            raise ValueError("The call budget is in tokens only")
+        if value.startswith('$'):
+            budgets.setdefault(scope, {})['cost'] = float(value[1:])
+        else:
+            budgets.setdefault(scope, {})['tokens'] = int(value)
+    return budgets
+
+def empty_totals():
+    return {'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0,
+            'cost': 0.0}
+
+class UsageMeter:
+    """
+    Thread-safe token and cost totals per agent, task, stage and run, and the
+    budgets they are held to.
+
+    Each LLM call is charged under labels naming its agent, task and stage
+    (see MeteredLLM). Before a call, exhausted() says whether any budget the
+    call would count against is used up.
+    """
+
+    def __init__(self, budgets=None):
+        self.lock = threading.Lock()
+        self.configure(budgets)
+
+    def configure(self, budgets=None):
+        """Set the budgets and start counting from zero"""
+        with self.lock:
+            self.budgets = budgets or {}
+            self.totals = {scope: {} for scope in SCOPES if scope != 'call'}
+            # Also added up per model, for routing; models have no budget
+            self.totals['model'] = {}
+            # Calls per model each agent's calls actually went to
+            self.agent_models = {}
+            self.stopped = []
+
+    def _entries(self, labels):
+        for scope, name in labels.items():
+            if scope in self.totals and name is not None:
+                yield scope, self.totals[scope].setdefault(name, empty_totals())
+
+    def charge(self, labels, prompt_tokens, completion_tokens, cost, calls=1, cached_tokens=0):
+        with self.lock:
+            for _, totals in self._entries(labels):
+                totals['calls'] += calls
+                totals['prompt_tokens'] += prompt_tokens
+                totals['cached_tokens'] += cached_tokens
+                totals['completion_tokens'] += completion_tokens
+                totals['total_tokens'] += prompt_tokens + completion_tokens
+                totals['cost'] += cost
+            if labels.get('agent') is not None and labels.get('model') is not None:
+                models = self.agent_models.setdefault(labels['agent'], {})
+                models[labels['model']] = models.get(labels['model'], 0) + calls
+
+    def exhausted(self, labels, prompt_tokens=0):
+        """First scope whose budget leaves no room for a call with this prompt, or None"""
+        call_budget = self.budgets.get('call', {})
+        if call_budget.get('tokens') is not None and prompt_tokens >= call_budget['tokens']:
+            return 'call'
+        with self.lock:
+            for scope, totals in self._entries(labels):
+                budget = self.budgets.get(scope, {})
+                if budget.get('tokens') is not None and totals['total_tokens'] + prompt_tokens >= budget['tokens']:
+                    return scope
+                if budget.get('cost') is not None and totals['cost'] >= budget['cost']:
+                    return scope
+        return None
+
+    def completion_allowance(self, labels, prompt_tokens):
+        """Most completion tokens a call may use without breaking a token budget; None if unlimited"""
+        limits = []
+        call_budget = self.budgets.get('call', {})
+        if call_budget.get('tokens') is not None:
+            limits.append(call_budget['tokens'] - prompt_tokens)
+        with self.lock:
+            for scope, totals in self._entries(labels):
+                budget = self.budgets.get(scope, {})
+                if budget.get('tokens') is not None:
+                    limits.append(budget['tokens'] - totals['total_tokens'] - prompt_tokens)
+        return max(1, min(limits)) if limits else None
+
+    def share(self, parts, stage):
+        """
+        Budgets for one of parts workers running calls of stage: what is
+        left of the run and stage budgets, split evenly, and the other
+        budgets as they are.
+        """
+        with self.lock:
+            budgets = {scope: dict(budget) for scope, budget in self.budgets.items()}
+            for scope, name in (('run', 'run'), ('stage', stage)):
+                budget = budgets.get(scope)
+                if not budget:
+                    continue
+                totals = self.totals[scope].get(name, empty_totals())
+                if budget.get('tokens') is not None:
+                    budget['tokens'] = max(0, budget['tokens'] - totals['total_tokens']) // parts
+                if budget.get('cost') is not None:
+                    budget['cost'] = max(0.0, budget['cost'] - totals['cost']) / parts
+        return budgets
+
+    def note_stop(self, labels, scope):
+        with self.lock:
+            self.stopped.append({'agent': labels.get('agent'), 'task': labels.get('task'), 'budget': scope})
+
+    def summary(self):
+        """Totals for every scope, the models each agent called, the budgets and the agents they stopped"""
+        with self.lock:
+            summary = {scope: {name: dict(totals) for name, totals in entries.items()}
+                       for scope, entries in self.totals.items()}
+            summary['run'] = summary['run'].get('run', empty_totals())
+            summary['agent_models'] = {agent: dict(models) for agent, models in self.agent_models.items()}
+            summary['budgets'] = self.budgets
+            summary['stopped'] = list(self.stopped)
+        return summary
+
+# Shared by every agent in the process
+meter = UsageMeter()
+
+def count_tokens(model, messages):
+    try:
+        if isinstance(messages, str):
+            return litellm.token_counter(model=model, text=messages)
+        return litellm.token_counter(model=model, messages=messages)
+    except Exception:
+        # Unknown tokenizer: roughly four characters per token
+        text = messages if isinstance(messages, str) else ' '.join(str(m.get('content', '')) for m in messages)
+        return len(text) // 4
+
+def estimate_cost(model, prompt_tokens, completion_tokens, usage=None):
+    """Cost of a call; with the provider's usage object, cached prompt tokens are priced as cached"""
+    try:
+        prompt_cost, completion_cost = litellm.cost_per_token(
+            model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+            usage_object=usage if isinstance(usage, litellm.Usage) else None)
+        return prompt_cost + completion_cost
+    except Exception:
+        return 0.0
+
+def _field(obj, name):
+    if obj is None:
+        return None
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+def reported_usage(usage):
+    """
+    Prompt, cached prompt and completion tokens from the usage a provider
+    reported, or None for the ones it did not report. Cached tokens are
+    OpenAI's prompt_tokens_details.cached_tokens or Anthropic's
+    cache_read_input_tokens.
+    """
+    cached = (_field(_field(usage, 'prompt_tokens_details'), 'cached_tokens')
+              or _field(usage, 'cache_read_input_tokens'))
+    return _field(usage, 'prompt_tokens'), cached, _field(usage, 'completion_tokens')
+
+class UsageRecorder(CustomLogger):
+    """
+    Callback that catches the usage crewai reports right after its LLM call.
+
+    crewai also registers its callbacks with litellm, which then logs whole
+    responses of any call to them; only crewai's own {'usage': ...} report
+    for this call is kept.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.usage = None
+
+    def log_success_event(self, kwargs, response_obj, start_time, end_time):
+        if isinstance(response_obj, dict) and self.usage is None:
+            self.usage = response_obj.get('usage')
+
+def progress_so_far(messages):
+    """The agent's latest thought and tool results from its conversation"""
+    if isinstance(messages, str):
+        return '', []
+    thought, results = '', []
+    # The first two messages are the system prompt and the task
+    for message in messages[2:]:
+        content = str(message.get('content') or '')
+        thoughts = re.findall(r'Thought:\s*(.+?)(?=\n(?:Action|Final Answer|Observation):|\Z)', content, re.S)
+        if thoughts and thoughts[-1].strip():
+            thought = thoughts[-1].strip()
+        for result in re.findall(r'Observation:\s*(.+?)(?=\nThought:|\Z)', content, re.S):
+            results.append(result.strip()[:STOPPED_RESULT_CHARS])
+    return thought, results[-STOPPED_RESULTS_KEPT:]
+
+def stopped_answer(role, scope, messages):
+    """Final answer for an agent stopped by a budget, built from its progress so far"""
+    thought, results = progress_so_far(messages)
+    lines = [f"# {role}", "", INCOMPLETE_MARKER, "", "## Findings so far", ""]
+    lines.append(thought or f"{role} had no findings before reaching its {scope} budget.")
+    if results:
+        lines += ["", "## Material gathered", ""]
+        for result in results:
+            lines += ["```", result, "```", ""]
+    return f"Thought: My {scope} budget is used up, so I stop here.\nFinal Answer: " + '\n'.join(lines)
+
+class MeteredLLM(LLM):
+    """
+    LLM for one agent that charges every call to the shared meter and holds
+    the agent to its budgets.
+
+    Completion length is capped so a call cannot overrun a token budget. Once
+    a budget is used up, the agent gets a final answer built from its thought
+    and tool results so far instead of another LLM call, so it stops
+    gracefully and its report is marked as incomplete.
+
+    The model comes from routing.model_for() unless one is given. Each call
+    goes to the model the latency router picks: the agent's own model, or
+    its faster fallback while the own model is too slow.
+
+    Every call is bounded by LLM_TIMEOUT and, when hedging is on, gets a
+    duplicate if it is slow (see hedging.Hedger). Every request that gets an
+    answer is charged, the losing duplicate as well as the winner, since the
+    provider bills both.
+    """
+
+    def __init__(self, agent, stage, task=None, model=None, **kwargs):
+        # An explicit model wins over the routing for the agent and stage
+        kwargs.setdefault('timeout', LLM_TIMEOUT)
+        super().__init__(model=model_for(stage, agent, model), **kwargs)
+        self.agent = agent
+        self.stage = stage
+        self.task = task
+
+    def labels(self):
+        return {'agent': self.agent, 'task': self.task, 'stage': self.stage, 'run': 'run'}
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None):
+        labels = self.labels()
+        # Shared instructions first, this agent's persona last
+        messages = assemble(messages, self.stage)
+        prompt_tokens = count_tokens(self.model, messages)
+        scope = meter.exhausted(labels, prompt_tokens)
+        if scope is not None:
+            log.warning(f"💸 {self.agent} reached its {scope} budget, stopping with its findings so far")
+            meter.note_stop(labels, scope)
+            return stopped_answer(self.agent, scope, messages)
+
+        # Only this agent's thread uses this LLM, so max_tokens and the model
+        # can be swapped per call
+        allowance = meter.completion_allowance(labels, prompt_tokens)
+        max_tokens, model = self.max_tokens, self.model
+        if allowance is not None:
+            self.max_tokens = min(max_tokens, allowance) if max_tokens else allowance
+        self.model = latency_router.choose(model)
+        called = self.model
+
+        start = time.perf_counter()
+
+        def request(attempt):
+            recorder = UsageRecorder()
+            response = LLM.call(self, messages, tools, list(callbacks or []) + [recorder], available_functions)
+            self.record_usage(labels, called, response, recorder.usage, prompt_tokens, start)
+            return response
+
+        try:
+            # A call that may run tools itself (available_functions) is never sent twice
+            response = hedger.call(f"llm:{called}", request, timeout=self.timeout or LLM_TIMEOUT,
+                                   hedge=not available_functions)
+        finally:
+            self.max_tokens, self.model = max_tokens, model
+        latency_router.record(called, time.perf_counter() - start)
+        return response
+
+    def record_usage(self, labels, called, response, usage, prompt_tokens, start):
+        """Charge one answered request: the provider's counts where it reported them, else our estimates"""
+        reported_prompt, cached_tokens, reported_completion = reported_usage(usage)
+        prompt_tokens = reported_prompt or prompt_tokens
+        if reported_completion is not None:
+            completion_tokens = reported_completion
+        else:
+            completion_tokens = count_tokens(called, response) if isinstance(response, str) else 0
+        cost = estimate_cost(called, prompt_tokens, completion_tokens, usage)
+        meter.charge(dict(labels, model=called), prompt_tokens, completion_tokens, cost,
+                     cached_tokens=cached_tokens or 0)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(f"LLM call by {self.agent}: {prompt_tokens} prompt tokens, {cached_tokens or 0} cached",
+                      extra={'fields': {'agent': self.agent, 'model': called, 'prompt_tokens': prompt_tokens,
+                                        'cached_tokens': cached_tokens or 0,
+                                        'completion_tokens': completion_tokens, 'cost': cost,
+                                        'seconds': round(time.perf_counter() - start, 3)}})
+
+def format_usage(totals):
+    """One-line summary of a totals dict"""
+    return (f"{totals['total_tokens']:,} tokens ({totals['prompt_tokens']:,} in, "
+            f"{totals.get('cached_tokens', 0):,} of them cached, {totals['completion_tokens']:,} out) "
+            f"in {totals['calls']} calls, ~${totals['cost']:.4f}")
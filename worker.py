@@ -0,0 +1,124 @@
+import logging
+import os
+import sys
+import time
+import socket
+import threading
+import argparse
+import subprocess
+from crewai import Crew
+from dotenv import load_dotenv
+
+# Before the project modules, some of which read settings when imported
+load_dotenv()
+
+from jobs import QUEUE_PATH, Heartbeat, JobCancelled, JobQueue
+from dedup import duplicate_filter
+from knowledge import get_index
+from usage import meter
+from hedging import hedger
+from logsink import transcripts
+import logsink
+import dynamic_crew
+
+log = logging.getLogger(__name__)
+
+# How often an idle worker looks for a new job
+POLL_SECONDS = 2
+
+# Local workers started by the coordinator stop after this long without a job
+LOCAL_IDLE_EXIT = 30
+
+def run_job(queue, job, worker):
+    """Run one research job: its agent and tasks in a crew of their own"""
+    payload = job['payload']
+    # Set by the heartbeat once the job is cancelled or taken over; the
+    # agent's next LLM or tool call then stops the crew
+    stop = threading.Event()
+    meter.configure(payload.get('budgets'))
+    hedger.configure(payload.get('max_hedges', 0), stop)
+    duplicate_filter.reset()
+    transcripts.reset()
+    get_index().refresh()
+
+    # Uploaded with each heartbeat, for a partial report and the usage so far
+    # if the job is cancelled at the deadline
+    progress = {}
+    agent = dynamic_crew.build_agent(payload['agent_key'], payload['agent'], payload['tasks'], progress)
+    # No callback: the coordinator saves the report once the job is uploaded
+    tasks = [dynamic_crew.build_task(task_info, agent, callback=None) for task_info in payload['tasks'].values()]
+    with Heartbeat(queue, job['id'], worker, progress=lambda: dict(progress, usage=meter.summary()['model']),
+                   stop=stop) as heartbeat:
+        try:
+            Crew(agents=[agent], tasks=tasks, verbose=logsink.VERBOSE).kickoff()
+        except JobCancelled:
+            pass
+    if heartbeat.lost:
+        log.warning(f"Job {job['id']} was taken over or cancelled, stopped its crew and dropped its result.")
+        return
+
+    markdown = tasks[-1].output.raw
+    # Usage per model called, so the coordinator knows which models ran
+    result = {'markdown': markdown, 'usage': meter.summary()['model'], 'hedging': hedger.summary()}
+    if queue.complete(job['id'], worker, result):
+        log.info(f"✅ Uploaded the report of '{job['name']}' (job {job['id']})")
+
+def work(queue, worker, idle_exit=None):
+    """
+    Take jobs off the queue and run them one at a time until interrupted,
+    or until idle_exit seconds pass without a job.
+    """
+    log.info(f"👷 Worker {worker} waiting for jobs in {queue.path}")
+    idle_since = time.monotonic()
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            if idle_exit is not None and time.monotonic() - idle_since > idle_exit:
+                log.info(f"Worker {worker} idle for {idle_exit}s, stopping.")
+                return
+            time.sleep(POLL_SECONDS)
+            continue
+
+        log.info(f"🔧 {worker} running '{job['name']}' (job {job['id']}, attempt {job['attempt']})")
+        try:
+            run_job(queue, job, worker)
+        except KeyboardInterrupt:
+            queue.fail(job['id'], worker, 'worker stopped', retry_delay=0)
+            raise
+        except Exception as e:
+            log.error(f"❌ Job {job['id']} failed: {e}",
+                      extra={'fields': {'job': job['id'], 'transcript': transcripts.snapshot().get(job['name'])}})
+            queue.fail(job['id'], worker, str(e))
+        idle_since = time.monotonic()
+
+def start_local_workers(count, queue_path=QUEUE_PATH):
+    """Start count worker processes on this machine, which stop once the queue stays empty"""
+    return [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--queue', queue_path,
+                              '--idle-exit', str(LOCAL_IDLE_EXIT)])
+            for _ in range(count)]
+
+def stop_local_workers(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Satyarthi research worker")
+    parser.add_argument('--queue', default=QUEUE_PATH, metavar='PATH',
+                        help="job queue database shared with the coordinator")
+    parser.add_argument('--id', default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="worker name recorded on the jobs it runs")
+    parser.add_argument('--idle-exit', type=float, metavar='SECONDS',
+                        help="stop after this long without a job (default: run until interrupted)")
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                        help="lowest level written to logs/worker-<id>.jsonl")
+    args = parser.parse_args()
+    logsink.setup(f"worker-{args.id}", args.log_level)
+    try:
+        work(JobQueue(args.queue), args.id, args.idle_exit)
+    except KeyboardInterrupt:
+        log.info(f"Worker {args.id} stopped.")
+    finally:
+        logsink.shutdown()